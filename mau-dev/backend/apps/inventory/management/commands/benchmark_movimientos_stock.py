@@ -0,0 +1,171 @@
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.utils import timezone
+from apps.inventory.models import MedicamentoStock, MedicamentoStockMovement
+from apps.inventory.movimientos_stock import StockInsuficiente, registrar_salida
+from apps.prescriptions.models import CatalogoMedicamentos
+import threading
+import time
+
+# Medicamento de prueba: se identifica por la clave para poder borrarlo
+CLAVE_BENCHMARK = 'BENCH-STOCK'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide salidas de stock concurrentes (varias ventanillas dispensando el mismo '
+        'medicamento) y comprueba que no se pierden actualizaciones'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=8,
+            help='Ventanillas dispensando al mismo tiempo (default: 8)',
+        )
+        parser.add_argument(
+            '--dispensaciones',
+            type=int,
+            default=250,
+            help='Dispensaciones por ventanilla (default: 250)',
+        )
+        parser.add_argument(
+            '--cantidad',
+            type=int,
+            default=1,
+            help='Piezas por dispensación (default: 1)',
+        )
+        parser.add_argument(
+            '--faltante',
+            type=int,
+            default=0,
+            help='Piezas que faltan en el stock inicial para que algunas salidas se rechacen (default: 0)',
+        )
+        parser.add_argument(
+            '--comparar-anterior',
+            action='store_true',
+            help='Medir también el descuento anterior (leer, restar en Python y guardar)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            self.stdout.write(self.style.ERROR(
+                '❌ La base de datos en memoria no se comparte entre hilos; use una base de datos en archivo'
+            ))
+            return
+
+        medicamento, _ = CatalogoMedicamentos.objects.get_or_create(
+            clave=CLAVE_BENCHMARK,
+            defaults={
+                'nombre': 'Medicamento Benchmark',
+                'principio_activo': 'Benchmark',
+                'concentracion': '1 mg',
+                'forma_farmaceutica': 'Tableta',
+                'categoria': 'OTROS',
+            },
+        )
+        try:
+            resultados = [self.medir('Descuento condicional (movimientos_stock)', medicamento, options, True)]
+            if options['comparar_anterior']:
+                resultados.append(self.medir('Descuento anterior (leer y guardar)', medicamento, options, False))
+        finally:
+            self.stdout.write('\n🧹 Borrando medicamento de prueba...')
+            MedicamentoStock.objects.filter(medicamento_catalogo=medicamento).delete()
+            medicamento.delete()
+
+        if resultados[0]['perdidas'] == 0 and resultados[0]['movimientos_correctos']:
+            self.stdout.write(self.style.SUCCESS('\n✅ Sin actualizaciones perdidas'))
+        else:
+            self.stdout.write(self.style.ERROR('\n❌ El descuento condicional perdió actualizaciones'))
+
+    def medir(self, nombre, medicamento, options, condicional):
+        hilos = options['hilos']
+        dispensaciones = options['dispensaciones']
+        cantidad = options['cantidad']
+        inicial = max(0, hilos * dispensaciones * cantidad - options['faltante'])
+
+        MedicamentoStock.objects.filter(medicamento_catalogo=medicamento).delete()
+        stock = MedicamentoStock.objects.create(medicamento_catalogo=medicamento, current_stock=inicial)
+
+        conteos = {'exitosas': 0, 'rechazadas': 0, 'errores': 0}
+        candado = threading.Lock()
+        salida = threading.Barrier(hilos)
+
+        def ventanilla():
+            propios = {'exitosas': 0, 'rechazadas': 0, 'errores': 0}
+            try:
+                salida.wait()
+                for _ in range(dispensaciones):
+                    try:
+                        if condicional:
+                            registrar_salida(MedicamentoStock(id=stock.id), cantidad, notas='Benchmark')
+                            propios['exitosas'] += 1
+                        elif self.descontar_anterior(stock.id, cantidad):
+                            propios['exitosas'] += 1
+                        else:
+                            propios['rechazadas'] += 1
+                    except StockInsuficiente:
+                        propios['rechazadas'] += 1
+                    except OperationalError:
+                        # Base de datos bloqueada más allá del timeout
+                        propios['errores'] += 1
+            finally:
+                connection.close()
+                with candado:
+                    for clave, valor in propios.items():
+                        conteos[clave] += valor
+
+        trabajadores = [threading.Thread(target=ventanilla) for _ in range(hilos)]
+        inicio = time.perf_counter()
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        duracion = time.perf_counter() - inicio
+
+        stock.refresh_from_db()
+        esperado = inicial - conteos['exitosas'] * cantidad
+        perdidas = (stock.current_stock - esperado) // cantidad
+        movimientos = MedicamentoStockMovement.objects.filter(stock=stock)
+        total_movimientos = movimientos.count()
+        salidas_registradas = -sum(movimientos.values_list('quantity', flat=True))
+
+        self.stdout.write(f'\n⏱️ {nombre}')
+        self.stdout.write(
+            f'  {hilos} ventanillas x {dispensaciones} dispensaciones de {cantidad} pieza(s), '
+            f'stock inicial {inicial}'
+        )
+        self.stdout.write(
+            f'  {conteos["exitosas"]} exitosas, {conteos["rechazadas"]} rechazadas por stock, '
+            f'{conteos["errores"]} errores de bloqueo en {duracion:.2f}s'
+        )
+        self.stdout.write(f'  {conteos["exitosas"] / duracion:.0f} dispensaciones/s')
+        self.stdout.write(
+            f'  Stock final {stock.current_stock}, esperado {esperado}: '
+            f'{perdidas} actualizaciones perdidas'
+        )
+
+        movimientos_correctos = True
+        if condicional:
+            movimientos_correctos = (
+                total_movimientos == conteos['exitosas']
+                and salidas_registradas == inicial - stock.current_stock
+            )
+            self.stdout.write(
+                f'  {total_movimientos} movimientos registrados por {salidas_registradas} piezas'
+            )
+
+        if perdidas:
+            self.stdout.write(self.style.WARNING(f'  ⚠️ Se perdieron {perdidas} descuentos'))
+        return {'perdidas': perdidas, 'movimientos_correctos': movimientos_correctos}
+
+    def descontar_anterior(self, stock_id, cantidad):
+        """Descuento como lo hacían las vistas antes: leer, restar en Python y guardar la fila"""
+        stock = MedicamentoStock.objects.get(id=stock_id)
+        if cantidad > stock.available_stock:
+            return False
+        stock.current_stock = max(0, stock.current_stock - cantidad)
+        stock.last_movement_date = timezone.now()
+        stock.save()
+        return True
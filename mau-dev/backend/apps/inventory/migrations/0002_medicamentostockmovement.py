@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0009_detallereceta_cantidad_dispensada_lotes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicamentoStockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('ENTRY', 'Entrada'), ('EXIT', 'Salida'), ('ADJUSTMENT', 'Ajuste'), ('TRANSFER', 'Transferencia'), ('WASTE', 'Desperdicio'), ('EXPIRY', 'Vencimiento')], max_length=20, verbose_name='Tipo de Movimiento')),
+                ('reason', models.CharField(choices=[('PURCHASE', 'Compra'), ('DISPENSING', 'Dispensación'), ('RETURN', 'Devolución'), ('DAMAGED', 'Dañado'), ('EXPIRED', 'Vencido'), ('INVENTORY_COUNT', 'Conteo de Inventario'), ('TRANSFER_IN', 'Transferencia Entrada'), ('TRANSFER_OUT', 'Transferencia Salida')], max_length=20, verbose_name='Motivo')),
+                ('quantity', models.IntegerField(verbose_name='Cantidad')),
+                ('stock_after', models.PositiveIntegerField(verbose_name='Stock Resultante')),
+                ('notes', models.TextField(blank=True, default='', verbose_name='Notas')),
+                ('timestamp', models.DateTimeField(auto_now_add=True, verbose_name='Fecha y Hora')),
+                ('processed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Procesado por')),
+                ('related_prescription', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='prescriptions.receta', verbose_name='Receta Relacionada')),
+                ('related_prescription_detail', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='prescriptions.detallereceta', verbose_name='Detalle de Receta Relacionado')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.medicamentostock', verbose_name='Stock')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Stock de Medicamento',
+                'verbose_name_plural': 'Movimientos de Stock de Medicamentos',
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['stock', 'timestamp'], name='inventory_m_stock_i_3cb644_idx'), models.Index(fields=['reason', 'timestamp'], name='inventory_m_reason_f77cab_idx')],
+            },
+        ),
+    ]
@@ -343,6 +343,67 @@ class InventoryMovement(models.Model):
         return f"{self.get_movement_type_display()} - {self.stock.medication.name} - {self.quantity}"
 
 
+class MedicamentoStockMovement(models.Model):
+    """
+    Movimientos de MedicamentoStock. Los registra apps.inventory.movimientos_stock
+    en la misma transacción que el cambio de stock.
+    """
+    
+    stock = models.ForeignKey(
+        MedicamentoStock,
+        on_delete=models.CASCADE,
+        related_name='movements',
+        verbose_name='Stock'
+    )
+    movement_type = models.CharField(
+        max_length=20,
+        choices=InventoryMovement.MOVEMENT_TYPES,
+        verbose_name='Tipo de Movimiento'
+    )
+    reason = models.CharField(
+        max_length=20,
+        choices=InventoryMovement.MOVEMENT_REASONS,
+        verbose_name='Motivo'
+    )
+    quantity = models.IntegerField(verbose_name='Cantidad')  # Negativo para salidas
+    stock_after = models.PositiveIntegerField(verbose_name='Stock Resultante')
+    notes = models.TextField(blank=True, default='', verbose_name='Notas')
+    processed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Procesado por'
+    )
+    timestamp = models.DateTimeField(auto_now_add=True, verbose_name='Fecha y Hora')
+    related_prescription = models.ForeignKey(
+        'prescriptions.Receta',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Receta Relacionada'
+    )
+    related_prescription_detail = models.ForeignKey(
+        'prescriptions.DetalleReceta',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Detalle de Receta Relacionado'
+    )
+    
+    class Meta:
+        verbose_name = 'Movimiento de Stock de Medicamento'
+        verbose_name_plural = 'Movimientos de Stock de Medicamentos'
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['stock', 'timestamp']),
+            models.Index(fields=['reason', 'timestamp']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_movement_type_display()} - {self.stock_id} - {self.quantity}"
+
+
 class InventoryAlert(models.Model):
     """Alertas del sistema de inventario"""
     
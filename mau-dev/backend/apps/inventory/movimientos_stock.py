@@ -0,0 +1,134 @@
+"""
+Salidas de MedicamentoStock sin perder actualizaciones.
+
+Todo descuento de stock pasa por aquí. En lugar de leer `current_stock`,
+restar en Python y guardar la fila completa, cada salida es un UPDATE
+condicional:
+
+    UPDATE ... SET current_stock = current_stock - n
+    WHERE id = ... AND current_stock - reserved_stock >= n
+
+La base de datos aplica la resta sobre el valor vigente, así que dos
+ventanillas que dispensan el mismo medicamento al mismo tiempo no se pisan,
+y la condición impide dejar el stock disponible en negativo. Si alguna fila
+no cumple la condición no se descuenta nada y se lanza StockInsuficiente.
+
+En la misma transacción se lee el stock resultante y se inserta un
+MedicamentoStockMovement por registro de stock con `bulk_create`, con un
+número fijo de sentencias sin importar cuántos medicamentos tenga la salida.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import MedicamentoStock, MedicamentoStockMovement
+
+
+class StockInsuficiente(Exception):
+    """El stock disponible no alcanza para la salida; no se descontó nada"""
+
+    def __init__(self, stock, disponible, solicitado):
+        self.stock = stock
+        self.disponible = disponible
+        self.solicitado = solicitado
+        super().__init__(
+            f'Stock insuficiente. Disponible: {disponible}, Solicitado: {solicitado}'
+        )
+
+
+def _por_stock(cantidades):
+    """Expresión CASE con la cantidad de cada registro de stock"""
+    return Case(
+        *[When(pk=stock_id, then=Value(cantidad)) for stock_id, cantidad in cantidades.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def registrar_salidas(cantidades, usuario=None, reason='DISPENSING', receta=None,
+                      detalles=None, notas=''):
+    """
+    Descuenta `cantidades` ({id de MedicamentoStock: cantidad}) y registra un
+    movimiento por cada registro. `detalles` ({id de stock: DetalleReceta})
+    vincula cada movimiento al medicamento de la receta que lo originó.
+
+    Retorna {id de stock: movimiento}. Lanza StockInsuficiente o
+    MedicamentoStock.DoesNotExist sin dejar cambios.
+    """
+    cantidades = {stock_id: cantidad for stock_id, cantidad in cantidades.items() if cantidad}
+    if not cantidades:
+        return {}
+    if any(cantidad < 0 for cantidad in cantidades.values()):
+        raise ValueError('Las cantidades de salida deben ser positivas')
+
+    detalles = detalles or {}
+    ahora = timezone.now()
+    salida = _por_stock(cantidades)
+
+    with transaction.atomic():
+        if len(cantidades) > 1:
+            # El UPDATE no bloquea las filas en un orden fijo: se bloquean antes
+            # en orden de id para que dos salidas no se bloqueen mutuamente
+            list(MedicamentoStock.objects.select_for_update().filter(
+                id__in=cantidades
+            ).order_by('id').values_list('id', flat=True))
+
+        actualizados = MedicamentoStock.objects.filter(
+            id__in=cantidades,
+            current_stock__gte=F('reserved_stock') + salida,
+        ).update(
+            current_stock=F('current_stock') - salida,
+            last_movement_date=ahora,
+            updated_at=ahora,
+        )
+
+        if actualizados != len(cantidades):
+            # Alguna fila no cumplió la condición: se deshace la transacción
+            # y se informa la primera que no alcanzó
+            vigentes = dict(MedicamentoStock.objects.filter(id__in=cantidades).values_list(
+                'id', F('current_stock') - F('reserved_stock')
+            ))
+            for stock_id in sorted(cantidades):
+                if stock_id not in vigentes:
+                    raise MedicamentoStock.DoesNotExist(
+                        f'No existe el registro de stock {stock_id}'
+                    )
+                if vigentes[stock_id] < cantidades[stock_id]:
+                    raise StockInsuficiente(
+                        stock_id, max(0, vigentes[stock_id]), cantidades[stock_id]
+                    )
+            raise StockInsuficiente(None, 0, sum(cantidades.values()))
+
+        resultantes = dict(
+            MedicamentoStock.objects.filter(id__in=cantidades).values_list('id', 'current_stock')
+        )
+        movimientos = MedicamentoStockMovement.objects.bulk_create([
+            MedicamentoStockMovement(
+                stock_id=stock_id,
+                movement_type='EXIT',
+                reason=reason,
+                quantity=-cantidad,
+                stock_after=resultantes[stock_id],
+                notes=notas,
+                processed_by=usuario,
+                related_prescription=receta,
+                related_prescription_detail=detalles.get(stock_id),
+            )
+            for stock_id, cantidad in sorted(cantidades.items())
+        ])
+
+    return {movimiento.stock_id: movimiento for movimiento in movimientos}
+
+
+def registrar_salida(stock, cantidad, usuario=None, reason='DISPENSING', receta=None,
+                     detalle=None, notas=''):
+    """
+    Salida de un solo registro de stock. Recarga `stock` con los valores que
+    quedaron en la base de datos y retorna el movimiento.
+    """
+    movimiento = registrar_salidas(
+        {stock.id: cantidad}, usuario=usuario, reason=reason, receta=receta,
+        detalles={stock.id: detalle} if detalle else None, notas=notas,
+    )[stock.id]
+    stock.refresh_from_db(fields=['current_stock', 'reserved_stock', 'last_movement_date', 'updated_at'])
+    return movimiento
@@ -0,0 +1,142 @@
+from datetime import date
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.authentication.models import User
+from apps.patients.models import Paciente
+from apps.prescriptions.models import CatalogoMedicamentos, DetalleReceta, LoteDetalleReceta, Receta
+from apps.prescriptions.serializers import LoteDetalleRecetaCreateSerializer
+from .models import MedicamentoStock, MedicamentoStockMovement
+from .movimientos_stock import StockInsuficiente, registrar_salida, registrar_salidas
+
+
+def crear_stock(clave, existencia, reservado=0):
+    medicamento = CatalogoMedicamentos.objects.create(
+        clave=clave, nombre=f'Medicamento {clave}', principio_activo='Prueba',
+        concentracion='1 mg', forma_farmaceutica='TABLETA', categoria='ANALGESICO',
+    )
+    return MedicamentoStock.objects.create(
+        medicamento_catalogo=medicamento, current_stock=existencia, reserved_stock=reservado
+    )
+
+
+class SalidasStockTests(TestCase):
+    """Salidas de stock condicionadas al disponible"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.stock = crear_stock('M1', 10, reservado=4)
+        cls.otro = crear_stock('M2', 5)
+
+    def existencias(self):
+        return list(MedicamentoStock.objects.order_by('pk').values_list('current_stock', flat=True))
+
+    def test_salida_descuenta_y_registra_el_movimiento(self):
+        movimiento = registrar_salida(self.stock, 6, notas='Prueba')
+        self.assertEqual(self.stock.current_stock, 4)
+        self.assertEqual(self.existencias(), [4, 5])
+        self.assertEqual(
+            (movimiento.movement_type, movimiento.quantity, movimiento.stock_after), ('EXIT', -6, 4)
+        )
+
+    def test_el_stock_reservado_no_esta_disponible(self):
+        with self.assertRaises(StockInsuficiente) as error:
+            registrar_salida(self.stock, 7)
+        self.assertEqual((error.exception.stock, error.exception.disponible), (self.stock.id, 6))
+        self.assertEqual(error.exception.solicitado, 7)
+        self.assertEqual(self.existencias(), [10, 5])
+        self.assertFalse(MedicamentoStockMovement.objects.exists())
+
+    def test_salida_de_varios_registros_es_todo_o_nada(self):
+        with self.assertRaises(StockInsuficiente) as error:
+            registrar_salidas({self.stock.id: 2, self.otro.id: 6})
+        self.assertEqual(error.exception.stock, self.otro.id)
+        self.assertEqual(self.existencias(), [10, 5])
+        self.assertFalse(MedicamentoStockMovement.objects.exists())
+
+        with self.assertRaises(MedicamentoStock.DoesNotExist):
+            registrar_salidas({self.stock.id: 2, self.otro.id + 100: 1})
+        self.assertEqual(self.existencias(), [10, 5])
+
+        movimientos = registrar_salidas({self.stock.id: 2, self.otro.id: 5})
+        self.assertEqual(self.existencias(), [8, 0])
+        self.assertEqual(
+            {stock_id: movimiento.stock_after for stock_id, movimiento in movimientos.items()},
+            {self.stock.id: 8, self.otro.id: 0},
+        )
+
+    def test_cantidades_negativas(self):
+        with self.assertRaises(ValueError):
+            registrar_salidas({self.stock.id: -1})
+        self.assertEqual(self.existencias(), [10, 5])
+
+
+class EndpointsSalidaStockTests(TestCase):
+    """Los endpoints que descuentan stock responden 400 sin tocarlo si no alcanza"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('farmacia_stock', password='x', role='FARMACIA')
+        cls.stock = crear_stock('M1', 10, reservado=4)
+        paciente = Paciente.objects.create(
+            expediente='EXP0001', curp='PRUE800101HDFRRR01', nombre='Paciente',
+            apellido_paterno='Prueba', fecha_nacimiento=date(1980, 1, 1), genero='M',
+            patologia='Prueba', cie10='A00', fecha_diagnostico=date(2020, 1, 1),
+        )
+        cls.receta = Receta.objects.create(
+            paciente=paciente, tipo_receta='FARMACIA', estado='VALIDADA',
+            servicio_solicitante='URGENCIAS', diagnostico='Prueba',
+        )
+        cls.detalle = DetalleReceta.objects.create(
+            receta=cls.receta, medicamento_catalogo=cls.stock.medicamento_catalogo,
+            clave_medicamento='M1', descripcion_medicamento='Medicamento',
+            cantidad_prescrita=10, dosis='1 tableta',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def assertSinCambios(self):
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.current_stock, 10)
+        self.assertFalse(MedicamentoStockMovement.objects.exists())
+
+    def test_decrease_stock_insuficiente(self):
+        respuesta = self.client.post(
+            f'/api/inventory/medicamentos/{self.stock.medicamento_catalogo_id}/decrease-stock/',
+            {'cantidad': 7}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['available_stock'], 6)
+        self.assertEqual(respuesta.json()['requested_amount'], 7)
+        self.assertSinCambios()
+
+    def agregar_lote(self, cantidad):
+        return self.client.post(
+            f'/api/recetas/{self.receta.folio_receta}/detalles/{self.detalle.id}/lotes/',
+            {'lote': 'L1', 'fecha_caducidad': '2030-01-01', 'cantidad_dispensada': cantidad},
+            format='json'
+        )
+
+    def test_agregar_lote_sin_stock(self):
+        respuesta = self.agregar_lote(7)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertSinCambios()
+
+    def test_agregar_lote_cuando_el_stock_baja_despues_de_validar(self):
+        # Sin el aviso temprano del serializador, la salida rechaza el lote y lo deshace
+        with mock.patch.object(
+            LoteDetalleRecetaCreateSerializer, 'validate_cantidad_dispensada',
+            lambda serializer, value: value
+        ):
+            respuesta = self.agregar_lote(7)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('Stock insuficiente', respuesta.json()['error'])
+        self.assertSinCambios()
+        self.assertFalse(LoteDetalleReceta.objects.exists())
+        self.detalle.refresh_from_db()
+        self.assertEqual(self.detalle.cantidad_dispensada_lotes, 0)
+        self.assertEqual(Receta.objects.get(pk=self.receta.pk).estado, 'VALIDADA')
@@ -14,6 +14,7 @@ import json
 
 from apps.prescriptions.models import CatalogoMedicamentos
 from .models import MedicamentoStock
+from .movimientos_stock import StockInsuficiente, registrar_salida
 
 
 @api_view(['GET'])
@@ -190,32 +191,29 @@ def decrease_stock(request, medicamento_id):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Verificar que hay suficiente stock disponible
-            available_stock = max(0, stock.current_stock - stock.reserved_stock)
-            if cantidad > available_stock:
+            # Disminuir el stock solo si alcanza el disponible vigente
+            try:
+                movimiento = registrar_salida(stock, cantidad, usuario=request.user)
+            except StockInsuficiente as e:
                 return Response(
                     {
-                        'error': f'Stock insuficiente. Disponible: {available_stock}, Solicitado: {cantidad}',
-                        'available_stock': available_stock,
+                        'error': str(e),
+                        'available_stock': e.disponible,
                         'requested_amount': cantidad
                     },
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Disminuir el stock
-            stock.current_stock = max(0, stock.current_stock - cantidad)
-            stock.save()
-            
             # Calcular nuevo stock disponible
-            new_available_stock = max(0, stock.current_stock - stock.reserved_stock)
+            new_available_stock = stock.available_stock
             
             response_data = {
                 'id': medicamento.id,
                 'code': medicamento.clave,
                 'name': medicamento.nombre,
                 'cantidad_dispensada': cantidad,
-                'stock_anterior': stock.current_stock + cantidad,
-                'stock_actual': stock.current_stock,
+                'stock_anterior': movimiento.stock_after + cantidad,
+                'stock_actual': movimiento.stock_after,
                 'stock_disponible': new_available_stock,
                 'stock_minimo': 20,  # Stock mínimo por defecto
                 'is_low_stock': new_available_stock <= 20,  # Stock mínimo por defecto
@@ -0,0 +1,119 @@
+"""
+Catálogos CIE-10 y de medicamentos para uso sin conexión.
+
+El snapshot es un archivo JSON-lines: la primera línea describe cada
+catálogo (versión, campos y número de filas) y cada línea siguiente es una
+fila `[catálogo, valor1, valor2, ...]` con los valores en el orden de sus
+campos. Solo incluye filas activas y se genera una vez por par de versiones.
+
+Después, el cliente pide los cambios desde las versiones que tiene: cada
+fila de los catálogos guarda en `version_cambio` la versión en la que cambió,
+así que los cambios son las filas con versión mayor (las desactivadas vienen
+con `activo` en falso). Si hubo eliminaciones o los cambios son demasiados,
+se indica `snapshot_requerido` y el cliente vuelve a descargar el snapshot.
+"""
+import json
+
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.patients.catalogo_cie10 import CATALOGO_CIE10, catalogo
+from apps.patients.catalogo_cie10 import version_catalogo as version_cie10
+from apps.patients.models import CIE10Mexico, VersionCatalogo
+from apps.prescriptions.catalogo_medicamentos import CATALOGO_MEDICAMENTOS
+from apps.prescriptions.catalogo_medicamentos import version_catalogo as version_medicamentos
+from apps.prescriptions.models import CatalogoMedicamentos
+from mau_hospital.respuestas_catalogo import CuerpoPrecalculado
+
+FORMATO_SNAPSHOT = 1
+
+# Más cambios que estos y conviene descargar el snapshot completo
+LIMITE_CAMBIOS = 5000
+
+CAMPOS_CIE10 = (
+    'codigo', 'descripcion', 'descripcion_corta', 'capitulo', 'categoria', 'tipo',
+    'genero_aplicable', 'es_mortalidad', 'es_morbilidad', 'clave_capitulo',
+    'nombre_capitulo', 'activo',
+)
+
+CAMPOS_MEDICAMENTOS = (
+    'id', 'clave', 'nombre', 'principio_activo', 'concentracion',
+    'forma_farmaceutica', 'categoria', 'tipo_receta_permitido',
+    'via_administracion', 'dosis_sugerida', 'requiere_refrigeracion',
+    'es_controlado', 'activo',
+)
+
+CATALOGOS = {
+    CATALOGO_CIE10: (CIE10Mexico, CAMPOS_CIE10, 'codigo'),
+    CATALOGO_MEDICAMENTOS: (CatalogoMedicamentos, CAMPOS_MEDICAMENTOS, 'id'),
+}
+
+
+def _linea(valor):
+    return json.dumps(valor, ensure_ascii=False, separators=(',', ':'))
+
+
+def versiones_actuales():
+    """Versión vigente de cada catálogo, sin consultar la base de datos en cada petición"""
+    return {
+        CATALOGO_CIE10: version_cie10(),
+        CATALOGO_MEDICAMENTOS: version_medicamentos(),
+    }
+
+
+def construir_snapshot(versiones):
+    """Snapshot JSON-lines de las filas activas de ambos catálogos"""
+    actual = catalogo()
+    filas = {
+        # El catálogo CIE-10 ya está en memoria y corresponde a su versión
+        CATALOGO_CIE10: [
+            [getattr(registro, campo) for campo in CAMPOS_CIE10] for registro in actual.activos
+        ],
+        CATALOGO_MEDICAMENTOS: [
+            list(fila) for fila in CatalogoMedicamentos.objects.filter(activo=True)
+            .order_by('id').values_list(*CAMPOS_MEDICAMENTOS)
+        ],
+    }
+    versiones = dict(versiones, **{CATALOGO_CIE10: actual.version})
+
+    encabezado = {
+        'formato': FORMATO_SNAPSHOT,
+        'generado': timezone.now().isoformat(),
+        'catalogos': {
+            nombre: {
+                'version': versiones[nombre],
+                'campos': list(CATALOGOS[nombre][1]),
+                'filas': len(filas[nombre]),
+            }
+            for nombre in CATALOGOS
+        },
+    }
+    lineas = [_linea(encabezado)]
+    for nombre, registros in filas.items():
+        lineas.extend(_linea([nombre] + registro) for registro in registros)
+    return CuerpoPrecalculado(
+        ('\n'.join(lineas) + '\n').encode('utf-8'), tipo_contenido='application/x-ndjson'
+    )
+
+
+def cambios_catalogo(nombre, desde):
+    """Filas de `nombre` que cambiaron después de la versión `desde`"""
+    modelo, campos, llave = CATALOGOS[nombre]
+    version, base = VersionCatalogo.obtener_con_base(nombre)
+    resultado = {'version': version, 'desde': desde, 'campos': list(campos)}
+
+    # Versiones anteriores a una eliminación, o de otra base de datos
+    if desde < base or desde > version:
+        return dict(resultado, snapshot_requerido=True)
+
+    filas = []
+    if desde < version:
+        # Las filas con version_cambio nulo se modificaron y esperan su incremento
+        consulta = modelo.objects.filter(
+            Q(version_cambio__gt=desde) | Q(version_cambio__isnull=True)
+        ).order_by(llave).values_list(*campos)
+        filas = [list(fila) for fila in consulta[:LIMITE_CAMBIOS + 1]]
+        if len(filas) > LIMITE_CAMBIOS:
+            return dict(resultado, snapshot_requerido=True)
+
+    return dict(resultado, snapshot_requerido=False, filas=filas)
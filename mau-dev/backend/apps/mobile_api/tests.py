@@ -0,0 +1,110 @@
+import json
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.authentication.models import User
+from apps.patients import catalogo_cie10
+from apps.patients.models import CIE10Mexico
+from apps.prescriptions import catalogo_medicamentos
+from apps.prescriptions.models import CatalogoMedicamentos
+from mau_hospital import respuestas_catalogo
+
+
+class CatalogosOfflineTests(TestCase):
+    """Snapshot de catálogos y cambios por versión para uso sin conexión"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_offline', password='x', role='ADMIN')
+        for codigo in ('A00', 'A01', 'A02'):
+            CIE10Mexico.objects.create(
+                codigo=codigo, descripcion=f'Diagnóstico {codigo}', descripcion_corta=codigo,
+                capitulo='I', categoria=codigo, activo=codigo != 'A02',
+            )
+        for clave in ('M1', 'M2'):
+            CatalogoMedicamentos.objects.create(
+                clave=clave, nombre=f'Medicamento {clave}', principio_activo='Prueba',
+                concentracion='1 mg', forma_farmaceutica='TABLETA', categoria='ANALGESICO',
+            )
+
+    def setUp(self):
+        # Cada prueba revierte las versiones: las cachés del proceso no sirven entre pruebas
+        catalogo_cie10.limpiar_cache()
+        catalogo_medicamentos.invalidar_cache_local()
+        respuestas_catalogo.limpiar_cache()
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def snapshot(self):
+        respuesta = self.client.get('/api/mobile/catalogos/snapshot/')
+        self.assertEqual(respuesta.status_code, 200)
+        encabezado, *filas = [json.loads(linea) for linea in respuesta.content.decode().splitlines()]
+        return respuesta, encabezado, filas
+
+    def cambios(self, **versiones):
+        respuesta = self.client.get('/api/mobile/catalogos/cambios/', versiones)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def filas(self, cambios):
+        return [dict(zip(cambios['campos'], fila)) for fila in cambios['filas']]
+
+    def versiones(self, encabezado):
+        return {nombre: datos['version'] for nombre, datos in encabezado['catalogos'].items()}
+
+    def test_snapshot_con_filas_activas(self):
+        respuesta, encabezado, filas = self.snapshot()
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(encabezado['catalogos']['cie10']['filas'], 2)
+        self.assertEqual(encabezado['catalogos']['medicamentos']['filas'], 2)
+        self.assertEqual([fila[1] for fila in filas if fila[0] == 'cie10'], ['A00', 'A01'])
+
+        respuesta = self.client.get(
+            '/api/mobile/catalogos/snapshot/', HTTP_IF_NONE_MATCH=respuesta['ETag']
+        )
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_cambios_desde_la_version_del_snapshot(self):
+        _respuesta, encabezado, _filas = self.snapshot()
+        versiones = self.versiones(encabezado)
+
+        datos = self.cambios(**versiones)
+        self.assertEqual(datos['cie10']['filas'], [])
+        self.assertEqual(datos['medicamentos']['filas'], [])
+
+        codigo = CIE10Mexico.objects.get(codigo='A01')
+        codigo.descripcion = 'Modificado'
+        codigo.save()
+        medicamento = CatalogoMedicamentos.objects.get(clave='M2')
+        medicamento.activo = False
+        medicamento.save()
+
+        datos = self.cambios(**versiones)
+        self.assertFalse(datos['cie10']['snapshot_requerido'])
+        codigos = self.filas(datos['cie10'])
+        self.assertEqual([(c['codigo'], c['descripcion']) for c in codigos], [('A01', 'Modificado')])
+        medicamentos = self.filas(datos['medicamentos'])
+        self.assertEqual([(m['clave'], m['activo']) for m in medicamentos], [('M2', False)])
+        self.assertGreater(datos['cie10']['version'], versiones['cie10'])
+
+    def test_eliminacion_requiere_snapshot(self):
+        _respuesta, encabezado, _filas = self.snapshot()
+        versiones = self.versiones(encabezado)
+
+        CIE10Mexico.objects.get(codigo='A00').delete()
+
+        datos = self.cambios(cie10=versiones['cie10'])
+        self.assertEqual(list(datos), ['cie10'])
+        self.assertTrue(datos['cie10']['snapshot_requerido'])
+
+        # Con el snapshot nuevo ya se pueden pedir cambios otra vez
+        _respuesta, encabezado, filas = self.snapshot()
+        self.assertEqual([fila[1] for fila in filas if fila[0] == 'cie10'], ['A01'])
+        datos = self.cambios(cie10=encabezado['catalogos']['cie10']['version'])
+        self.assertFalse(datos['cie10']['snapshot_requerido'])
+
+    def test_versiones_invalidas(self):
+        for parametros in ({}, {'cie10': 'x'}, {'medicamentos': '-1'}):
+            respuesta = self.client.get('/api/mobile/catalogos/cambios/', parametros)
+            self.assertEqual(respuesta.status_code, 400)
@@ -10,6 +10,10 @@ urlpatterns = [
     # Dashboard móvil  
     path('dashboard/', views.mobile_dashboard, name='mobile_dashboard'),
     
+    # Catálogos para uso sin conexión
+    path('catalogos/snapshot/', views.snapshot_catalogos, name='snapshot_catalogos'),
+    path('catalogos/cambios/', views.cambios_catalogos, name='cambios_catalogos'),
+    
     # Placeholder para futuras rutas móviles
     # Las demás rutas se implementarán gradualmente
 ]
@@ -9,6 +9,10 @@ from apps.patients.models import Paciente
 from apps.prescriptions.models import Receta, DetalleReceta
 from apps.authentication.models import User
 from apps.reports.services import DashboardService, AuditService
+from mau_hospital.respuestas_catalogo import respuesta_catalogo, respuesta_condicional
+from .catalogos_offline import (
+    CATALOGOS, cambios_catalogo, construir_snapshot, versiones_actuales
+)
 from .serializers import (
     MobileUserSerializer, MobilePatientSerializer,
     MobileRecipeListSerializer, MobileRecipeDetailSerializer,
@@ -110,7 +114,9 @@ def mobile_app_config(request):
             'auto_sync': True,
             'sync_frequency': 300,
             'wifi_only': False,
-            'compress_data': True
+            'compress_data': True,
+            'catalog_snapshot_url': '/api/mobile/catalogos/snapshot/',
+            'catalog_changes_url': '/api/mobile/catalogos/cambios/'
         },
         'ui_settings': {
             'theme': 'light',
@@ -126,3 +132,53 @@ def mobile_app_config(request):
     }
     
     return Response(config)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def snapshot_catalogos(request):
+    """
+    Snapshot JSON-lines de los catálogos CIE-10 y de medicamentos para uso sin conexión.
+
+    Se genera y comprime una vez por versión de los catálogos; con
+    If-None-Match vigente se responde 304.
+    """
+    versiones = versiones_actuales()
+    etag = '"offline-' + '-'.join(str(versiones[nombre]) for nombre in CATALOGOS) + '"'
+    return respuesta_condicional(request, etag, lambda: construir_snapshot(versiones))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cambios_catalogos(request):
+    """
+    Filas de los catálogos que cambiaron desde las versiones que tiene el cliente.
+
+    Parámetros: cie10, medicamentos (versión de cada catálogo en el dispositivo;
+    se responde solo por los catálogos indicados).
+    """
+    desde = {}
+    for nombre in CATALOGOS:
+        valor = request.GET.get(nombre, '').strip()
+        if not valor:
+            continue
+        try:
+            desde[nombre] = int(valor)
+        except ValueError:
+            desde[nombre] = -1
+        if desde[nombre] < 0:
+            return Response({
+                'error': f'La versión del catálogo {nombre} debe ser un número entero no negativo'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not desde:
+        return Response({
+            'error': 'Indique la versión de al menos un catálogo: ' + ', '.join(CATALOGOS)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    versiones = versiones_actuales()
+    version = '-'.join(str(versiones[nombre]) for nombre in CATALOGOS)
+    return respuesta_catalogo(request, 'offline', version, lambda: Response({
+        nombre: cambios_catalogo(nombre, version_cliente)
+        for nombre, version_cliente in desde.items()
+    }))
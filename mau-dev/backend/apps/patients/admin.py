@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Paciente, CIE10Mexico
+from .catalogo_cie10 import cambios_en_lote
+from .models import Paciente, CIE10Mexico, CIE10MexicoExtendido
 
 @admin.register(Paciente)
 class PacienteAdmin(admin.ModelAdmin):
@@ -66,6 +67,39 @@ class PacienteAdmin(admin.ModelAdmin):
     get_edad.short_description = 'Edad'
 
 
+class CIE10MexicoExtendidoInline(admin.StackedInline):
+    """Atributos extendidos del archivo oficial, en su propia tabla"""
+    
+    model = CIE10MexicoExtendido
+    can_delete = False
+    
+    fieldsets = (
+        ('Información Básica', {
+            'fields': ('letra', 'no_caracteres', 'lista1', 'grupo1', 'lista5')
+        }),
+        ('Epidemiología', {
+            'fields': (
+                'prinmorta', 'prinmorb', 'epi_clave', 'epi_clave_desc',
+                'es_causes', 'num_causes'
+            ),
+            'classes': ('collapse',)
+        }),
+        ('Vigilancia', {
+            'fields': (
+                'es_suive_morta', 'es_suive_morb', 'es_suive_est_epi',
+                'notdiaria', 'notsemanal', 'sistema_especial'
+            ),
+            'classes': ('collapse',)
+        }),
+        ('Metadatos', {
+            'fields': (
+                'consecutivo', 'year_modifi', 'year_aplicacion', 'valid'
+            ),
+            'classes': ('collapse',)
+        }),
+    )
+
+
 @admin.register(CIE10Mexico)
 class CIE10MexicoAdmin(admin.ModelAdmin):
     """Configuración del admin para el modelo CIE10Mexico"""
@@ -74,12 +108,15 @@ class CIE10MexicoAdmin(admin.ModelAdmin):
         'codigo', 'descripcion_corta', 'clave_capitulo', 'letra',
         'prinmorta', 'es_mortalidad', 'activo'
     ]
+    list_select_related = ['extendido']
     
     list_filter = [
-        'clave_capitulo', 'letra', 'es_mortalidad', 'es_morbilidad',
-        'activo', 'prinmorta', 'fecha_creacion'
+        'clave_capitulo', 'extendido__letra', 'es_mortalidad', 'es_morbilidad',
+        'activo', 'extendido__prinmorta', 'fecha_creacion'
     ]
     
+    inlines = [CIE10MexicoExtendidoInline]
+    
     search_fields = [
         'codigo', 'descripcion', 'descripcion_corta', 'categoria'
     ]
@@ -94,12 +131,12 @@ class CIE10MexicoAdmin(admin.ModelAdmin):
         ('Información Básica', {
             'fields': (
                 'codigo', 'descripcion', 'descripcion_corta',
-                'capitulo', 'categoria', 'tipo', 'letra', 'no_caracteres'
+                'capitulo', 'categoria', 'tipo'
             )
         }),
         ('Información del Capítulo', {
             'fields': (
-                'clave_capitulo', 'nombre_capitulo', 'lista1', 'grupo1', 'lista5'
+                'clave_capitulo', 'nombre_capitulo'
             )
         }),
         ('Aplicabilidad', {
@@ -107,24 +144,9 @@ class CIE10MexicoAdmin(admin.ModelAdmin):
                 'genero_aplicable', 'es_mortalidad', 'es_morbilidad', 'activo'
             )
         }),
-        ('Epidemiología', {
-            'fields': (
-                'prinmorta', 'prinmorb', 'epi_clave', 'epi_clave_desc',
-                'es_causes', 'num_causes'
-            ),
-            'classes': ('collapse',)
-        }),
-        ('Vigilancia', {
-            'fields': (
-                'es_suive_morta', 'es_suive_morb', 'es_suive_est_epi',
-                'notdiaria', 'notsemanal', 'sistema_especial'
-            ),
-            'classes': ('collapse',)
-        }),
         ('Metadatos', {
             'fields': (
-                'fecha_creacion', 'fecha_actualizacion', 'consecutivo',
-                'year_modifi', 'year_aplicacion', 'valid'
+                'fecha_creacion', 'fecha_actualizacion'
             ),
             'classes': ('collapse',)
         }),
@@ -134,11 +156,14 @@ class CIE10MexicoAdmin(admin.ModelAdmin):
     actions = ['marcar_como_activo', 'marcar_como_inactivo']
     
     def marcar_como_activo(self, request, queryset):
-        updated = queryset.update(activo=True)
+        # update() no emite señales; cambios_en_lote() incrementa la versión del catálogo
+        with cambios_en_lote():
+            updated = queryset.update(activo=True, version_cambio=None)
         self.message_user(request, f'{updated} códigos marcados como activos.')
     marcar_como_activo.short_description = 'Marcar códigos seleccionados como activos'
     
     def marcar_como_inactivo(self, request, queryset):
-        updated = queryset.update(activo=False)
+        with cambios_en_lote():
+            updated = queryset.update(activo=False, version_cambio=None)
         self.message_user(request, f'{updated} códigos marcados como inactivos.')
     marcar_como_inactivo.short_description = 'Marcar códigos seleccionados como inactivos'
@@ -5,3 +5,7 @@ class PatientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.patients'
     verbose_name = 'Pacientes'
+    
+    def ready(self):
+        """Registrar señales que mantienen la versión del catálogo CIE-10"""
+        from . import signals  # noqa: F401
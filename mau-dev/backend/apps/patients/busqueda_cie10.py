@@ -0,0 +1,190 @@
+"""
+Índice invertido en memoria para buscar códigos CIE-10 por descripción.
+
+Indexa `descripcion`, `descripcion_corta` y `nombre_capitulo` de los códigos
+activos del catálogo en memoria (ver catalogo_cie10). Los términos se
+normalizan sin acentos, sin palabras vacías y con un recorte ligero de
+plurales y terminaciones de género, y los resultados se ordenan con BM25.
+
+El índice se sincroniza con cada versión del catálogo de forma incremental:
+solo se reindexan los códigos que se agregaron, cambiaron o desactivaron. Un
+índice publicado no se modifica; la sincronización se hace sobre una copia
+que después reemplaza la referencia, así que las búsquedas no usan candado.
+"""
+import heapq
+import math
+import threading
+from collections import Counter
+
+from .catalogo_cie10 import catalogo
+from .search import tokenizar
+
+LIMITE_RESULTADOS = 10
+
+# Peso de cada campo en la frecuencia de un término
+PESOS_CAMPOS = (
+    ('descripcion_corta', 2.0),
+    ('descripcion', 1.0),
+    ('nombre_capitulo', 0.3),
+)
+
+# Parámetros de BM25
+K1 = 1.2
+B = 0.75
+
+PALABRAS_VACIAS = frozenset((
+    'a', 'al', 'con', 'de', 'del', 'e', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'otra', 'otras', 'otro', 'otros', 'para', 'por', 'sin', 'su', 'sus',
+    'u', 'un', 'una', 'y',
+))
+
+
+def raiz(token):
+    """Recorte ligero: plural y vocal final (agudas -> agud, diabetes -> diabet)"""
+    if len(token) > 3 and token.endswith('s') and not token.isdigit():
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+def terminos(texto):
+    """Términos indexables de un texto"""
+    return [raiz(token) for token in tokenizar(texto) if token not in PALABRAS_VACIAS]
+
+
+def frecuencias(registro):
+    """Frecuencia ponderada por término y longitud ponderada de un registro"""
+    conteo = Counter()
+    longitud = 0.0
+    for campo, peso in PESOS_CAMPOS:
+        for termino in terminos(getattr(registro, campo, None)):
+            conteo[termino] += peso
+            longitud += peso
+    return dict(conteo), longitud
+
+
+class IndiceCIE10:
+    """Listas invertidas término -> {código: frecuencia} con sus estadísticas de BM25"""
+
+    def __init__(self):
+        self.catalogo = None
+        self.version = None
+        self.registros = {}
+        self.documentos = {}
+        self.postings = {}
+        self.longitud_total = 0.0
+        self.normas = {}
+
+    def copia(self):
+        """Índice independiente con el mismo contenido, para sincronizarlo sin tocar este"""
+        nuevo = IndiceCIE10()
+        nuevo.registros = dict(self.registros)
+        # Las frecuencias de cada documento no se modifican, solo se reemplazan
+        nuevo.documentos = dict(self.documentos)
+        nuevo.postings = {termino: dict(lista) for termino, lista in self.postings.items()}
+        nuevo.longitud_total = self.longitud_total
+        return nuevo
+
+    def agregar(self, registro):
+        tf, longitud = frecuencias(registro)
+        self.registros[registro.codigo] = registro
+        self.documentos[registro.codigo] = (tf, longitud)
+        self.longitud_total += longitud
+        for termino, frecuencia in tf.items():
+            self.postings.setdefault(termino, {})[registro.codigo] = frecuencia
+
+    def quitar(self, codigo):
+        del self.registros[codigo]
+        tf, longitud = self.documentos.pop(codigo)
+        self.longitud_total -= longitud
+        for termino in tf:
+            lista = self.postings[termino]
+            del lista[codigo]
+            if not lista:
+                del self.postings[termino]
+
+    def sincronizar(self, catalogo_actual):
+        """Aplica solo las diferencias entre el índice y el catálogo dado; retorna cuántos códigos cambiaron"""
+        activos = {registro.codigo: registro for registro in catalogo_actual.activos}
+        cambios = 0
+
+        for codigo in [c for c in self.registros if c not in activos]:
+            self.quitar(codigo)
+            cambios += 1
+
+        for codigo, registro in activos.items():
+            anterior = self.registros.get(codigo)
+            if anterior == registro:
+                continue
+            if anterior is not None:
+                self.quitar(codigo)
+            self.agregar(registro)
+            cambios += 1
+
+        # La longitud promedio cambia con cada sincronización; la norma de BM25
+        # por documento se recalcula aquí para no hacerlo en cada búsqueda
+        promedio = self.longitud_total / len(self.documentos) if self.documentos else 1.0
+        self.normas = {
+            codigo: K1 * (1 - B + B * longitud / promedio)
+            for codigo, (_tf, longitud) in self.documentos.items()
+        }
+
+        self.catalogo = catalogo_actual
+        self.version = catalogo_actual.version
+        return cambios
+
+    def buscar(self, query, limite=LIMITE_RESULTADOS, excluir=()):
+        """Retorna [(registro, puntaje)] ordenados por relevancia"""
+        consulta = set(terminos(query))
+        total = len(self.documentos)
+        if not consulta or not total:
+            return []
+
+        normas = self.normas
+        puntajes = {}
+        for termino in consulta:
+            lista = self.postings.get(termino)
+            if not lista:
+                continue
+            peso = math.log(1 + (total - len(lista) + 0.5) / (len(lista) + 0.5)) * (K1 + 1)
+            for codigo, tf in lista.items():
+                puntajes[codigo] = puntajes.get(codigo, 0.0) + peso * tf / (tf + normas[codigo])
+
+        for codigo in excluir:
+            puntajes.pop(codigo, None)
+
+        # A igual puntaje, el código menor primero
+        mejores = heapq.nsmallest(limite, puntajes.items(), key=lambda par: (-par[1], par[0]))
+        return [(self.registros[codigo], puntaje) for codigo, puntaje in mejores]
+
+
+_lock = threading.Lock()
+_indice = IndiceCIE10()
+
+
+def indice_vigente():
+    """
+    Índice del catálogo vigente. Si el catálogo cambió, se sincroniza una copia
+    del índice publicado fuera del candado y solo el reemplazo usa el candado;
+    mientras tanto las demás búsquedas siguen leyendo el índice anterior.
+    """
+    global _indice
+
+    catalogo_actual = catalogo()
+    publicado = _indice
+    if publicado.catalogo is catalogo_actual:
+        return publicado
+
+    nuevo = publicado.copia()
+    nuevo.sincronizar(catalogo_actual)
+    with _lock:
+        # Si otro hilo publicó mientras tanto, su índice se conserva
+        if _indice is publicado:
+            _indice = nuevo
+    return nuevo
+
+
+def buscar_descripcion(query, limite=LIMITE_RESULTADOS, excluir=()):
+    """Busca en el índice de la versión vigente del catálogo"""
+    return indice_vigente().buscar(query, limite, excluir)
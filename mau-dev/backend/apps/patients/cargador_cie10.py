@@ -0,0 +1,347 @@
+"""
+Carga masiva del catálogo CIE-10.
+
+Todos los comandos que cargan códigos pasan por `CargadorCIE10`: las filas se
+comparan en memoria contra el contenido normalizado de los códigos existentes
+y solo los nuevos o modificados se escriben, con `bulk_create`/`bulk_update`
+por lotes dentro de una sola transacción. La versión del catálogo se
+incrementa una sola vez al final, no una vez por código.
+
+Los atributos del archivo oficial que no se consultan en búsquedas se
+escriben en CIE10MexicoExtendido; una fila cuenta como actualizada si cambia
+cualquiera de las dos tablas.
+
+`leer_catalogo_oficial` interpreta en streaming el archivo CSV/TXT oficial de
+la Secretaría de Salud (CONSECUTIVO, LETRA, CATALOG_KEY, NO. CARACTERES,
+NOMBRE, ...).
+"""
+import csv
+import time
+from contextlib import nullcontext
+
+from django.db import transaction
+from django.utils import timezone
+
+from .catalogo_cie10 import cambios_en_lote
+from .models import CAMPOS_EXTENDIDOS, CIE10Mexico, CIE10MexicoExtendido
+
+TAMANO_LOTE = 1000
+
+# Campos que describen un código; las fechas no cuentan como contenido
+CAMPOS_BASE = tuple(
+    campo.name for campo in CIE10Mexico._meta.concrete_fields
+    if campo.name not in ('codigo', 'fecha_creacion', 'fecha_actualizacion', 'version_cambio')
+)
+CAMPOS_CONTENIDO = CAMPOS_BASE + CAMPOS_EXTENDIDOS
+
+# Columnas del archivo oficial a partir de la sexta (CODIGOX en adelante)
+COLUMNAS_OFICIALES = (
+    'codigox', 'lsex', 'linf', 'lsup', 'trivial', 'erradicado', 'n_inter',
+    'nin', 'ninmtobs', 'cod_sit_lesion', 'no_cbd', 'cbd', 'no_aph', 'af_prin',
+    'dia_sis', 'clave_programa_sis', 'cod_complemen_morbi', 'dia_fetal',
+    'def_fetal_cm', 'def_fetal_cbd', 'clave_capitulo', 'nombre_capitulo',
+    'lista1', 'grupo1', 'lista5', 'rubrica_type', 'year_modifi',
+    'year_aplicacion', 'valid', 'prinmorta', 'prinmorb', 'lm_morbi',
+    'lm_morta', 'lgbd165', 'lomsbeck', 'lgbd190', 'notdiaria', 'notsemanal',
+    'sistema_especial', 'birmm', 'cve_causa_type', 'causa_type', 'epi_morta',
+    'edas_e_iras_en_m5', 'cve_maternas_seed_epid', 'epi_morta_m5', 'epi_morb',
+    'def_maternas', 'es_causes', 'num_causes', 'es_suive_morta',
+    'es_suive_morb', 'epi_clave', 'epi_clave_desc', 'es_suive_notin',
+    'es_suive_est_epi', 'es_suive_est_brote', 'sinac', 'prin_sinac',
+    'prin_sinac_grupo', 'descripcion_sinac_grupo', 'prin_sinac_subgrupo',
+    'descripcion_sinac_subgrupo', 'daga', 'asterisco', 'prin_mm',
+    'prin_mm_grupo', 'descripcion_mm_grupo', 'prin_mm_subgrupo',
+    'descripcion_mm_subgrupo', 'cod_adi_mort',
+)
+
+CAPITULOS_POR_LETRA = {
+    'A': 'I', 'B': 'I',      # Enfermedades infecciosas
+    'C': 'II', 'D': 'III',   # Neoplasias y enfermedades de la sangre
+    'E': 'IV',               # Enfermedades endocrinas
+    'F': 'V',                # Trastornos mentales
+    'G': 'VI',               # Sistema nervioso
+    'H': 'VII',              # Ojo y oído
+    'I': 'IX',               # Sistema circulatorio
+    'J': 'X',                # Sistema respiratorio
+    'K': 'XI',               # Sistema digestivo
+    'L': 'XII',              # Piel
+    'M': 'XIII',             # Sistema osteomuscular
+    'N': 'XIV',              # Sistema genitourinario
+    'O': 'XV',               # Embarazo
+    'P': 'XVI',              # Perinatales
+    'Q': 'XVII',             # Malformaciones
+    'R': 'XVIII',            # Síntomas
+    'S': 'XIX', 'T': 'XIX',  # Traumatismos
+    'V': 'XX', 'W': 'XX', 'X': 'XX', 'Y': 'XX',  # Causas externas
+    'Z': 'XXI'               # Factores de salud
+}
+
+
+def _entero(valor):
+    try:
+        if valor and valor.strip():
+            return int(valor.strip())
+    except (ValueError, AttributeError):
+        pass
+    return None
+
+
+def capitulo_por_codigo(codigo):
+    """Capítulo aproximado a partir de la letra del código"""
+    return CAPITULOS_POR_LETRA.get((codigo or 'A')[0].upper(), 'I')
+
+
+def tipo_por_capitulo(capitulo):
+    if capitulo == 'XIX':
+        return 'TRAUMATISMO'
+    if capitulo == 'XX':
+        return 'FACTOR_EXTERNO'
+    if capitulo in ('XXI', 'XXII'):
+        return 'FACTOR_SALUD'
+    return 'ENFERMEDAD'
+
+
+def genero_por_codigo(codigo):
+    """Embarazo y neoplasias ginecológicas son femeninos; C60-C63, masculinos"""
+    if not codigo:
+        return 'AMBOS'
+    letra = codigo[0].upper()
+    if letra == 'O':
+        return 'FEMENINO'
+    if letra == 'C' and len(codigo) >= 3:
+        try:
+            numero = int(codigo[1:3])
+        except ValueError:
+            return 'AMBOS'
+        if 50 <= numero <= 58:
+            return 'FEMENINO'
+        if 60 <= numero <= 63:
+            return 'MASCULINO'
+    return 'AMBOS'
+
+
+def es_codigo_mortalidad(codigo):
+    return bool(codigo) and codigo[0].upper() in ('A', 'B', 'C', 'I', 'J')
+
+
+def leer_catalogo_oficial(archivo):
+    """Genera un diccionario de campos por cada código del archivo oficial"""
+    for partes in csv.reader(archivo):
+        if not partes or partes[0].lstrip().startswith('#') or len(partes) < 5:
+            continue
+        codigo = partes[2].strip()
+        descripcion = partes[4].strip()
+        if not codigo or not descripcion or codigo.upper() == 'CATALOG_KEY':
+            continue
+
+        datos = {
+            'codigo': codigo,
+            'descripcion': descripcion,
+            'descripcion_corta': descripcion[:50],
+            'consecutivo': _entero(partes[0]),
+            'letra': partes[1].strip(),
+            'no_caracteres': _entero(partes[3]),
+        }
+        for campo, valor in zip(COLUMNAS_OFICIALES, partes[5:]):
+            datos[campo] = valor.strip()
+
+        capitulo = datos.get('clave_capitulo') or capitulo_por_codigo(codigo)
+        datos.update({
+            'capitulo': capitulo,
+            'categoria': codigo,
+            'tipo': tipo_por_capitulo(capitulo),
+            'genero_aplicable': genero_por_codigo(codigo),
+            'es_mortalidad': es_codigo_mortalidad(codigo),
+            'es_morbilidad': True,
+            'activo': True,
+        })
+        yield datos
+
+
+def _valor_inicial(campo):
+    """Valor que tendrá `campo` en un código recién creado sin ese dato"""
+    if campo in CAMPOS_EXTENDIDOS:
+        return None
+    return CIE10Mexico._meta.get_field(campo).get_default()
+
+
+def _normalizar(valor):
+    """Forma comparable de un valor: None y cadena vacía son equivalentes"""
+    return '' if valor is None else str(valor)
+
+
+class CargadorCIE10:
+    """
+    Inserta, actualiza y (opcionalmente) desactiva códigos por lotes.
+
+    - `actualizar_existentes=False` solo agrega códigos nuevos.
+    - `desactivar_faltantes=True` desactiva los códigos activos que no vienen
+      en la carga (para archivos que contienen el catálogo completo).
+    """
+
+    def __init__(self, dry_run=False, actualizar_existentes=True,
+                 desactivar_faltantes=False, tamano_lote=TAMANO_LOTE, progreso=None):
+        self.dry_run = dry_run
+        self.actualizar_existentes = actualizar_existentes
+        self.desactivar_faltantes = desactivar_faltantes
+        self.tamano_lote = tamano_lote
+        self.progreso = progreso
+
+    def cargar(self, filas):
+        """Aplica las filas ({'codigo': ..., campo: valor}) y retorna el resumen"""
+        inicio = time.monotonic()
+        self.resultado = {
+            'leidos': 0, 'insertados': 0, 'actualizados': 0,
+            'sin_cambios': 0, 'desactivados': 0, 'dry_run': self.dry_run,
+        }
+
+        if self.dry_run:
+            transaccion, version = nullcontext(), nullcontext()
+        else:
+            transaccion, version = transaction.atomic(), cambios_en_lote()
+        with transaccion, version:
+            self._existentes = {}
+            self._con_extendido = set()
+            filas_existentes = CIE10Mexico.objects.values_list(
+                'codigo', 'extendido__cie10', *CAMPOS_BASE,
+                *(f'extendido__{campo}' for campo in CAMPOS_EXTENDIDOS)
+            ).iterator(chunk_size=2000)
+            for codigo, extendido, *valores in filas_existentes:
+                self._existentes[codigo] = tuple(valores)
+                if extendido is not None:
+                    self._con_extendido.add(codigo)
+            self._vistos = set()
+            self._nuevos = []
+            self._modificados = {}
+            self._extendidos_nuevos = []
+            self._extendidos_modificados = {}
+
+            for datos in filas:
+                self._procesar(datos)
+
+            self._escribir()
+            if self.desactivar_faltantes:
+                self._desactivar()
+
+        self.resultado['duracion'] = time.monotonic() - inicio
+        return self.resultado
+
+    def _procesar(self, datos):
+        self.resultado['leidos'] += 1
+        datos = dict(datos)
+        codigo = datos.pop('codigo').strip()
+        campos = tuple(sorted(c for c in datos if c in CAMPOS_CONTENIDO))
+
+        # Si un código se repite en la carga, gana la última fila
+        if codigo in self._vistos:
+            self._escribir()
+        self._vistos.add(codigo)
+
+        base = tuple(c for c in campos if c in CAMPOS_BASE)
+        extendidos = tuple(c for c in campos if c in CAMPOS_EXTENDIDOS)
+
+        existente = self._existentes.get(codigo)
+        if existente is None:
+            self._nuevos.append(CIE10Mexico(codigo=codigo, **{c: datos[c] for c in base}))
+            if extendidos:
+                self._extendidos_nuevos.append(
+                    CIE10MexicoExtendido(cie10_id=codigo, **{c: datos[c] for c in extendidos})
+                )
+                self._con_extendido.add(codigo)
+            self._existentes[codigo] = tuple(
+                datos.get(c, _valor_inicial(c)) for c in CAMPOS_CONTENIDO
+            )
+            self.resultado['insertados'] += 1
+        elif not self.actualizar_existentes:
+            self.resultado['sin_cambios'] += 1
+        else:
+            actual = dict(zip(CAMPOS_CONTENIDO, existente))
+            cambiados = tuple(c for c in campos if _normalizar(actual[c]) != _normalizar(datos[c]))
+            if not cambiados:
+                self.resultado['sin_cambios'] += 1
+            else:
+                actual.update((c, datos[c]) for c in campos)
+                self._existentes[codigo] = tuple(actual[c] for c in CAMPOS_CONTENIDO)
+                if any(c in CAMPOS_BASE for c in cambiados):
+                    self._modificados.setdefault(base, []).append(
+                        CIE10Mexico(codigo=codigo, **{c: datos[c] for c in base})
+                    )
+                if any(c in CAMPOS_EXTENDIDOS for c in cambiados):
+                    extendido = CIE10MexicoExtendido(
+                        cie10_id=codigo, **{c: datos[c] for c in extendidos}
+                    )
+                    if codigo in self._con_extendido:
+                        self._extendidos_modificados.setdefault(extendidos, []).append(extendido)
+                    else:
+                        self._extendidos_nuevos.append(extendido)
+                        self._con_extendido.add(codigo)
+                self.resultado['actualizados'] += 1
+
+        if self._pendientes() >= self.tamano_lote:
+            self._escribir()
+
+    def _pendientes(self):
+        return (
+            len(self._nuevos) + sum(len(m) for m in self._modificados.values())
+            + len(self._extendidos_nuevos)
+            + sum(len(m) for m in self._extendidos_modificados.values())
+        )
+
+    def _escribir(self):
+        if not self.dry_run:
+            if self._nuevos:
+                CIE10Mexico.objects.bulk_create(self._nuevos, batch_size=self.tamano_lote)
+            # bulk_update no aplica auto_now, por eso la fecha se asigna aquí;
+            # version_cambio queda nulo hasta que cambios_en_lote() incrementa la versión
+            ahora = timezone.now()
+            for campos, codigos in self._modificados.items():
+                for codigo in codigos:
+                    codigo.fecha_actualizacion = ahora
+                CIE10Mexico.objects.bulk_update(
+                    codigos, list(campos) + ['fecha_actualizacion', 'version_cambio'],
+                    batch_size=self.tamano_lote
+                )
+            # Los atributos extendidos se escriben después de sus códigos
+            if self._extendidos_nuevos:
+                CIE10MexicoExtendido.objects.bulk_create(
+                    self._extendidos_nuevos, batch_size=self.tamano_lote
+                )
+            for campos, extendidos in self._extendidos_modificados.items():
+                CIE10MexicoExtendido.objects.bulk_update(
+                    extendidos, list(campos), batch_size=self.tamano_lote
+                )
+
+        escritos = self._pendientes()
+        self._nuevos = []
+        self._modificados = {}
+        self._extendidos_nuevos = []
+        self._extendidos_modificados = {}
+        if escritos and self.progreso:
+            self.progreso(self.resultado)
+
+    def _desactivar(self):
+        indice_activo = CAMPOS_CONTENIDO.index('activo')
+        faltantes = [
+            codigo for codigo, valores in self._existentes.items()
+            if valores[indice_activo] and codigo not in self._vistos
+        ]
+        self.resultado['desactivados'] = len(faltantes)
+        if self.dry_run:
+            return
+        for inicio in range(0, len(faltantes), self.tamano_lote):
+            CIE10Mexico.objects.filter(
+                codigo__in=faltantes[inicio:inicio + self.tamano_lote]
+            ).update(activo=False, fecha_actualizacion=timezone.now(), version_cambio=None)
+
+
+def resumen_carga(resultado):
+    """Texto del resumen de una carga para la salida de los comandos"""
+    prefijo = '🔍 Simulación (sin cambios): ' if resultado['dry_run'] else ''
+    return (
+        f'{prefijo}📄 Leídos: {resultado["leidos"]} | '
+        f'✅ Insertados: {resultado["insertados"]} | '
+        f'🔄 Actualizados: {resultado["actualizados"]} | '
+        f'➖ Sin cambios: {resultado["sin_cambios"]} | '
+        f'🚫 Desactivados: {resultado["desactivados"]} | '
+        f'⏱️ {resultado["duracion"]:.2f}s'
+    )
@@ -0,0 +1,333 @@
+"""
+Cachés en memoria del proceso para el catálogo CIE-10.
+
+El catálogo cambia muy rara vez, así que se carga completo una sola vez por
+versión (`VersionCatalogo`, incrementada al guardar o eliminar códigos) como
+un diccionario código -> registro inmutable, y los datos derivados se
+comparten entre peticiones como tuplas. La versión se consulta a lo más cada
+`INTERVALO_VERIFICACION` segundos, así que las búsquedas por código no tocan
+la base de datos; el proceso que modifica el catálogo se invalida al momento.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import contextmanager
+from types import MappingProxyType
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import CIE10Mexico, VersionCatalogo
+from .search import normalizar_texto, tokenizar
+
+CATALOGO_CIE10 = 'cie10'
+
+GENEROS_PACIENTE = ('M', 'F', 'O')
+
+# Segundos durante los que se confía en la versión leída sin volver a consultarla
+INTERVALO_VERIFICACION = 5
+
+LIMITE_PREFIJO = 10
+
+CAMPOS_CATALOGO = tuple(campo.attname for campo in CIE10Mexico._meta.concrete_fields)
+
+
+def normalizar_codigo(codigo):
+    """Forma de búsqueda de un código: sin puntos ni espacios y en mayúsculas (e11.9 -> E119)"""
+    return ''.join(str(codigo or '').split()).replace('.', '').upper()
+
+
+class RegistroCIE10(namedtuple('RegistroCIE10', CAMPOS_CATALOGO)):
+    """Fila del catálogo; los serializadores de CIE10Mexico la aceptan tal cual"""
+
+    __slots__ = ()
+
+    def instancia(self):
+        """Instancia de CIE10Mexico equivalente, para asignar llaves foráneas sin consultar"""
+        return CIE10Mexico.from_db('default', CAMPOS_CATALOGO, tuple(self))
+
+
+class CatalogoCIE10:
+    """Catálogo completo de una versión; no se modifica una vez construido"""
+
+    def __init__(self, version, registros):
+        self.version = version
+        self.por_codigo = MappingProxyType({r.codigo: r for r in registros})
+        self.activos = tuple(sorted((r for r in registros if r.activo), key=lambda r: r.codigo))
+        self.codigos_activos = frozenset(r.codigo for r in self.activos)
+
+        # Índice por prefijo: códigos normalizados ordenados, en paralelo a sus registros
+        ordenados = sorted(self.activos, key=lambda r: (normalizar_codigo(r.codigo), r.codigo))
+        self.claves_prefijo = tuple(normalizar_codigo(r.codigo) for r in ordenados)
+        self.registros_prefijo = tuple(ordenados)
+
+    def obtener(self, codigo, solo_activos=True):
+        """Registro del código (sin distinguir mayúsculas) o None"""
+        registro = self.por_codigo.get((codigo or '').strip().upper())
+        if registro is None:
+            registro = self.por_codigo.get(codigo)
+        if registro is None or (solo_activos and not registro.activo):
+            return None
+        return registro
+
+    def buscar_prefijo(self, prefijo, limite=LIMITE_PREFIJO):
+        """
+        Códigos activos que empiezan con `prefijo` (normalizado), en orden.
+
+        Retorna (registros, total): dos búsquedas binarias delimitan el rango,
+        así que el costo es O(log n + limite) sin importar cuántos coincidan.
+        """
+        prefijo = normalizar_codigo(prefijo)
+        if not prefijo:
+            return [], 0
+        inicio = bisect_left(self.claves_prefijo, prefijo)
+        fin = bisect_left(self.claves_prefijo, prefijo + '\uffff', inicio)
+        return list(self.registros_prefijo[inicio:min(fin, inicio + limite)]), fin - inicio
+
+
+# Reentrante: los conjuntos por género se construyen a partir de catalogo()
+_lock = threading.RLock()
+_verificacion = (None, 0.0)
+_catalogo = None
+_aplicables = (None, {})
+_estadisticas = (None, None, None)
+_carga = threading.local()
+
+
+def version_catalogo():
+    """Versión actual del catálogo CIE-10 (consultada a lo más cada INTERVALO_VERIFICACION)"""
+    global _verificacion
+
+    version, verificada = _verificacion
+    ahora = time.monotonic()
+    if version is None or ahora - verificada >= INTERVALO_VERIFICACION:
+        version = VersionCatalogo.obtener(CATALOGO_CIE10)
+        _verificacion = (version, ahora)
+    return version
+
+
+def invalidar_cache_local():
+    """Obliga a releer la versión en la siguiente consulta de este proceso"""
+    global _verificacion
+    _verificacion = (None, 0.0)
+
+
+def limpiar_cache():
+    """
+    Descarta el catálogo y los datos derivados de este proceso; útil cuando la
+    versión retrocede, como al revertir la transacción de una prueba
+    """
+    global _verificacion, _catalogo, _aplicables, _estadisticas
+
+    with _lock:
+        _verificacion = (None, 0.0)
+        _catalogo = None
+        _aplicables = (None, {})
+        _estadisticas = (None, None, None)
+
+
+def en_carga_masiva():
+    """True dentro de cambios_en_lote() en este hilo"""
+    return getattr(_carga, 'nivel', 0) > 0
+
+
+@contextmanager
+def cambios_en_lote():
+    """
+    Agrupa muchos cambios al catálogo en un solo incremento de versión.
+
+    Dentro del bloque las señales no incrementan la versión por cada código;
+    se incrementa una vez al salir sin errores y los códigos modificados
+    (con `version_cambio` nulo) quedan marcados con la nueva versión.
+    """
+    if not en_carga_masiva():
+        _carga.eliminacion = False
+    _carga.nivel = getattr(_carga, 'nivel', 0) + 1
+    try:
+        yield
+    finally:
+        _carga.nivel -= 1
+    if not en_carga_masiva():
+        incrementar_version(eliminacion=_carga.eliminacion)
+
+
+def registrar_eliminacion():
+    """Dentro de cambios_en_lote(), hace que el incremento final cuente como eliminación"""
+    _carga.eliminacion = True
+
+
+def incrementar_version(eliminacion=False):
+    """Incrementa la versión, marca los códigos pendientes e invalida la caché local"""
+    VersionCatalogo.incrementar(
+        CATALOGO_CIE10, pendientes=CIE10Mexico.objects.all(), eliminacion=eliminacion
+    )
+    invalidar_cache_local()
+
+
+def catalogo():
+    """Catálogo CIE-10 de la versión vigente"""
+    global _catalogo
+
+    version = version_catalogo()
+    actual = _catalogo
+    if actual is not None and actual.version == version:
+        return actual
+
+    with _lock:
+        if _catalogo is None or _catalogo.version != version:
+            registros = [
+                RegistroCIE10(*fila)
+                for fila in CIE10Mexico.objects.values_list(*CAMPOS_CATALOGO).iterator(chunk_size=2000)
+            ]
+            _catalogo = CatalogoCIE10(version, registros)
+        return _catalogo
+
+
+def obtener_codigo(codigo, solo_activos=True):
+    """Registro de un código CIE-10 o None, sin consultar la base de datos"""
+    return catalogo().obtener(codigo, solo_activos)
+
+
+def buscar_prefijo(prefijo, limite=LIMITE_PREFIJO):
+    """Autocompletado de códigos: (registros, total) de los que empiezan con `prefijo`"""
+    return catalogo().buscar_prefijo(prefijo, limite)
+
+
+def codigos_activos():
+    """Conjunto inmutable de los códigos activos"""
+    return catalogo().codigos_activos
+
+
+def filtrar_registros(registros, texto, campos, limite=None, excluir=()):
+    """Registros cuyo valor en alguno de `campos` contiene `texto`, sin distinguir mayúsculas"""
+    texto = (texto or '').lower()
+    encontrados = []
+    for registro in registros:
+        if registro.codigo in excluir:
+            continue
+        if any(texto in (getattr(registro, campo) or '').lower() for campo in campos):
+            encontrados.append(registro)
+            if limite and len(encontrados) >= limite:
+                break
+    return encontrados
+
+
+def _calcular_estadisticas():
+    """Conteos del catálogo activo con un solo GROUP BY por (capítulo, tipo)"""
+    grupos = CIE10Mexico.objects.filter(activo=True).order_by().values(
+        'capitulo', 'tipo'
+    ).annotate(
+        total=Count('codigo'),
+        mortalidad=Count('codigo', filter=Q(es_mortalidad=True)),
+        morbilidad=Count('codigo', filter=Q(es_morbilidad=True)),
+    )
+
+    por_capitulo = {}
+    por_tipo = {}
+    resumen = {'total_codigos': 0, 'codigos_mortalidad': 0, 'codigos_morbilidad': 0}
+    for grupo in grupos:
+        por_capitulo[grupo['capitulo']] = por_capitulo.get(grupo['capitulo'], 0) + grupo['total']
+        por_tipo[grupo['tipo']] = por_tipo.get(grupo['tipo'], 0) + grupo['total']
+        resumen['total_codigos'] += grupo['total']
+        resumen['codigos_mortalidad'] += grupo['mortalidad']
+        resumen['codigos_morbilidad'] += grupo['morbilidad']
+
+    return {
+        'total_codigos': resumen['total_codigos'],
+        'estadisticas_capitulos': [
+            {'capitulo': capitulo, 'total_codigos': total}
+            for capitulo, total in sorted(por_capitulo.items(), key=lambda x: x[0] or '')
+        ],
+        'estadisticas_tipos': [
+            {'tipo': tipo, 'total_codigos': total}
+            for tipo, total in sorted(por_tipo.items(), key=lambda x: x[0] or '')
+        ],
+        'codigos_mortalidad': resumen['codigos_mortalidad'],
+        'codigos_morbilidad': resumen['codigos_morbilidad'],
+    }
+
+
+def estadisticas_catalogo():
+    """
+    Estadísticas del catálogo para la versión vigente.
+
+    Retorna (datos, calculado_en); los datos se comparten entre peticiones y
+    no deben modificarse.
+    """
+    global _estadisticas
+
+    version = version_catalogo()
+    version_cache, datos, calculado_en = _estadisticas
+    if version_cache == version:
+        return datos, calculado_en
+
+    with _lock:
+        if _estadisticas[0] != version:
+            _estadisticas = (version, _calcular_estadisticas(), timezone.now())
+        return _estadisticas[1], _estadisticas[2]
+
+
+def aplica_a_genero(genero_aplicable, genero):
+    """Misma regla que CIE10Mexico.is_aplicable_for_patient, sin instancias"""
+    if genero_aplicable == 'MASCULINO':
+        return genero == 'M'
+    if genero_aplicable == 'FEMENINO':
+        return genero == 'F'
+    return True
+
+
+def _construir_aplicables():
+    """Serializa los códigos activos una vez y los reparte por género del paciente"""
+    from .serializers import CIE10MexicoBusquedaSerializer
+
+    conjuntos = {genero: [] for genero in GENEROS_PACIENTE}
+
+    for codigo in catalogo().activos:
+        entrada = (
+            codigo.codigo.upper(),
+            normalizar_texto(f"{codigo.descripcion_corta or ''} {codigo.descripcion or ''}"),
+            CIE10MexicoBusquedaSerializer(codigo).data,
+        )
+        for genero in GENEROS_PACIENTE:
+            if aplica_a_genero(codigo.genero_aplicable, genero):
+                conjuntos[genero].append(entrada)
+
+    return {genero: tuple(entradas) for genero, entradas in conjuntos.items()}
+
+
+def conjuntos_aplicables():
+    """Retorna {genero: tupla de entradas} para la versión vigente del catálogo"""
+    global _aplicables
+
+    version = version_catalogo()
+    version_cache, conjuntos = _aplicables
+    if version_cache == version:
+        return conjuntos
+
+    with _lock:
+        if _aplicables[0] != version:
+            _aplicables = (version, _construir_aplicables())
+        return _aplicables[1]
+
+
+def codigos_aplicables(genero, query=''):
+    """
+    Códigos CIE-10 aplicables a un género de paciente ya serializados.
+
+    `query` filtra por prefijo de código o por palabras (sin acentos) de la
+    descripción. Los diccionarios devueltos se comparten: no deben modificarse.
+    """
+    conjuntos = conjuntos_aplicables()
+    entradas = conjuntos.get(genero, conjuntos['O'])
+
+    query = (query or '').strip()
+    if not query:
+        return [datos for _codigo, _texto, datos in entradas]
+
+    prefijo = query.upper()
+    palabras = tokenizar(query)
+    return [
+        datos for codigo, texto, datos in entradas
+        if codigo.startswith(prefijo) or (palabras and all(p in texto for p in palabras))
+    ]
@@ -0,0 +1,153 @@
+"""
+Edición por lote de los diagnósticos CIE-10 de un paciente.
+
+Aplica altas, cambios, bajas y el diagnóstico principal en una sola
+transacción, con un número fijo de consultas sin importar cuántos
+diagnósticos se modifiquen.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .catalogo_cie10 import codigos_activos
+from .models import Paciente, PacienteCIE10
+
+
+class ErrorDiagnosticos(Exception):
+    """Cambios inválidos; el mensaje se devuelve tal cual al cliente"""
+
+
+def _elegir_principal(diagnosticos, principal, marcados):
+    """Determina el diagnóstico principal del conjunto final"""
+    if principal:
+        for diagnostico in diagnosticos:
+            if diagnostico.cie10_id == principal:
+                return diagnostico
+        raise ErrorDiagnosticos(
+            f'El diagnóstico principal {principal} no está entre los diagnósticos del paciente'
+        )
+
+    if len(marcados) > 1:
+        raise ErrorDiagnosticos('Solo puede haber un diagnóstico principal')
+    if marcados:
+        return marcados[0]
+
+    # Conservar el principal actual; si se eliminó, usar el más reciente
+    actuales = [d for d in diagnosticos if d.es_principal]
+    if actuales:
+        return actuales[0]
+    if diagnosticos:
+        return max(diagnosticos, key=lambda d: d.fecha_diagnostico)
+    return None
+
+
+def aplicar_cambios(expediente, cambios, usuario=None):
+    """
+    Aplica los cambios validados por PacienteCIE10LoteSerializer.
+
+    Retorna el paciente actualizado. Lanza Paciente.DoesNotExist o
+    ErrorDiagnosticos; en ese caso no se guarda ningún cambio.
+    """
+    agregar = cambios.get('agregar', [])
+    actualizar = cambios.get('actualizar', [])
+    eliminar = set(cambios.get('eliminar', []))
+    principal = (cambios.get('principal') or '').strip().upper() or None
+
+    with transaction.atomic():
+        # Bloquear al paciente serializa ediciones concurrentes de sus diagnósticos
+        paciente = Paciente.objects.select_for_update().get(expediente=expediente)
+        existentes = {d.id: d for d in PacienteCIE10.objects.filter(paciente=paciente)}
+
+        desconocidos = (eliminar | {c['id'] for c in actualizar}) - set(existentes)
+        if desconocidos:
+            raise ErrorDiagnosticos(
+                f'Diagnósticos no encontrados para este paciente: {sorted(desconocidos)}'
+            )
+
+        conflicto = eliminar & {c['id'] for c in actualizar}
+        if conflicto:
+            raise ErrorDiagnosticos(
+                f'No se puede actualizar y eliminar el mismo diagnóstico: {sorted(conflicto)}'
+            )
+
+        conservados = {id_: d for id_, d in existentes.items() if id_ not in eliminar}
+        marcados = []
+
+        # Cambios a diagnósticos existentes
+        modificados = set()
+        for cambio in actualizar:
+            diagnostico = conservados[cambio['id']]
+            for campo in ('fecha_diagnostico', 'observaciones'):
+                if campo in cambio:
+                    setattr(diagnostico, campo, cambio[campo])
+                    modificados.add(diagnostico.id)
+            if cambio.get('es_principal'):
+                marcados.append(diagnostico)
+            elif 'es_principal' in cambio and diagnostico.es_principal:
+                diagnostico.es_principal = False
+                modificados.add(diagnostico.id)
+
+        # Diagnósticos nuevos: los códigos se validan contra el catálogo en memoria
+        codigos_usados = {d.cie10_id for d in conservados.values()}
+        codigos_nuevos = [c['cie10'].strip().upper() for c in agregar]
+        repetidos = sorted(
+            {c for c in codigos_nuevos if c in codigos_usados or codigos_nuevos.count(c) > 1}
+        )
+        if repetidos:
+            raise ErrorDiagnosticos(f'Códigos CIE-10 repetidos para el paciente: {repetidos}')
+
+        invalidos = sorted(set(codigos_nuevos) - codigos_activos())
+        if invalidos:
+            raise ErrorDiagnosticos(f'Códigos CIE-10 no encontrados o inactivos: {invalidos}')
+
+        nuevos = []
+        for codigo, datos in zip(codigos_nuevos, agregar):
+            diagnostico = PacienteCIE10(
+                paciente=paciente,
+                cie10_id=codigo,
+                fecha_diagnostico=datos.get('fecha_diagnostico') or paciente.fecha_diagnostico,
+                observaciones=datos.get('observaciones') or '',
+                es_principal=False,
+            )
+            nuevos.append(diagnostico)
+            if datos.get('es_principal'):
+                marcados.append(diagnostico)
+
+        finales = list(conservados.values()) + nuevos
+        elegido = _elegir_principal(finales, principal, marcados)
+
+        for diagnostico in finales:
+            es_principal = diagnostico is elegido
+            if diagnostico.es_principal != es_principal:
+                diagnostico.es_principal = es_principal
+                if diagnostico.id:
+                    modificados.add(diagnostico.id)
+
+        if eliminar:
+            PacienteCIE10.objects.filter(paciente=paciente, id__in=eliminar).delete()
+        if modificados:
+            # bulk_update no aplica auto_now, por eso updated_at se asigna aquí
+            ahora = timezone.now()
+            actualizados = [conservados[id_] for id_ in modificados]
+            for diagnostico in actualizados:
+                diagnostico.updated_at = ahora
+            PacienteCIE10.objects.bulk_update(
+                actualizados,
+                ['fecha_diagnostico', 'observaciones', 'es_principal', 'updated_at']
+            )
+        if nuevos:
+            PacienteCIE10.objects.bulk_create(nuevos)
+
+        # Desnormalización del diagnóstico principal en el paciente, una sola vez
+        if elegido is not None:
+            paciente.cie10 = elegido.cie10_id
+            paciente.fecha_diagnostico = elegido.fecha_diagnostico
+        else:
+            paciente.cie10 = ''
+        paciente.updated_by = usuario
+        # Con update_fields, save() no marca la actividad; editar diagnósticos sí cuenta
+        paciente.ultima_actividad = timezone.now()
+        paciente.save(update_fields=[
+            'cie10', 'fecha_diagnostico', 'updated_by', 'updated_at', 'ultima_actividad'
+        ])
+
+    return paciente
@@ -0,0 +1,92 @@
+"""
+Detección de duplicados de pacientes por lotes.
+
+Pensado para validar importaciones completas: en lugar de una petición y dos
+consultas por fila, se consultan los expedientes y CURPs de cada bloque de
+filas con dos consultas `IN` y se reportan las colisiones por número de fila.
+"""
+from .models import Paciente
+
+LIMITE_FILAS = 5000
+TAMANO_BLOQUE = 900
+
+# Campos que necesita PacienteBusquedaSerializer
+CAMPOS_RESUMEN = (
+    'expediente', 'nombre', 'apellido_paterno', 'apellido_materno', 'curp',
+    'fecha_nacimiento', 'genero', 'patologia', 'telefono',
+)
+
+
+def normalizar_clave(valor):
+    """Mismo formato con el que Paciente.save() guarda expediente y CURP"""
+    # Las hojas de cálculo exportan expedientes numéricos como números
+    return '' if valor is None else str(valor).strip().upper()
+
+
+def _bloques(valores, tamano):
+    valores = list(valores)
+    for inicio in range(0, len(valores), tamano):
+        yield valores[inicio:inicio + tamano]
+
+
+def pacientes_existentes(campo, valores, tamano_bloque=TAMANO_BLOQUE, campos=CAMPOS_RESUMEN):
+    """Retorna {valor: paciente} para los valores de `campo` que ya existen"""
+    encontrados = {}
+    for bloque in _bloques(set(valores), tamano_bloque):
+        for paciente in Paciente.objects.filter(**{f'{campo}__in': bloque}).only(*campos):
+            encontrados[getattr(paciente, campo)] = paciente
+    return encontrados
+
+
+def buscar_duplicados(filas, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Busca colisiones para una lista de filas {'expediente': ..., 'curp': ...}.
+
+    Retorna {indice_fila: [colisiones]}, solo para las filas con colisiones.
+    Cada colisión es contra un paciente existente (tipo 'expediente'/'curp',
+    con el paciente encontrado) o contra una fila anterior del mismo lote
+    (tipo 'expediente_lote'/'curp_lote', con el índice de esa fila).
+    """
+    claves = [
+        (normalizar_clave(fila.get('expediente')), normalizar_clave(fila.get('curp')))
+        for fila in filas
+    ]
+
+    por_expediente = pacientes_existentes(
+        'expediente', (exp for exp, _curp in claves if exp), tamano_bloque
+    )
+    por_curp = pacientes_existentes(
+        'curp', (curp for _exp, curp in claves if curp), tamano_bloque
+    )
+
+    colisiones = {}
+    vistos = {'expediente': {}, 'curp': {}}
+    for indice, (expediente, curp) in enumerate(claves):
+        encontrados = []
+        for campo, valor, existentes in (
+            ('expediente', expediente, por_expediente),
+            ('curp', curp, por_curp),
+        ):
+            if not valor:
+                continue
+            if valor in existentes:
+                encontrados.append({
+                    'tipo': campo,
+                    'campo': campo,
+                    'valor': valor,
+                    'paciente': existentes[valor],
+                })
+            if valor in vistos[campo]:
+                encontrados.append({
+                    'tipo': f'{campo}_lote',
+                    'campo': campo,
+                    'valor': valor,
+                    'fila': vistos[campo][valor],
+                })
+            else:
+                vistos[campo][valor] = indice
+
+        if encontrados:
+            colisiones[indice] = encontrados
+
+    return colisiones
@@ -0,0 +1,121 @@
+"""
+Recalculo masivo del estado (activo/inactivo) de los pacientes.
+
+Un paciente está activo si tuvo actividad (edición de su registro, o una receta
+creada o con cambio de estado) en los últimos cuatro años, según la columna
+desnormalizada `Paciente.ultima_actividad`. El cálculo se hace por conjuntos:
+cada lote de pacientes a cambiar se obtiene con una consulta y se actualiza
+con un único UPDATE, sin cargar ni guardar pacientes uno por uno.
+"""
+import time
+from datetime import timedelta
+
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from .models import Paciente
+
+DIAS_INACTIVIDAD = 4 * 365
+TAMANO_LOTE = 5000
+
+
+def fecha_limite_actividad(ahora=None):
+    """Fecha a partir de la cual la actividad mantiene activo a un paciente"""
+    return (ahora or timezone.now()) - timedelta(days=DIAS_INACTIVIDAD)
+
+
+def _con_actividad_reciente(fecha_limite):
+    """
+    Condición: última actividad (registro o recetas) desde fecha_limite. Sin
+    `ultima_actividad` cuenta `updated_at`, igual que Paciente.calcular_estado_automatico
+    """
+    return Q(GreaterThanOrEqual(Coalesce('ultima_actividad', 'updated_at'), fecha_limite))
+
+
+def pacientes_a_activar(fecha_limite):
+    return Paciente.objects.filter(is_active=False).filter(_con_actividad_reciente(fecha_limite))
+
+
+def pacientes_a_inactivar(fecha_limite):
+    return Paciente.objects.filter(is_active=True).exclude(_con_actividad_reciente(fecha_limite))
+
+
+def _expedientes_en_lotes(queryset, tamano_lote):
+    """Recorre los expedientes del queryset en lotes ordenados (sin OFFSET)"""
+    ultimo = None
+    while True:
+        lote = queryset if ultimo is None else queryset.filter(expediente__gt=ultimo)
+        expedientes = list(
+            lote.order_by('expediente').values_list('expediente', flat=True)[:tamano_lote]
+        )
+        if not expedientes:
+            return
+        yield expedientes
+        ultimo = expedientes[-1]
+
+
+def recalcular_estados(fecha_limite=None, dry_run=False, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Activa o inactiva pacientes según su última actividad.
+
+    `progreso(nuevo_estado, expedientes)` se llama después de cada lote.
+    Retorna un diccionario con los conteos y la duración en segundos.
+    """
+    inicio = time.monotonic()
+    fecha_limite = fecha_limite or fecha_limite_actividad()
+
+    resultado = {'activados': 0, 'inactivados': 0}
+    for clave, nuevo_estado, candidatos in (
+        ('activados', True, pacientes_a_activar(fecha_limite)),
+        ('inactivados', False, pacientes_a_inactivar(fecha_limite)),
+    ):
+        if dry_run:
+            resultado[clave] = candidatos.count()
+            continue
+
+        for expedientes in _expedientes_en_lotes(candidatos, tamano_lote):
+            resultado[clave] += Paciente.objects.filter(
+                expediente__in=expedientes
+            ).update(is_active=nuevo_estado)
+            if progreso:
+                progreso(nuevo_estado, expedientes)
+
+    resultado.update(Paciente.objects.aggregate(
+        total=Count('expediente'),
+        activos=Count('expediente', filter=Q(is_active=True)),
+    ))
+    resultado['inactivos'] = resultado['total'] - resultado['activos']
+    resultado['duracion'] = time.monotonic() - inicio
+    return resultado
+
+
+def expresion_ultima_actividad():
+    """Expresión SQL con la actividad real: max(updated_at, última receta)"""
+    from apps.prescriptions.models import Receta
+
+    ultima_receta = Receta.objects.filter(
+        paciente_id=OuterRef('expediente')
+    ).order_by().values('paciente_id').annotate(
+        ultima=Max('fecha_creacion')
+    ).values('ultima')
+
+    return Greatest(F('updated_at'), Coalesce(Subquery(ultima_receta), F('updated_at')))
+
+
+def sincronizar_ultima_actividad(tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Recalcula `ultima_actividad` desde updated_at y las recetas, por lotes.
+
+    Sirve para el llenado inicial y para corregir cargas masivas que no pasan
+    por save(). Retorna el número de pacientes procesados.
+    """
+    total = 0
+    for expedientes in _expedientes_en_lotes(Paciente.objects.all(), tamano_lote):
+        total += Paciente.objects.filter(expediente__in=expedientes).update(
+            ultima_actividad=expresion_ultima_actividad()
+        )
+        if progreso:
+            progreso(total)
+    return total
@@ -0,0 +1,315 @@
+"""
+Importación masiva de pacientes desde archivos CSV o JSONL.
+
+Las filas se leen en streaming y se validan en memoria: reglas del modelo
+(expresiones regulares, longitudes, opciones), duplicados contra el conjunto
+de expedientes/CURPs precargado y códigos CIE-10 contra el catálogo activo.
+Las filas válidas se insertan con `bulk_create` por lotes, junto con sus
+diagnósticos y sus entradas del índice de búsqueda.
+
+Formato de `cie10_codes`:
+- CSV: códigos separados por ";" (el primero es el diagnóstico principal).
+- JSONL: lista de códigos o de objetos {cie10, es_principal, fecha_diagnostico, observaciones}.
+"""
+import csv
+import json
+import re
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .catalogo_cie10 import codigos_activos
+from .models import Paciente, PacienteCIE10, PacienteIndiceBusqueda
+from .search import construir_entradas
+
+TAMANO_LOTE = 1000
+
+# Filas rechazadas que el endpoint incluye en su respuesta
+LIMITE_RECHAZOS_RESPUESTA = 500
+
+# El endpoint importa dentro de la petición; las cargas mayores van por el
+# comando import_patients
+TAMANO_MAXIMO_ENDPOINT = 5 * 1024 * 1024
+LIMITE_FILAS_ENDPOINT = 5000
+
+CAMPOS_PACIENTE = (
+    'expediente', 'nombre', 'apellido_paterno', 'apellido_materno',
+    'curp', 'fecha_nacimiento', 'genero', 'patologia', 'cie10',
+    'fecha_diagnostico', 'tipo_sangre', 'alergias', 'telefono',
+    'direccion', 'contacto_emergencia_nombre',
+    'contacto_emergencia_telefono', 'numero_seguro_social',
+    'institucion_seguro',
+)
+
+FORMATOS = ('csv', 'jsonl')
+
+_SEPARADOR_CODIGOS = re.compile(r'[;|]')
+_CAMPO_FECHA_DIAGNOSTICO = PacienteCIE10._meta.get_field('fecha_diagnostico')
+
+
+class LimiteFilasExcedido(Exception):
+    """El archivo tiene más filas de las permitidas"""
+
+    def __init__(self, limite):
+        super().__init__(f'El archivo excede {limite} filas')
+        self.limite = limite
+
+
+class ErrorImportacion(Exception):
+    """Error de una fila; `errores` es un diccionario campo -> mensajes"""
+
+    def __init__(self, errores):
+        super().__init__(errores)
+        self.errores = errores
+
+
+def detectar_formato(nombre_archivo):
+    """Infiere el formato a partir de la extensión del archivo"""
+    nombre = (nombre_archivo or '').lower()
+    if nombre.endswith('.jsonl') or nombre.endswith('.ndjson'):
+        return 'jsonl'
+    if nombre.endswith('.csv'):
+        return 'csv'
+    return None
+
+
+def leer_filas(archivo, formato):
+    """
+    Lee un archivo de texto en streaming.
+
+    Genera tuplas (linea, fila, error_lectura); `fila` es None si la línea no
+    pudo interpretarse.
+    """
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila, None
+        return
+
+    for linea, texto in enumerate(archivo, start=1):
+        if not texto.strip():
+            continue
+        try:
+            fila = json.loads(texto)
+        except ValueError as e:
+            yield linea, None, f'JSON inválido: {e}'
+            continue
+        if not isinstance(fila, dict):
+            yield linea, None, 'Cada línea debe ser un objeto JSON'
+            continue
+        yield linea, fila, None
+
+
+def limitar_filas(filas, limite):
+    """Deja pasar las filas de leer_filas() y lanza LimiteFilasExcedido después de `limite`"""
+    for numero, fila in enumerate(filas, start=1):
+        if numero > limite:
+            raise LimiteFilasExcedido(limite)
+        yield fila
+
+
+class ImportadorPacientes:
+    """Valida e inserta pacientes por lotes con un número fijo de consultas por lote"""
+
+    def __init__(self, usuario=None, tamano_lote=TAMANO_LOTE, dry_run=False, al_rechazar=None):
+        self.usuario = usuario
+        self.tamano_lote = tamano_lote
+        self.dry_run = dry_run
+        self.al_rechazar = al_rechazar
+
+        self.expedientes = set()
+        self.curps = set()
+        self.catalogo = set()
+
+        self.leidos = 0
+        self.importados = 0
+        self.rechazados = 0
+
+    def cargar_referencias(self):
+        """Precarga las llaves existentes y los códigos CIE-10 activos"""
+        self.expedientes = set(
+            Paciente.objects.values_list('expediente', flat=True).iterator(chunk_size=10000)
+        )
+        self.curps = set(
+            Paciente.objects.values_list('curp', flat=True).iterator(chunk_size=10000)
+        )
+        self.catalogo = codigos_activos()
+
+    def importar(self, filas):
+        """Procesa las filas de leer_filas() y retorna el resumen de la importación"""
+        inicio = time.monotonic()
+        self.cargar_referencias()
+
+        lote = []
+        for linea, fila, error_lectura in filas:
+            self.leidos += 1
+            if error_lectura:
+                self._rechazar(linea, {'fila': [error_lectura]}, fila)
+                continue
+
+            try:
+                lote.append((linea, fila) + self.preparar(fila))
+            except ErrorImportacion as e:
+                self._rechazar(linea, e.errores, fila)
+                continue
+
+            if len(lote) >= self.tamano_lote:
+                self._insertar(lote)
+                lote = []
+
+        if lote:
+            self._insertar(lote)
+
+        return {
+            'leidos': self.leidos,
+            'importados': self.importados,
+            'rechazados': self.rechazados,
+            'dry_run': self.dry_run,
+            'duracion': time.monotonic() - inicio,
+        }
+
+    def preparar(self, fila):
+        """Valida una fila en memoria y retorna (paciente, diagnosticos) sin guardar"""
+        datos = {}
+        for campo in CAMPOS_PACIENTE:
+            valor = fila.get(campo)
+            if isinstance(valor, str):
+                valor = valor.strip()
+            if valor not in (None, ''):
+                datos[campo] = valor
+
+        paciente = Paciente(**datos)
+        paciente.normalizar_datos()
+
+        errores = {}
+        diagnosticos = []
+        try:
+            diagnosticos = self._diagnosticos(fila.get('cie10_codes'))
+        except ErrorImportacion as e:
+            errores.update(e.errores)
+
+        # El diagnóstico principal llena el campo cie10 si no viene en la fila
+        if diagnosticos and not paciente.cie10:
+            paciente.cie10 = next(d['cie10'] for d in diagnosticos if d['es_principal'])
+
+        try:
+            paciente.full_clean(
+                exclude=['created_by', 'updated_by'],
+                validate_unique=False,
+                validate_constraints=False
+            )
+        except ValidationError as e:
+            errores.update(e.message_dict)
+
+        if paciente.expediente in self.expedientes:
+            errores.setdefault('expediente', []).append(
+                f'Ya existe un paciente con el expediente {paciente.expediente}'
+            )
+        if paciente.curp in self.curps:
+            errores.setdefault('curp', []).append('Ya existe un paciente con esta CURP')
+
+        if errores:
+            raise ErrorImportacion(errores)
+
+        # Reservar las llaves para detectar duplicados dentro del mismo archivo
+        self.expedientes.add(paciente.expediente)
+        self.curps.add(paciente.curp)
+
+        paciente.ultima_actividad = timezone.now()
+        paciente.created_by = self.usuario
+        paciente.updated_by = self.usuario
+
+        return paciente, [
+            PacienteCIE10(
+                paciente_id=paciente.expediente,
+                cie10_id=diagnostico['cie10'],
+                fecha_diagnostico=diagnostico.get('fecha_diagnostico') or paciente.fecha_diagnostico,
+                es_principal=diagnostico['es_principal'],
+                observaciones=diagnostico.get('observaciones') or '',
+            )
+            for diagnostico in diagnosticos
+        ]
+
+    def _diagnosticos(self, codigos):
+        """Normaliza cie10_codes y lo valida contra el catálogo en memoria"""
+        if not codigos:
+            return []
+
+        if isinstance(codigos, str):
+            codigos = [c.strip() for c in _SEPARADOR_CODIGOS.split(codigos) if c.strip()]
+            diagnosticos = [
+                {'cie10': codigo, 'es_principal': indice == 0}
+                for indice, codigo in enumerate(codigos)
+            ]
+        elif isinstance(codigos, list):
+            diagnosticos = [
+                dict(codigo) if isinstance(codigo, dict) else {'cie10': codigo}
+                for codigo in codigos
+            ]
+            if not any(d.get('es_principal') for d in diagnosticos):
+                diagnosticos[0]['es_principal'] = True
+        else:
+            raise ErrorImportacion({'cie10_codes': ['Formato de códigos CIE-10 inválido']})
+
+        errores = []
+        vistos = set()
+        for diagnostico in diagnosticos:
+            codigo = str(diagnostico.get('cie10') or '').strip().upper()
+            diagnostico['cie10'] = codigo
+            diagnostico['es_principal'] = bool(diagnostico.get('es_principal'))
+            if codigo not in self.catalogo:
+                errores.append(f'Código CIE-10 no encontrado o inactivo: {codigo}')
+            elif codigo in vistos:
+                errores.append(f'Código CIE-10 repetido: {codigo}')
+            vistos.add(codigo)
+
+            if diagnostico.get('fecha_diagnostico'):
+                try:
+                    diagnostico['fecha_diagnostico'] = _CAMPO_FECHA_DIAGNOSTICO.to_python(
+                        diagnostico['fecha_diagnostico']
+                    )
+                except ValidationError:
+                    errores.append(f'Fecha de diagnóstico inválida para {codigo}')
+
+        if sum(d['es_principal'] for d in diagnosticos) > 1:
+            errores.append('Solo puede haber un diagnóstico principal')
+
+        if errores:
+            raise ErrorImportacion({'cie10_codes': errores})
+        return diagnosticos
+
+    def _insertar(self, lote):
+        """Inserta un lote completo; si choca con otra escritura, reintenta fila por fila"""
+        if self.dry_run:
+            self.importados += len(lote)
+            return
+
+        try:
+            with transaction.atomic():
+                self._bulk_create(lote)
+            self.importados += len(lote)
+        except IntegrityError:
+            for elemento in lote:
+                try:
+                    with transaction.atomic():
+                        self._bulk_create([elemento])
+                    self.importados += 1
+                except IntegrityError as e:
+                    linea, fila = elemento[0], elemento[1]
+                    self._rechazar(linea, {'fila': [f'Conflicto al guardar: {e}']}, fila)
+
+    def _bulk_create(self, lote):
+        pacientes = [paciente for _linea, _fila, paciente, _diagnosticos in lote]
+        diagnosticos = [d for _linea, _fila, _paciente, ds in lote for d in ds]
+        entradas = [e for paciente in pacientes for e in construir_entradas(paciente)]
+
+        Paciente.objects.bulk_create(pacientes, batch_size=self.tamano_lote)
+        PacienteCIE10.objects.bulk_create(diagnosticos, batch_size=self.tamano_lote)
+        PacienteIndiceBusqueda.objects.bulk_create(entradas, batch_size=self.tamano_lote)
+
+    def _rechazar(self, linea, errores, fila):
+        self.rechazados += 1
+        if self.al_rechazar:
+            self.al_rechazar(linea, errores, fila)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from apps.patients.estado import TAMANO_LOTE, sincronizar_ultima_actividad
+import time
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la última actividad de los pacientes a partir de su registro y sus recetas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Número de pacientes actualizados por lote (default: {TAMANO_LOTE})',
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+
+        self.stdout.write('🕒 Recalculando última actividad de pacientes...')
+
+        total = sincronizar_ultima_actividad(
+            tamano_lote=options['batch_size'],
+            progreso=lambda procesados: self.stdout.write(f'  - {procesados} pacientes procesados...'),
+        )
+
+        duracion = time.monotonic() - inicio
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Última actividad actualizada: {total} pacientes en {duracion:.2f}s'
+            )
+        )
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
+from apps.patients.cargador_cie10 import CargadorCIE10, resumen_carga
+from apps.patients.catalogo_cie10 import cambios_en_lote
 from apps.patients.models import CIE10Mexico
 import logging
 
@@ -20,25 +22,32 @@ class Command(BaseCommand):
             default=15000,
             help='Número objetivo de códigos a crear (default: 15000)',
         )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Generar el catálogo y contar los códigos nuevos sin guardarlos',
+        )
 
     def handle(self, *args, **options):
-        if options['clear']:
+        if options['clear'] and not options['dry_run']:
             self.stdout.write('Limpiando catálogo CIE-10 existente...')
-            CIE10Mexico.objects.all().delete()
+            with cambios_en_lote():
+                CIE10Mexico.objects.all().delete()
             self.stdout.write(self.style.SUCCESS('Catálogo limpiado exitosamente'))
 
         target_count = options['target']
         self.stdout.write(f'Creando catálogo CIE-10 con objetivo de {target_count} códigos...')
         
-        codes_created = self.create_extensive_catalog(target_count)
+        resultado = self.create_extensive_catalog(target_count, options['dry_run'])
         
         self.stdout.write(
-            self.style.SUCCESS(f'Catálogo CIE-10 creado exitosamente: {codes_created} códigos')
+            self.style.SUCCESS(f'Catálogo CIE-10 creado exitosamente: {resultado["insertados"]} códigos')
         )
+        self.stdout.write(resumen_carga(resultado))
 
-    def create_extensive_catalog(self, target_count):
+    def create_extensive_catalog(self, target_count, dry_run=False):
         """Crear un catálogo extenso con el número objetivo de códigos"""
-        codes_created = 0
+        codes = {}
         
         # Definir los capítulos principales del CIE-10
         chapters = [
@@ -72,35 +81,25 @@ class Command(BaseCommand):
         
         # Generar códigos para cada capítulo
         for letter, chapter_num, description, tipo in chapters:
-            if codes_created >= target_count:
+            if len(codes) >= target_count:
                 break
                 
             self.stdout.write(f'Procesando capítulo {chapter_num}: {description}...')
             
             # Generar códigos para este capítulo
-            chapter_codes = self.generate_chapter_codes(letter, chapter_num, description, tipo, target_count, codes_created)
-            
-            # Crear los códigos en la base de datos
+            chapter_codes = self.generate_chapter_codes(letter, chapter_num, description, tipo, target_count, len(codes))
             for code_data in chapter_codes:
-                if codes_created >= target_count:
+                if len(codes) >= target_count:
                     break
-                    
-                try:
-                    cie10, created = CIE10Mexico.objects.get_or_create(
-                        codigo=code_data['codigo'],
-                        defaults=code_data
-                    )
-                    if created:
-                        codes_created += 1
-                        
-                        # Mostrar progreso cada 1000 códigos
-                        if codes_created % 1000 == 0:
-                            self.stdout.write(f'  - {codes_created} códigos creados...')
-                            
-                except Exception as e:
-                    logger.error(f'Error al crear código {code_data["codigo"]}: {e}')
+                codes.setdefault(code_data['codigo'], code_data)
         
-        return codes_created
+        # Los códigos existentes se conservan tal cual; solo se agregan los nuevos
+        cargador = CargadorCIE10(
+            dry_run=dry_run,
+            actualizar_existentes=False,
+            progreso=lambda r: self.stdout.write(f'  - {r["insertados"]} códigos creados...'),
+        )
+        return cargador.cargar(codes.values())
 
     def generate_chapter_codes(self, letter, chapter_num, description, tipo, target_count, current_count):
         """Generar códigos para un capítulo específico"""
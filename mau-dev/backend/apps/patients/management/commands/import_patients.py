@@ -0,0 +1,106 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.authentication.models import User
+from apps.patients.importacion import (
+    FORMATOS, TAMANO_LOTE, ImportadorPacientes, detectar_formato, leer_filas
+)
+import csv
+import json
+
+
+class Command(BaseCommand):
+    help = 'Importa pacientes y sus códigos CIE-10 desde un archivo CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'archivo',
+            type=str,
+            help='Ruta del archivo CSV o JSONL con los pacientes',
+        )
+        parser.add_argument(
+            '--formato',
+            choices=FORMATOS,
+            help='Formato del archivo (por defecto se infiere de la extensión)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Número de pacientes insertados por lote (default: {TAMANO_LOTE})',
+        )
+        parser.add_argument(
+            '--rechazos',
+            type=str,
+            help='Archivo CSV donde se escriben las filas rechazadas (default: <archivo>.rechazos.csv)',
+        )
+        parser.add_argument(
+            '--usuario',
+            type=str,
+            help='Username que se registra como creador de los pacientes',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validar el archivo sin insertar pacientes',
+        )
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        formato = options['formato'] or detectar_formato(archivo)
+        if not formato:
+            raise CommandError('No se pudo inferir el formato; use --formato csv|jsonl')
+
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f'Usuario no encontrado: {options["usuario"]}')
+
+        ruta_rechazos = options['rechazos'] or f'{archivo}.rechazos.csv'
+
+        self.stdout.write(f'📥 Importando pacientes desde {archivo} ({formato})...')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('MODO DRY-RUN: No se harán cambios reales'))
+
+        try:
+            entrada = open(archivo, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir el archivo: {e}')
+
+        with entrada, open(ruta_rechazos, 'w', encoding='utf-8', newline='') as salida:
+            escritor = csv.writer(salida)
+            escritor.writerow(['linea', 'errores', 'datos'])
+
+            def al_rechazar(linea, errores, fila):
+                escritor.writerow([
+                    linea,
+                    json.dumps(errores, ensure_ascii=False),
+                    json.dumps(fila, ensure_ascii=False, default=str) if fila else '',
+                ])
+
+            importador = ImportadorPacientes(
+                usuario=usuario,
+                tamano_lote=options['batch_size'],
+                dry_run=options['dry_run'],
+                al_rechazar=al_rechazar,
+            )
+            try:
+                resumen = importador.importar(leer_filas(entrada, formato))
+            except UnicodeDecodeError as e:
+                raise CommandError(f'El archivo debe estar codificado en UTF-8: {e}')
+
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write('RESUMEN DE IMPORTACIÓN')
+        self.stdout.write('='*50)
+        self.stdout.write(f'Filas leídas: {resumen["leidos"]}')
+        self.stdout.write(f'Rechazadas: {resumen["rechazados"]} (ver {ruta_rechazos})')
+        self.stdout.write(f'Tiempo: {resumen["duracion"]:.2f}s')
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'🔍 DRY-RUN: {resumen["importados"]} pacientes válidos')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'✅ Pacientes importados: {resumen["importados"]}')
+            )
@@ -5,6 +5,8 @@ Basado en los datos oficiales de la Secretaría de Salud
 """
 
 from django.core.management.base import BaseCommand
+from apps.patients.cargador_cie10 import CargadorCIE10, resumen_carga
+from apps.patients.catalogo_cie10 import cambios_en_lote
 from apps.patients.models import CIE10Mexico
 import json
 
@@ -18,13 +20,19 @@ class Command(BaseCommand):
             action='store_true',
             help='Fuerza la recarga de datos, eliminando los existentes'
         )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar qué códigos se crearían o actualizarían sin guardar cambios'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('🏥 Iniciando carga del catálogo CIE-10 México...')
         
-        if options['force']:
+        if options['force'] and not options['dry_run']:
             self.stdout.write('⚠️  Eliminando datos existentes...')
-            CIE10Mexico.objects.all().delete()
+            with cambios_en_lote():
+                CIE10Mexico.objects.all().delete()
         
         # Datos iniciales del CIE-10 México (muestra representativa)
         cie10_data = [
@@ -365,36 +373,19 @@ class Command(BaseCommand):
             }
         ]
         
-        # Cargar datos en la base de datos
-        created_count = 0
-        updated_count = 0
-        
-        for data in cie10_data:
-            codigo = data.pop('codigo')
-            cie10_obj, created = CIE10Mexico.objects.get_or_create(
-                codigo=codigo,
-                defaults=data
-            )
-            
-            if created:
-                created_count += 1
-                self.stdout.write(f'✅ Creado: {codigo} - {cie10_obj.descripcion_corta}')
-            else:
-                # Actualizar datos existentes
-                for key, value in data.items():
-                    setattr(cie10_obj, key, value)
-                cie10_obj.save()
-                updated_count += 1
-                self.stdout.write(f'🔄 Actualizado: {codigo} - {cie10_obj.descripcion_corta}')
+        # Cargar datos en la base de datos: un solo lote para todos los códigos
+        resultado = CargadorCIE10(dry_run=options['dry_run']).cargar(cie10_data)
         
         self.stdout.write(
             self.style.SUCCESS(
                 f'\n🎉 Carga completada:\n'
-                f'   ✅ Creados: {created_count} códigos\n'
-                f'   🔄 Actualizados: {updated_count} códigos\n'
+                f'   ✅ Creados: {resultado["insertados"]} códigos\n'
+                f'   🔄 Actualizados: {resultado["actualizados"]} códigos\n'
+                f'   ➖ Sin cambios: {resultado["sin_cambios"]} códigos\n'
                 f'   📊 Total en BD: {CIE10Mexico.objects.count()} códigos'
             )
         )
+        self.stdout.write(resumen_carga(resultado))
         
         self.stdout.write(
             '\n📝 Nota: Este es un catálogo inicial con códigos comunes.\n'
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.patients.models import Paciente, PacienteIndiceBusqueda
+from apps.patients.search import CAMPOS_INDEXADOS, construir_entradas
+import time
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de pacientes (términos normalizados sin acentos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Número de pacientes procesados por lote (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        inicio = time.monotonic()
+
+        self.stdout.write('🔍 Reconstruyendo índice de búsqueda de pacientes...')
+
+        pacientes = Paciente.objects.only(*CAMPOS_INDEXADOS).order_by('expediente')
+        total_pacientes = 0
+        total_terminos = 0
+
+        with transaction.atomic():
+            PacienteIndiceBusqueda.objects.all().delete()
+
+            entradas = []
+            for paciente in pacientes.iterator(chunk_size=batch_size):
+                entradas.extend(construir_entradas(paciente))
+                total_pacientes += 1
+
+                if total_pacientes % batch_size == 0:
+                    PacienteIndiceBusqueda.objects.bulk_create(entradas, batch_size=batch_size)
+                    total_terminos += len(entradas)
+                    entradas = []
+                    self.stdout.write(f'  - {total_pacientes} pacientes indexados...')
+
+            if entradas:
+                PacienteIndiceBusqueda.objects.bulk_create(entradas, batch_size=batch_size)
+                total_terminos += len(entradas)
+
+        duracion = time.monotonic() - inicio
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Índice reconstruido: {total_pacientes} pacientes, '
+                f'{total_terminos} términos en {duracion:.2f}s'
+            )
+        )
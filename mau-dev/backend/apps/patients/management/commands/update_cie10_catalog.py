@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
+from apps.patients.cargador_cie10 import CargadorCIE10, resumen_carga
+from apps.patients.catalogo_cie10 import cambios_en_lote
 from apps.patients.models import CIE10Mexico
 import logging
 
@@ -19,11 +21,18 @@ class Command(BaseCommand):
             action='store_true',
             help='Agregar solo una muestra de códigos para pruebas',
         )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Contar los códigos que se agregarían sin guardarlos',
+        )
 
     def handle(self, *args, **options):
-        if options['clear']:
+        self.dry_run = options['dry_run']
+        if options['clear'] and not self.dry_run:
             self.stdout.write('Limpiando catálogo CIE-10 existente...')
-            CIE10Mexico.objects.all().delete()
+            with cambios_en_lote():
+                CIE10Mexico.objects.all().delete()
             self.stdout.write(self.style.SUCCESS('Catálogo limpiado exitosamente'))
 
         if options['sample']:
@@ -31,6 +40,10 @@ class Command(BaseCommand):
         else:
             self.create_full_catalog()
 
+    def cargar(self, codigos):
+        """Agrega los códigos nuevos en un solo lote; los existentes no se modifican"""
+        return CargadorCIE10(dry_run=self.dry_run, actualizar_existentes=False).cargar(codigos)
+
     def create_sample_codes(self):
         """Crear una muestra de códigos CIE-10 para pruebas"""
         self.stdout.write('Creando muestra de códigos CIE-10...')
@@ -442,31 +455,14 @@ class Command(BaseCommand):
             }
         ]
         
-        created_count = 0
-        for code_data in sample_codes:
-            try:
-                cie10, created = CIE10Mexico.objects.get_or_create(
-                    codigo=code_data['codigo'],
-                    defaults={
-                        'descripcion': code_data['descripcion'],
-                        'descripcion_corta': code_data['descripcion_corta'],
-                        'capitulo': code_data['capitulo'],
-                        'categoria': code_data['categoria'],
-                        'tipo': code_data['tipo'],
-                        'genero_aplicable': code_data['genero_aplicable'],
-                        'es_mortalidad': code_data['es_mortalidad'],
-                        'es_morbilidad': code_data['es_morbilidad'],
-                        'activo': True
-                    }
-                )
-                if created:
-                    created_count += 1
-            except Exception as e:
-                logger.error(f'Error al crear código {code_data["codigo"]}: {e}')
+        resultado = self.cargar(
+            dict(code_data, activo=True) for code_data in sample_codes
+        )
         
         self.stdout.write(
-            self.style.SUCCESS(f'Se crearon {created_count} códigos CIE-10 de muestra')
+            self.style.SUCCESS(f'Se crearon {resultado["insertados"]} códigos CIE-10 de muestra')
         )
+        self.stdout.write(resumen_carga(resultado))
 
     def create_full_catalog(self):
         """Crear catálogo completo de CIE-10"""
@@ -575,35 +571,28 @@ class Command(BaseCommand):
             ]
         }
         
-        total_created = 0
+        # Todas las categorías se cargan juntas en un solo lote
         for category_name, codes in categories.items():
-            self.stdout.write(f'Procesando {category_name}...')
-            category_created = 0
-            
-            for codigo, descripcion, descripcion_corta, capitulo, categoria, tipo, genero, mortalidad, morbilidad in codes:
-                try:
-                    cie10, created = CIE10Mexico.objects.get_or_create(
-                        codigo=codigo,
-                        defaults={
-                            'descripcion': descripcion,
-                            'descripcion_corta': descripcion_corta,
-                            'capitulo': capitulo,
-                            'categoria': categoria,
-                            'tipo': tipo,
-                            'genero_aplicable': genero,
-                            'es_mortalidad': mortalidad,
-                            'es_morbilidad': morbilidad,
-                            'activo': True
-                        }
-                    )
-                    if created:
-                        category_created += 1
-                        total_created += 1
-                except Exception as e:
-                    logger.error(f'Error al crear código {codigo}: {e}')
-            
-            self.stdout.write(f'  - {category_name}: {category_created} códigos creados')
+            self.stdout.write(f'  - {category_name}: {len(codes)} códigos')
+        
+        resultado = self.cargar(
+            {
+                'codigo': codigo,
+                'descripcion': descripcion,
+                'descripcion_corta': descripcion_corta,
+                'capitulo': capitulo,
+                'categoria': categoria,
+                'tipo': tipo,
+                'genero_aplicable': genero,
+                'es_mortalidad': mortalidad,
+                'es_morbilidad': morbilidad,
+                'activo': True
+            }
+            for codes in categories.values()
+            for codigo, descripcion, descripcion_corta, capitulo, categoria, tipo, genero, mortalidad, morbilidad in codes
+        )
         
         self.stdout.write(
-            self.style.SUCCESS(f'Catálogo CIE-10 actualizado: {total_created} códigos creados')
+            self.style.SUCCESS(f'Catálogo CIE-10 actualizado: {resultado["insertados"]} códigos creados')
         )
+        self.stdout.write(resumen_carga(resultado))
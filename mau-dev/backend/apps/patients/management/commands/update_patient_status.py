@@ -1,8 +1,5 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from apps.patients.models import Paciente
-from apps.prescriptions.models import Receta
+from apps.patients.estado import TAMANO_LOTE, fecha_limite_actividad, recalcular_estados
 
 
 class Command(BaseCommand):
@@ -17,15 +14,24 @@ class Command(BaseCommand):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Forzar la actualización de todos los pacientes',
+            help=(
+                'Se acepta por compatibilidad con tareas programadas existentes; no tiene '
+                'efecto porque el recálculo siempre revisa a todos los pacientes'
+            ),
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Número de pacientes actualizados por lote (default: {TAMANO_LOTE})',
         )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
-        force = options['force']
+        verbosity = options['verbosity']
         
         # Fecha límite: 4 años atrás desde hoy
-        fecha_limite = timezone.now() - timedelta(days=4*365)
+        fecha_limite = fecha_limite_actividad()
         
         self.stdout.write(
             self.style.SUCCESS(
@@ -41,59 +47,31 @@ class Command(BaseCommand):
                 self.style.WARNING('MODO DRY-RUN: No se harán cambios reales')
             )
         
-        # Obtener todos los pacientes
-        pacientes = Paciente.objects.all()
-        total_pacientes = pacientes.count()
-        
-        self.stdout.write(f'Total de pacientes: {total_pacientes}')
+        def progreso(nuevo_estado, expedientes):
+            accion = 'ACTIVADOS' if nuevo_estado else 'INACTIVADOS'
+            self.stdout.write(f'  - Lote de {len(expedientes)} pacientes {accion}')
+            if verbosity >= 2:
+                self.stdout.write(f'    {", ".join(expedientes)}')
         
-        pacientes_activos = 0
-        pacientes_inactivos = 0
-        pacientes_actualizados = 0
+        # Cada lote se confirma por separado para no bloquear la tabla completa
+        resultado = recalcular_estados(
+            fecha_limite=fecha_limite,
+            dry_run=dry_run,
+            tamano_lote=options['batch_size'],
+            progreso=progreso,
+        )
         
-        for paciente in pacientes:
-            # Verificar si el paciente ha tenido actividad reciente
-            # Buscar la receta más reciente del paciente
-            ultima_receta = Receta.objects.filter(
-                paciente=paciente
-            ).order_by('-created_at').first()
-            
-            # Buscar la última actualización del paciente
-            ultima_actividad = paciente.updated_at
-            
-            # Si hay recetas, usar la fecha de la más reciente
-            if ultima_receta and ultima_receta.created_at > ultima_actividad:
-                ultima_actividad = ultima_receta.created_at
-            
-            # Determinar si debe estar activo
-            debe_estar_activo = ultima_actividad >= fecha_limite
-            
-            # Verificar si el estado actual es correcto
-            if paciente.is_active != debe_estar_activo:
-                if not dry_run:
-                    paciente.is_active = debe_estar_activo
-                    paciente.save(update_fields=['is_active'])
-                    pacientes_actualizados += 1
-                
-                self.stdout.write(
-                    f'Paciente {paciente.expediente} - {paciente.get_nombre_completo()}: '
-                    f'{"ACTIVADO" if debe_estar_activo else "INACTIVADO"} '
-                    f'(Última actividad: {ultima_actividad.strftime("%d/%m/%Y")})'
-                )
-            
-            # Contar estados
-            if paciente.is_active:
-                pacientes_activos += 1
-            else:
-                pacientes_inactivos += 1
+        pacientes_actualizados = resultado['activados'] + resultado['inactivados']
         
         # Resumen final
         self.stdout.write('\n' + '='*50)
         self.stdout.write('RESUMEN DE ACTUALIZACIÓN')
         self.stdout.write('='*50)
-        self.stdout.write(f'Total de pacientes: {total_pacientes}')
-        self.stdout.write(f'Pacientes activos: {pacientes_activos}')
-        self.stdout.write(f'Pacientes inactivos: {pacientes_inactivos}')
+        self.stdout.write(f'Total de pacientes: {resultado["total"]}')
+        self.stdout.write(f'Pacientes activos: {resultado["activos"]}')
+        self.stdout.write(f'Pacientes inactivos: {resultado["inactivos"]}')
+        self.stdout.write(f'Activados: {resultado["activados"]} - Inactivados: {resultado["inactivados"]}')
+        self.stdout.write(f'Tiempo: {resultado["duracion"]:.2f}s')
         
         if dry_run:
             self.stdout.write(
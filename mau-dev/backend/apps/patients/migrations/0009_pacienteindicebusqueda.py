@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def poblar_indice_busqueda(apps, schema_editor):
+    """Indexar los pacientes existentes"""
+    from apps.patients.search import terminos_paciente
+
+    Paciente = apps.get_model('patients', 'Paciente')
+    PacienteIndiceBusqueda = apps.get_model('patients', 'PacienteIndiceBusqueda')
+
+    entradas = []
+    for paciente in Paciente.objects.iterator(chunk_size=2000):
+        for campo, termino in sorted(terminos_paciente(paciente)):
+            entradas.append(PacienteIndiceBusqueda(
+                paciente_id=paciente.expediente, campo=campo, termino=termino
+            ))
+        if len(entradas) >= 5000:
+            PacienteIndiceBusqueda.objects.bulk_create(entradas)
+            entradas = []
+    PacienteIndiceBusqueda.objects.bulk_create(entradas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0008_pacientecie10_paciente_cie10_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PacienteIndiceBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(help_text='Término normalizado para búsqueda por prefijo', max_length=100, verbose_name='Término')),
+                ('campo', models.CharField(choices=[('EXPEDIENTE', 'Expediente'), ('CURP', 'CURP'), ('NOMBRE', 'Nombre')], max_length=10, verbose_name='Campo de origen')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indice_busqueda', to='patients.paciente', verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Índice de Búsqueda de Paciente',
+                'verbose_name_plural': 'Índice de Búsqueda de Pacientes',
+                'db_table': 'pacientes_indice_busqueda',
+                'indexes': [models.Index(fields=['termino', 'paciente'], name='pacientes_i_termino_52fda9_idx'), models.Index(fields=['campo', 'termino'], name='pacientes_i_campo_93e6f3_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_indice_busqueda, migrations.RunPython.noop),
+    ]
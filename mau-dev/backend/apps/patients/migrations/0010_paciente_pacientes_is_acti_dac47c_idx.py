@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0009_pacienteindicebusqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['is_active', 'apellido_paterno', 'apellido_materno', 'nombre', 'expediente'], name='pacientes_is_acti_dac47c_idx'),
+        ),
+    ]
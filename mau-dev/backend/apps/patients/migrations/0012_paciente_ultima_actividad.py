@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:34
+
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def llenar_ultima_actividad(apps, schema_editor):
+    """Inicializa ultima_actividad con max(updated_at, última receta) en un solo UPDATE"""
+    Paciente = apps.get_model('patients', 'Paciente')
+    Receta = apps.get_model('prescriptions', 'Receta')
+    
+    ultima_receta = Receta.objects.filter(
+        paciente_id=OuterRef('expediente')
+    ).order_by().values('paciente_id').annotate(
+        ultima=Max('fecha_creacion')
+    ).values('ultima')
+    
+    Paciente.objects.update(
+        ultima_actividad=Greatest(F('updated_at'), Coalesce(Subquery(ultima_receta), F('updated_at')))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0011_versioncatalogo'),
+        ('prescriptions', '0006_receta_recetas_fecha_c_9d52f8_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='ultima_actividad',
+            field=models.DateTimeField(blank=True, help_text='Más reciente entre la edición del registro y la creación o cambio de estado de sus recetas', null=True, verbose_name='Última Actividad'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['ultima_actividad'], name='pacientes_ultima__d2b54a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['is_active', 'ultima_actividad'], name='pacientes_is_acti_055742_idx'),
+        ),
+        migrations.RunPython(llenar_ultima_actividad, migrations.RunPython.noop),
+    ]
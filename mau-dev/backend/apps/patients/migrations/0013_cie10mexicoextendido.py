@@ -0,0 +1,433 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Copia fija de los campos movidos (no depende del modelo actual)
+CAMPOS_EXTENDIDOS = (
+    'consecutivo', 'letra', 'no_caracteres', 'codigox', 'lsex', 'linf', 'lsup',
+    'trivial', 'erradicado', 'n_inter', 'nin', 'ninmtobs', 'cod_sit_lesion',
+    'no_cbd', 'cbd', 'no_aph', 'af_prin', 'dia_sis', 'clave_programa_sis',
+    'cod_complemen_morbi', 'dia_fetal', 'def_fetal_cm', 'def_fetal_cbd',
+    'lista1', 'grupo1', 'lista5', 'rubrica_type', 'year_modifi',
+    'year_aplicacion', 'valid', 'prinmorta', 'prinmorb', 'lm_morbi',
+    'lm_morta', 'lgbd165', 'lomsbeck', 'lgbd190', 'notdiaria', 'notsemanal',
+    'sistema_especial', 'birmm', 'cve_causa_type', 'causa_type', 'epi_morta',
+    'edas_e_iras_en_m5', 'cve_maternas_seed_epid', 'epi_morta_m5', 'epi_morb',
+    'def_maternas', 'es_causes', 'num_causes', 'es_suive_morta',
+    'es_suive_morb', 'epi_clave', 'epi_clave_desc', 'es_suive_notin',
+    'es_suive_est_epi', 'es_suive_est_brote', 'sinac', 'prin_sinac',
+    'prin_sinac_grupo', 'descripcion_sinac_grupo', 'prin_sinac_subgrupo',
+    'descripcion_sinac_subgrupo', 'daga', 'asterisco', 'prin_mm',
+    'prin_mm_grupo', 'descripcion_mm_grupo', 'prin_mm_subgrupo',
+    'descripcion_mm_subgrupo', 'cod_adi_mort',
+)
+
+
+def copiar_atributos_extendidos(apps, schema_editor):
+    """Copia los atributos extendidos de cada código a la nueva tabla"""
+    CIE10Mexico = apps.get_model('patients', 'CIE10Mexico')
+    CIE10MexicoExtendido = apps.get_model('patients', 'CIE10MexicoExtendido')
+
+    lote = []
+    filas = CIE10Mexico.objects.values_list('codigo', *CAMPOS_EXTENDIDOS)
+    for fila in filas.iterator(chunk_size=2000):
+        lote.append(CIE10MexicoExtendido(cie10_id=fila[0], **dict(zip(CAMPOS_EXTENDIDOS, fila[1:]))))
+        if len(lote) >= 1000:
+            CIE10MexicoExtendido.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        CIE10MexicoExtendido.objects.bulk_create(lote)
+
+
+def restaurar_atributos_extendidos(apps, schema_editor):
+    """Devuelve los atributos extendidos a cie10_mexico"""
+    CIE10Mexico = apps.get_model('patients', 'CIE10Mexico')
+    CIE10MexicoExtendido = apps.get_model('patients', 'CIE10MexicoExtendido')
+
+    filas = CIE10MexicoExtendido.objects.values_list('cie10_id', *CAMPOS_EXTENDIDOS)
+    for fila in filas.iterator(chunk_size=2000):
+        CIE10Mexico.objects.filter(codigo=fila[0]).update(**dict(zip(CAMPOS_EXTENDIDOS, fila[1:])))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0012_paciente_ultima_actividad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CIE10MexicoExtendido',
+            fields=[
+                ('cie10', models.OneToOneField(db_column='codigo', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='extendido', serialize=False, to='patients.cie10mexico', verbose_name='Código CIE-10')),
+                ('consecutivo', models.IntegerField(blank=True, null=True, verbose_name='Consecutivo')),
+                ('letra', models.CharField(blank=True, max_length=1, null=True, verbose_name='Letra del código')),
+                ('no_caracteres', models.IntegerField(blank=True, null=True, verbose_name='Número de caracteres')),
+                ('codigox', models.CharField(blank=True, max_length=10, null=True, verbose_name='Código X')),
+                ('lsex', models.CharField(blank=True, max_length=10, null=True, verbose_name='LSEX')),
+                ('linf', models.CharField(blank=True, max_length=10, null=True, verbose_name='LINF')),
+                ('lsup', models.CharField(blank=True, max_length=10, null=True, verbose_name='LSUP')),
+                ('trivial', models.CharField(blank=True, max_length=10, null=True, verbose_name='Trivial')),
+                ('erradicado', models.CharField(blank=True, max_length=10, null=True, verbose_name='Erradicado')),
+                ('n_inter', models.CharField(blank=True, max_length=10, null=True, verbose_name='N_INTER')),
+                ('nin', models.CharField(blank=True, max_length=10, null=True, verbose_name='NIN')),
+                ('ninmtobs', models.CharField(blank=True, max_length=10, null=True, verbose_name='NINMTOBS')),
+                ('cod_sit_lesion', models.CharField(blank=True, max_length=10, null=True, verbose_name='Código situación lesión')),
+                ('no_cbd', models.CharField(blank=True, max_length=10, null=True, verbose_name='NO_CBD')),
+                ('cbd', models.CharField(blank=True, max_length=10, null=True, verbose_name='CBD')),
+                ('no_aph', models.CharField(blank=True, max_length=10, null=True, verbose_name='NO_APH')),
+                ('af_prin', models.CharField(blank=True, max_length=10, null=True, verbose_name='AF_PRIN')),
+                ('dia_sis', models.CharField(blank=True, max_length=10, null=True, verbose_name='Día SIS')),
+                ('clave_programa_sis', models.CharField(blank=True, max_length=10, null=True, verbose_name='Clave programa SIS')),
+                ('cod_complemen_morbi', models.CharField(blank=True, max_length=10, null=True, verbose_name='Código complemento morbilidad')),
+                ('dia_fetal', models.CharField(blank=True, max_length=10, null=True, verbose_name='Día fetal')),
+                ('def_fetal_cm', models.CharField(blank=True, max_length=10, null=True, verbose_name='DEF_FETAL_CM')),
+                ('def_fetal_cbd', models.CharField(blank=True, max_length=10, null=True, verbose_name='DEF_FETAL_CBD')),
+                ('lista1', models.CharField(blank=True, max_length=10, null=True, verbose_name='Lista 1')),
+                ('grupo1', models.CharField(blank=True, max_length=10, null=True, verbose_name='Grupo 1')),
+                ('lista5', models.CharField(blank=True, max_length=10, null=True, verbose_name='Lista 5')),
+                ('rubrica_type', models.CharField(blank=True, max_length=10, null=True, verbose_name='Tipo de rúbrica')),
+                ('year_modifi', models.CharField(blank=True, max_length=10, null=True, verbose_name='Año modificación')),
+                ('year_aplicacion', models.CharField(blank=True, max_length=10, null=True, verbose_name='Año aplicación')),
+                ('valid', models.CharField(blank=True, max_length=10, null=True, verbose_name='Válido')),
+                ('prinmorta', models.CharField(blank=True, max_length=10, null=True, verbose_name='PRINMORTA')),
+                ('prinmorb', models.CharField(blank=True, max_length=10, null=True, verbose_name='PRINMORB')),
+                ('lm_morbi', models.CharField(blank=True, max_length=10, null=True, verbose_name='LM_MORBI')),
+                ('lm_morta', models.CharField(blank=True, max_length=10, null=True, verbose_name='LM_MORTA')),
+                ('lgbd165', models.CharField(blank=True, max_length=10, null=True, verbose_name='LGBD165')),
+                ('lomsbeck', models.CharField(blank=True, max_length=10, null=True, verbose_name='LOMSBECK')),
+                ('lgbd190', models.CharField(blank=True, max_length=10, null=True, verbose_name='LGBD190')),
+                ('notdiaria', models.CharField(blank=True, max_length=10, null=True, verbose_name='Notificación diaria')),
+                ('notsemanal', models.CharField(blank=True, max_length=10, null=True, verbose_name='Notificación semanal')),
+                ('sistema_especial', models.CharField(blank=True, max_length=10, null=True, verbose_name='Sistema especial')),
+                ('birmm', models.CharField(blank=True, max_length=10, null=True, verbose_name='BIRMM')),
+                ('cve_causa_type', models.CharField(blank=True, max_length=10, null=True, verbose_name='Clave tipo causa')),
+                ('causa_type', models.TextField(blank=True, null=True, verbose_name='Tipo de causa')),
+                ('epi_morta', models.CharField(blank=True, max_length=10, null=True, verbose_name='EPI_MORTA')),
+                ('edas_e_iras_en_m5', models.CharField(blank=True, max_length=10, null=True, verbose_name='EDAS_E_IRAS_EN_M5')),
+                ('cve_maternas_seed_epid', models.CharField(blank=True, max_length=10, null=True, verbose_name='Clave maternas SEED EPID')),
+                ('epi_morta_m5', models.CharField(blank=True, max_length=10, null=True, verbose_name='EPI_MORTA_M5')),
+                ('epi_morb', models.CharField(blank=True, max_length=10, null=True, verbose_name='EPI_MORB')),
+                ('def_maternas', models.CharField(blank=True, max_length=10, null=True, verbose_name='DEF_MATERNAS')),
+                ('es_causes', models.CharField(blank=True, max_length=10, null=True, verbose_name='ES_CAUSES')),
+                ('num_causes', models.CharField(blank=True, max_length=10, null=True, verbose_name='Número de causas')),
+                ('es_suive_morta', models.CharField(blank=True, max_length=10, null=True, verbose_name='ES_SUIVE_MORTA')),
+                ('es_suive_morb', models.CharField(blank=True, max_length=10, null=True, verbose_name='ES_SUIVE_MORB')),
+                ('epi_clave', models.CharField(blank=True, max_length=10, null=True, verbose_name='EPI_CLAVE')),
+                ('epi_clave_desc', models.TextField(blank=True, null=True, verbose_name='Descripción EPI_CLAVE')),
+                ('es_suive_notin', models.CharField(blank=True, max_length=10, null=True, verbose_name='ES_SUIVE_NOTIN')),
+                ('es_suive_est_epi', models.CharField(blank=True, max_length=10, null=True, verbose_name='ES_SUIVE_EST_EPI')),
+                ('es_suive_est_brote', models.CharField(blank=True, max_length=10, null=True, verbose_name='ES_SUIVE_EST_BROTE')),
+                ('sinac', models.CharField(blank=True, max_length=10, null=True, verbose_name='SINAC')),
+                ('prin_sinac', models.CharField(blank=True, max_length=10, null=True, verbose_name='PRIN_SINAC')),
+                ('prin_sinac_grupo', models.CharField(blank=True, max_length=10, null=True, verbose_name='PRIN_SINAC_GRUPO')),
+                ('descripcion_sinac_grupo', models.TextField(blank=True, null=True, verbose_name='Descripción grupo SINAC')),
+                ('prin_sinac_subgrupo', models.CharField(blank=True, max_length=10, null=True, verbose_name='PRIN_SINAC_SUBGRUPO')),
+                ('descripcion_sinac_subgrupo', models.TextField(blank=True, null=True, verbose_name='Descripción subgrupo SINAC')),
+                ('daga', models.CharField(blank=True, max_length=10, null=True, verbose_name='DAGA')),
+                ('asterisco', models.CharField(blank=True, max_length=10, null=True, verbose_name='Asterisco')),
+                ('prin_mm', models.CharField(blank=True, max_length=10, null=True, verbose_name='PRIN_MM')),
+                ('prin_mm_grupo', models.CharField(blank=True, max_length=10, null=True, verbose_name='PRIN_MM_GRUPO')),
+                ('descripcion_mm_grupo', models.TextField(blank=True, max_length=500, null=True, verbose_name='Descripción grupo MM')),
+                ('prin_mm_subgrupo', models.CharField(blank=True, max_length=10, null=True, verbose_name='PRIN_MM_SUBGRUPO')),
+                ('descripcion_mm_subgrupo', models.TextField(blank=True, max_length=500, null=True, verbose_name='Descripción subgrupo MM')),
+                ('cod_adi_mort', models.CharField(blank=True, max_length=10, null=True, verbose_name='Código adicional mortalidad')),
+            ],
+            options={
+                'verbose_name': 'CIE-10 México (atributos extendidos)',
+                'verbose_name_plural': 'CIE-10 México (atributos extendidos)',
+                'db_table': 'cie10_mexico_extendido',
+            },
+        ),
+        migrations.RunPython(copiar_atributos_extendidos, restaurar_atributos_extendidos),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='af_prin',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='asterisco',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='birmm',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='causa_type',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='cbd',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='clave_programa_sis',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='cod_adi_mort',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='cod_complemen_morbi',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='cod_sit_lesion',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='codigox',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='consecutivo',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='cve_causa_type',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='cve_maternas_seed_epid',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='daga',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='def_fetal_cbd',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='def_fetal_cm',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='def_maternas',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='descripcion_mm_grupo',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='descripcion_mm_subgrupo',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='descripcion_sinac_grupo',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='descripcion_sinac_subgrupo',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='dia_fetal',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='dia_sis',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='edas_e_iras_en_m5',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='epi_clave',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='epi_clave_desc',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='epi_morb',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='epi_morta',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='epi_morta_m5',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='erradicado',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='es_causes',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='es_suive_est_brote',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='es_suive_est_epi',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='es_suive_morb',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='es_suive_morta',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='es_suive_notin',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='grupo1',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='letra',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='lgbd165',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='lgbd190',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='linf',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='lista1',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='lista5',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='lm_morbi',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='lm_morta',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='lomsbeck',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='lsex',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='lsup',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='n_inter',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='nin',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='ninmtobs',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='no_aph',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='no_caracteres',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='no_cbd',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='notdiaria',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='notsemanal',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='num_causes',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='prin_mm',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='prin_mm_grupo',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='prin_mm_subgrupo',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='prin_sinac',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='prin_sinac_grupo',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='prin_sinac_subgrupo',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='prinmorb',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='prinmorta',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='rubrica_type',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='sinac',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='sistema_especial',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='trivial',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='valid',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='year_aplicacion',
+        ),
+        migrations.RemoveField(
+            model_name='cie10mexico',
+            name='year_modifi',
+        ),
+    ]
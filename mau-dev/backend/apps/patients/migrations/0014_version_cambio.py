@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+def marcar_version_actual(apps, schema_editor):
+    """Los códigos existentes cuentan como parte de la versión actual del catálogo"""
+    CIE10Mexico = apps.get_model('patients', 'CIE10Mexico')
+    VersionCatalogo = apps.get_model('patients', 'VersionCatalogo')
+
+    version = VersionCatalogo.objects.filter(nombre='cie10').values_list('version', flat=True).first() or 0
+    CIE10Mexico.objects.update(version_cambio=version)
+    # No hay cambios registrados antes de esta versión
+    VersionCatalogo.objects.update(version_base=models.F('version'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0013_cie10mexicoextendido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cie10mexico',
+            name='version_cambio',
+            field=models.PositiveBigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Versión del último cambio'),
+        ),
+        migrations.AddField(
+            model_name='versioncatalogo',
+            name='version_base',
+            field=models.PositiveBigIntegerField(default=0, help_text='Versión de la última eliminación; antes de ella no se pueden pedir cambios', verbose_name='Versión base de cambios'),
+        ),
+        migrations.RunPython(marcar_version_actual, migrations.RunPython.noop),
+    ]
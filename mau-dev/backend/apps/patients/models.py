@@ -139,6 +139,100 @@ class CIE10Mexico(models.Model):
         verbose_name='Fecha de actualización'
     )
     
+    # Versión del catálogo en la que cambió el código (nula mientras no se incrementa)
+    version_cambio = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        verbose_name='Versión del último cambio'
+    )
+    
+    # Capítulo (se muestra en búsquedas y pantallas de pacientes)
+    clave_capitulo = models.CharField(
+        max_length=10,
+        null=True,
+        blank=True,
+        verbose_name='Clave capítulo'
+    )
+    
+    nombre_capitulo = models.TextField(
+        null=True,
+        blank=True,
+        verbose_name='Nombre del capítulo'
+    )
+    
+    class Meta:
+        verbose_name = 'CIE-10 México'
+        verbose_name_plural = 'CIE-10 México'
+        db_table = 'cie10_mexico'
+        ordering = ['codigo']
+        indexes = [
+            models.Index(fields=['codigo']),
+            models.Index(fields=['categoria']),
+            models.Index(fields=['capitulo']),
+            models.Index(fields=['tipo']),
+            models.Index(fields=['descripcion']),
+        ]
+    
+    def __str__(self):
+        return f"{self.codigo} - {self.descripcion_corta or self.descripcion[:50]}"
+    
+    def get_descripcion_display(self):
+        """Retorna la descripción más apropiada"""
+        return self.descripcion_corta or self.descripcion
+    
+    def is_aplicable_for_patient(self, paciente):
+        """Verifica si este código CIE-10 es aplicable para un paciente específico"""
+        # Verificar género
+        if self.genero_aplicable != 'AMBOS':
+            if self.genero_aplicable == 'MASCULINO' and paciente.genero != 'M':
+                return False
+            if self.genero_aplicable == 'FEMENINO' and paciente.genero != 'F':
+                return False
+        
+        # Nota: Los campos edad_minima y edad_maxima fueron removidos del modelo
+        # La validación de edad se puede implementar en el futuro si es necesario
+        
+        return True
+    
+    def get_extendido(self):
+        """Atributos extendidos del código o None si no tiene"""
+        try:
+            return self.extendido
+        except CIE10MexicoExtendido.DoesNotExist:
+            return None
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        
+        # Atributos extendidos asignados a través de las propiedades de compatibilidad
+        pendientes = self.__dict__.pop('_extendidos_pendientes', None)
+        if pendientes:
+            extendido, _creado = CIE10MexicoExtendido.objects.update_or_create(
+                cie10=self, defaults=pendientes
+            )
+            self.extendido = extendido
+
+
+class CIE10MexicoExtendido(models.Model):
+    """
+    Atributos del archivo oficial CIE-10 que casi no se consultan.
+
+    Viven en una tabla aparte, uno a uno con CIE10Mexico, para que los
+    listados, búsquedas y diagnósticos de pacientes no los carguen; solo
+    `obtener_cie10_completo` y el admin los leen.
+    """
+    
+    cie10 = models.OneToOneField(
+        CIE10Mexico,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='extendido',
+        db_column='codigo',
+        verbose_name='Código CIE-10'
+    )
+    
     # Campos adicionales del archivo CSV original
     consecutivo = models.IntegerField(
         null=True,
@@ -299,19 +393,6 @@ class CIE10Mexico(models.Model):
         verbose_name='DEF_FETAL_CBD'
     )
     
-    clave_capitulo = models.CharField(
-        max_length=10,
-        null=True,
-        blank=True,
-        verbose_name='Clave capítulo'
-    )
-    
-    nombre_capitulo = models.TextField(
-        null=True,
-        blank=True,
-        verbose_name='Nombre del capítulo'
-    )
-    
     lista1 = models.CharField(
         max_length=10,
         null=True,
@@ -652,38 +733,37 @@ class CIE10Mexico(models.Model):
     )
     
     class Meta:
-        verbose_name = 'CIE-10 México'
-        verbose_name_plural = 'CIE-10 México'
-        db_table = 'cie10_mexico'
-        ordering = ['codigo']
-        indexes = [
-            models.Index(fields=['codigo']),
-            models.Index(fields=['categoria']),
-            models.Index(fields=['capitulo']),
-            models.Index(fields=['tipo']),
-            models.Index(fields=['descripcion']),
-        ]
+        verbose_name = 'CIE-10 México (atributos extendidos)'
+        verbose_name_plural = 'CIE-10 México (atributos extendidos)'
+        db_table = 'cie10_mexico_extendido'
     
     def __str__(self):
-        return f"{self.codigo} - {self.descripcion_corta or self.descripcion[:50]}"
+        return self.cie10_id
+
+
+CAMPOS_EXTENDIDOS = tuple(
+    campo.name for campo in CIE10MexicoExtendido._meta.concrete_fields
+    if campo.name != 'cie10'
+)
+
+
+def _atributo_extendido(campo):
+    """Propiedad de compatibilidad: lee y asigna `campo` en CIE10MexicoExtendido"""
     
-    def get_descripcion_display(self):
-        """Retorna la descripción más apropiada"""
-        return self.descripcion_corta or self.descripcion
+    def obtener(self):
+        pendientes = self.__dict__.get('_extendidos_pendientes', {})
+        if campo in pendientes:
+            return pendientes[campo]
+        return getattr(self.get_extendido(), campo, None)
     
-    def is_aplicable_for_patient(self, paciente):
-        """Verifica si este código CIE-10 es aplicable para un paciente específico"""
-        # Verificar género
-        if self.genero_aplicable != 'AMBOS':
-            if self.genero_aplicable == 'MASCULINO' and paciente.genero != 'M':
-                return False
-            if self.genero_aplicable == 'FEMENINO' and paciente.genero != 'F':
-                return False
-        
-        # Nota: Los campos edad_minima y edad_maxima fueron removidos del modelo
-        # La validación de edad se puede implementar en el futuro si es necesario
-        
-        return True
+    def asignar(self, valor):
+        self.__dict__.setdefault('_extendidos_pendientes', {})[campo] = valor
+    
+    return property(obtener, asignar)
+
+
+for _campo in CAMPOS_EXTENDIDOS:
+    setattr(CIE10Mexico, _campo, _atributo_extendido(_campo))
 
 
 class Paciente(models.Model):
@@ -869,6 +949,13 @@ class Paciente(models.Model):
         verbose_name='Última Actualización'
     )
     
+    ultima_actividad = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Última Actividad',
+        help_text='Más reciente entre la edición del registro y la creación o cambio de estado de sus recetas'
+    )
+    
     # Usuario que creó y actualizó el registro
     created_by = models.ForeignKey(
         'authentication.User',
@@ -896,6 +983,10 @@ class Paciente(models.Model):
             models.Index(fields=['nombre', 'apellido_paterno']),
             models.Index(fields=['fecha_nacimiento']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['ultima_actividad']),
+            models.Index(fields=['is_active', 'ultima_actividad']),
+            # Orden del listado con desempate único (paginación por cursor)
+            models.Index(fields=['is_active', 'apellido_paterno', 'apellido_materno', 'nombre', 'expediente']),
         ]
     
     def __str__(self):
@@ -908,10 +999,10 @@ class Paciente(models.Model):
             nombres.append(self.apellido_materno)
         return ' '.join(nombres)
     
-    def get_edad(self):
-        """Calcula la edad del paciente"""
+    def get_edad(self, hoy=None):
+        """Calcula la edad del paciente (hoy permite reutilizar la fecha en listados)"""
         from datetime import date
-        today = date.today()
+        today = hoy or date.today()
         return today.year - self.fecha_nacimiento.year - (
             (today.month, today.day) < 
             (self.fecha_nacimiento.month, self.fecha_nacimiento.day)
@@ -919,31 +1010,23 @@ class Paciente(models.Model):
     
     def calcular_estado_automatico(self):
         """Calcula automáticamente si el paciente debe estar activo basado en su actividad"""
-        from datetime import date, timedelta
-        from django.utils import timezone
-        
-        # Fecha límite: 4 años atrás desde hoy
-        fecha_limite = timezone.now() - timedelta(days=4*365)
+        from .estado import fecha_limite_actividad
         
-        # Buscar la receta más reciente del paciente
-        try:
-            from apps.prescriptions.models import Receta
-            ultima_receta = Receta.objects.filter(
-                paciente=self
-            ).order_by('-created_at').first()
-            
-            # Buscar la última actividad del paciente
-            ultima_actividad = self.updated_at
-            
-            # Si hay recetas, usar la fecha de la más reciente
-            if ultima_receta and ultima_receta.created_at > ultima_actividad:
-                ultima_actividad = ultima_receta.created_at
-            
-            # Determinar si debe estar activo
-            return ultima_actividad >= fecha_limite
-        except:
-            # Si hay algún error, mantener el estado actual
+        ultima_actividad = self.ultima_actividad or self.updated_at
+        if not ultima_actividad:
             return self.is_active
+        
+        return ultima_actividad >= fecha_limite_actividad()
+    
+    @classmethod
+    def registrar_actividad(cls, expediente, fecha=None):
+        """Actualiza ultima_actividad en un solo UPDATE sin retroceder la fecha"""
+        from django.utils import timezone
+        
+        fecha = fecha or timezone.now()
+        return cls.objects.filter(expediente=expediente).filter(
+            models.Q(ultima_actividad__isnull=True) | models.Q(ultima_actividad__lt=fecha)
+        ).update(ultima_actividad=fecha)
     
     def actualizar_estado_automatico(self):
         """Actualiza el estado del paciente basado en su actividad reciente"""
@@ -954,8 +1037,14 @@ class Paciente(models.Model):
             return True
         return False
     
-    def save(self, *args, **kwargs):
-        """Override del método save para normalizar datos"""
+    def normalizar_datos(self):
+        """Normaliza identificadores y nombres (también lo usan las cargas masivas)"""
+        # Las cargas masivas pueden traer números, por ejemplo un expediente numérico
+        for campo in ('curp', 'expediente', 'nombre', 'apellido_paterno', 'apellido_materno'):
+            valor = getattr(self, campo)
+            if valor is not None and not isinstance(valor, str):
+                setattr(self, campo, str(valor))
+        
         # Convertir CURP a mayúsculas
         if self.curp:
             self.curp = self.curp.upper()
@@ -971,5 +1060,142 @@ class Paciente(models.Model):
             self.apellido_paterno = self.apellido_paterno.title()
         if self.apellido_materno:
             self.apellido_materno = self.apellido_materno.title()
-        
+    
+    def save(self, *args, **kwargs):
+        """Override del método save para normalizar datos"""
+        self.normalizar_datos()
+
+        # Editar el registro completo cuenta como actividad del paciente
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            from django.utils import timezone
+            self.ultima_actividad = timezone.now()
+
         super().save(*args, **kwargs)
+
+        # Mantener sincronizado el índice de búsqueda
+        from .search import CAMPOS_INDEXADOS, indexar_paciente
+        if update_fields is None or CAMPOS_INDEXADOS.intersection(update_fields):
+            indexar_paciente(self)
+
+
+class PacienteIndiceBusqueda(models.Model):
+    """Índice de búsqueda de pacientes con términos normalizados (sin acentos, minúsculas)"""
+    
+    CAMPO_CHOICES = [
+        ('EXPEDIENTE', 'Expediente'),
+        ('CURP', 'CURP'),
+        ('NOMBRE', 'Nombre'),
+    ]
+    
+    paciente = models.ForeignKey(
+        Paciente,
+        on_delete=models.CASCADE,
+        related_name='indice_busqueda',
+        verbose_name='Paciente',
+        to_field='expediente'
+    )
+    
+    termino = models.CharField(
+        max_length=100,
+        verbose_name='Término',
+        help_text='Término normalizado para búsqueda por prefijo'
+    )
+    
+    campo = models.CharField(
+        max_length=10,
+        choices=CAMPO_CHOICES,
+        verbose_name='Campo de origen'
+    )
+    
+    class Meta:
+        verbose_name = 'Índice de Búsqueda de Paciente'
+        verbose_name_plural = 'Índice de Búsqueda de Pacientes'
+        db_table = 'pacientes_indice_busqueda'
+        indexes = [
+            models.Index(fields=['termino', 'paciente']),
+            models.Index(fields=['campo', 'termino']),
+        ]
+    
+    def __str__(self):
+        return f"{self.paciente_id} - {self.termino} ({self.campo})"
+
+
+class VersionCatalogo(models.Model):
+    """Contador de versión de un catálogo; se incrementa cada vez que el catálogo cambia"""
+    
+    nombre = models.CharField(
+        max_length=50,
+        primary_key=True,
+        verbose_name='Catálogo'
+    )
+    
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Versión'
+    )
+    
+    version_base = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Versión base de cambios',
+        help_text='Versión de la última eliminación; antes de ella no se pueden pedir cambios'
+    )
+    
+    fecha_actualizacion = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Fecha de Actualización'
+    )
+    
+    class Meta:
+        verbose_name = 'Versión de Catálogo'
+        verbose_name_plural = 'Versiones de Catálogos'
+        db_table = 'versiones_catalogo'
+    
+    def __str__(self):
+        return f"{self.nombre} v{self.version}"
+    
+    @classmethod
+    def obtener(cls, nombre):
+        """Retorna la versión actual del catálogo (0 si nunca ha cambiado)"""
+        version = cls.objects.filter(nombre=nombre).values_list('version', flat=True).first()
+        return version or 0
+    
+    @classmethod
+    def obtener_con_base(cls, nombre):
+        """Retorna (versión, versión base) del catálogo"""
+        fila = cls.objects.filter(nombre=nombre).values_list('version', 'version_base').first()
+        return fila or (0, 0)
+    
+    @classmethod
+    def incrementar(cls, nombre, pendientes=None, eliminacion=False):
+        """
+        Incrementa la versión del catálogo de forma atómica y retorna la nueva.
+        
+        `pendientes` es el queryset de las filas del catálogo: las que tienen
+        `version_cambio` nulo (modificadas desde el último incremento) quedan
+        marcadas con la nueva versión. Con `eliminacion=True` la versión base
+        avanza, porque los cambios anteriores ya no describen el catálogo.
+        """
+        from django.db import transaction
+        from django.utils import timezone
+        
+        cambios = {
+            'version': models.F('version') + 1,
+            'fecha_actualizacion': timezone.now(),
+        }
+        if eliminacion:
+            cambios['version_base'] = models.F('version') + 1
+        
+        with transaction.atomic():
+            if not cls.objects.filter(nombre=nombre).update(**cambios):
+                _registro, creado = cls.objects.get_or_create(
+                    nombre=nombre,
+                    defaults={'version': 1, 'version_base': 1 if eliminacion else 0}
+                )
+                if not creado:
+                    cls.objects.filter(nombre=nombre).update(**cambios)
+            version = cls.objects.filter(nombre=nombre).values_list('version', flat=True).get()
+            
+            if pendientes is not None:
+                pendientes.filter(version_cambio__isnull=True).update(version_cambio=version)
+        return version
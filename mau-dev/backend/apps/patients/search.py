@@ -0,0 +1,129 @@
+"""
+Motor de búsqueda de pacientes basado en un índice de términos normalizados.
+
+Cada paciente tiene filas en `PacienteIndiceBusqueda` con sus términos sin acentos
+y en minúsculas (expediente, CURP y nombre). Las búsquedas se resuelven con rangos
+por prefijo sobre el índice `termino`, en lugar de `icontains` sobre toda la tabla.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Paciente, PacienteIndiceBusqueda
+
+# Campos del paciente que alimentan el índice
+CAMPOS_IDENTIFICADOR = {
+    'EXPEDIENTE': 'expediente',
+    'CURP': 'curp',
+}
+CAMPOS_NOMBRE = ['nombre', 'apellido_paterno', 'apellido_materno']
+CAMPOS_INDEXADOS = set(CAMPOS_IDENTIFICADOR.values()) | set(CAMPOS_NOMBRE)
+
+LIMITE_RESULTADOS = 10
+LONGITUD_MAXIMA_TERMINO = 100
+
+_SEPARADORES = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar_texto(texto):
+    """Convierte a minúsculas y elimina acentos (Pérez -> perez, Muñoz -> munoz)"""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return sin_acentos.lower()
+
+
+def tokenizar(texto):
+    """Divide un texto normalizado en términos alfanuméricos"""
+    return [
+        token[:LONGITUD_MAXIMA_TERMINO]
+        for token in _SEPARADORES.split(normalizar_texto(texto))
+        if token
+    ]
+
+
+def compactar(texto):
+    """Forma compacta de un identificador: EXP-2024-001 -> exp2024001"""
+    return ''.join(tokenizar(texto))[:LONGITUD_MAXIMA_TERMINO]
+
+
+def terminos_paciente(paciente):
+    """Retorna el conjunto de pares (campo, término) que indexan a un paciente"""
+    terminos = set()
+
+    for campo, atributo in CAMPOS_IDENTIFICADOR.items():
+        valor = getattr(paciente, atributo, None)
+        if not valor:
+            continue
+        # La forma compacta permite buscar el identificador sin separadores
+        terminos.add((campo, compactar(valor)))
+        for token in tokenizar(valor):
+            terminos.add((campo, token))
+
+    for atributo in CAMPOS_NOMBRE:
+        for token in tokenizar(getattr(paciente, atributo, None)):
+            terminos.add(('NOMBRE', token))
+
+    return terminos
+
+
+def construir_entradas(paciente):
+    """Construye (sin guardar) las filas del índice para un paciente"""
+    return [
+        PacienteIndiceBusqueda(paciente_id=paciente.expediente, campo=campo, termino=termino)
+        for campo, termino in sorted(terminos_paciente(paciente))
+    ]
+
+
+def indexar_paciente(paciente):
+    """Reemplaza las entradas del índice de un paciente"""
+    with transaction.atomic():
+        PacienteIndiceBusqueda.objects.filter(paciente_id=paciente.expediente).delete()
+        PacienteIndiceBusqueda.objects.bulk_create(construir_entradas(paciente))
+
+
+def _filtro_prefijo(prefijo):
+    """Rango equivalente a `termino LIKE 'prefijo%'` que puede usar el índice B-tree"""
+    return {
+        'termino__gte': prefijo,
+        'termino__lt': prefijo + '\uffff',
+    }
+
+
+def buscar_pacientes(query, limite=LIMITE_RESULTADOS, solo_activos=True):
+    """
+    Busca pacientes cuyos términos empiecen con cada palabra de la consulta.
+
+    Todas las palabras deben coincidir (AND). Las coincidencias exactas de
+    expediente o CURP aparecen primero; el resto se ordena alfabéticamente.
+    Se ejecuta como una sola consulta SQL con subconsultas sobre el índice.
+    """
+    tokens = list(dict.fromkeys(tokenizar(query)))
+    if not tokens:
+        return Paciente.objects.none()
+
+    pacientes = Paciente.objects.all()
+    if solo_activos:
+        pacientes = pacientes.filter(is_active=True)
+
+    for token in tokens:
+        pacientes = pacientes.filter(
+            expediente__in=PacienteIndiceBusqueda.objects.filter(
+                **_filtro_prefijo(token)
+            ).values('paciente_id')
+        )
+
+    coincidencia_exacta = PacienteIndiceBusqueda.objects.filter(
+        paciente_id=OuterRef('expediente'),
+        campo__in=list(CAMPOS_IDENTIFICADOR),
+        termino=compactar(query)
+    )
+
+    return pacientes.annotate(
+        coincidencia_exacta=Exists(coincidencia_exacta)
+    ).order_by(
+        '-coincidencia_exacta', 'apellido_paterno', 'apellido_materno', 'nombre'
+    )[:limite]
@@ -1,5 +1,15 @@
+from datetime import date
+
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Paciente, CIE10Mexico, PacienteCIE10
+from .catalogo_cie10 import obtener_codigo
+from .models import CAMPOS_EXTENDIDOS, Paciente, CIE10Mexico, CIE10MexicoExtendido, PacienteCIE10
+
+
+def fecha_hoy(serializer):
+    """Fecha de hoy calculada una sola vez por respuesta (compartida en el contexto)"""
+    return serializer.context.setdefault('fecha_hoy', date.today())
+
 
 class PacienteCIE10Serializer(serializers.ModelSerializer):
     """Serializador para los códigos CIE-10 de un paciente"""
@@ -18,7 +28,6 @@ class PacienteCIE10Serializer(serializers.ModelSerializer):
         try:
             # Validar que cie10 no sea None
             if not obj.cie10:
-                print(f"🚨 WARNING: obj.cie10 es None para PacienteCIE10 ID {obj.id}")
                 return {
                     'codigo': '',
                     'descripcion_corta': 'Código no encontrado',
@@ -36,10 +45,7 @@ class PacienteCIE10Serializer(serializers.ModelSerializer):
                 'capitulo': getattr(cie10_obj, 'capitulo', '') or '',
                 'tipo': getattr(cie10_obj, 'tipo', '') or ''
             }
-        except Exception as e:
-            print(f"🚨 ERROR en get_cie10_info: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
             return {
                 'codigo': '',
                 'descripcion_corta': 'Error al obtener datos',
@@ -64,11 +70,11 @@ class PacienteSerializer(serializers.ModelSerializer):
             'telefono', 'direccion', 'contacto_emergencia_nombre',
             'contacto_emergencia_telefono', 'numero_seguro_social',
             'institucion_seguro', 'is_active', 'created_at', 'updated_at',
-            'created_by', 'updated_by', 'cie10_codes'
+            'ultima_actividad', 'created_by', 'updated_by', 'cie10_codes'
         ]
         read_only_fields = [
             'nombre_completo', 'edad', 'created_at', 'updated_at',
-            'created_by', 'updated_by', 'cie10_codes'
+            'ultima_actividad', 'created_by', 'updated_by', 'cie10_codes'
         ]
     
     def to_internal_value(self, data):
@@ -85,35 +91,27 @@ class PacienteSerializer(serializers.ModelSerializer):
         print(f"🚨 DEBUG: to_internal_value resultado: {result}")
         return result
     
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Precarga los códigos CIE-10 con su catálogo en una sola consulta por página"""
+        return queryset.prefetch_related(
+            Prefetch(
+                'pacientecie10_set',
+                queryset=PacienteCIE10.objects.select_related('cie10')
+            )
+        )
+    
     def get_nombre_completo(self, obj):
         return obj.get_nombre_completo()
     
     def get_edad(self, obj):
-        return obj.get_edad()
+        return obj.get_edad(hoy=fecha_hoy(self))
     
     def get_cie10_codes(self, obj):
-        """Obtener códigos CIE-10 de manera segura"""
+        """Obtener códigos CIE-10 (usa la precarga de setup_eager_loading si existe)"""
         try:
-            print(f"🚨 DEBUG get_cie10_codes: Procesando paciente {obj.expediente}")
-            # Obtener códigos CIE-10 relacionados
-            cie10_codes = PacienteCIE10.objects.filter(paciente=obj)
-            print(f"🚨 DEBUG get_cie10_codes: Encontrados {cie10_codes.count()} códigos")
-            
-            for cie10_code in cie10_codes:
-                print(f"🚨 DEBUG get_cie10_codes: Código {cie10_code.id}, cie10: {cie10_code.cie10}")
-                if cie10_code.cie10:
-                    print(f"🚨 DEBUG get_cie10_codes: CIE10 válido: {cie10_code.cie10.codigo}")
-                else:
-                    print(f"🚨 DEBUG get_cie10_codes: CIE10 es None!")
-            
-            serializer = PacienteCIE10Serializer(cie10_codes, many=True)
-            result = serializer.data
-            print(f"🚨 DEBUG get_cie10_codes: Serialización exitosa, resultado: {result}")
-            return result
-        except Exception as e:
-            print(f"🚨 ERROR en get_cie10_codes: {e}")
-            import traceback
-            traceback.print_exc()
+            return PacienteCIE10Serializer(obj.pacientecie10_set.all(), many=True).data
+        except Exception:
             return []
     
     def update(self, instance, validated_data):
@@ -188,7 +186,7 @@ class PacienteBusquedaSerializer(serializers.ModelSerializer):
         return obj.get_nombre_completo()
     
     def get_edad(self, obj):
-        return obj.get_edad()
+        return obj.get_edad(hoy=fecha_hoy(self))
 
 class PacienteCreateSerializer(serializers.ModelSerializer):
     """Serializador para crear pacientes con validaciones especiales"""
@@ -262,16 +260,15 @@ class PacienteCreateSerializer(serializers.ModelSerializer):
         # Crear los códigos CIE-10 si se proporcionaron
         if cie10_codes:
             for cie10_data in cie10_codes:
-                # Obtener el código CIE-10
-                try:
-                    cie10 = CIE10Mexico.objects.get(codigo=cie10_data['cie10'])
-                except CIE10Mexico.DoesNotExist:
+                # Obtener el código CIE-10 del catálogo en memoria
+                cie10 = obtener_codigo(cie10_data['cie10'], solo_activos=False)
+                if cie10 is None:
                     continue
                 
                 # Crear el PacienteCIE10
                 PacienteCIE10.objects.create(
                     paciente=paciente,
-                    cie10=cie10,
+                    cie10_id=cie10.codigo,
                     fecha_diagnostico=cie10_data.get('fecha_diagnostico', validated_data.get('fecha_diagnostico')),
                     es_principal=cie10_data.get('es_principal', False),
                     observaciones=cie10_data.get('observaciones', '')
@@ -282,12 +279,21 @@ class PacienteCreateSerializer(serializers.ModelSerializer):
 class PacienteCIE10CreateSerializer(serializers.ModelSerializer):
     """Serializador para crear códigos CIE-10 para un paciente"""
     
+    cie10 = serializers.CharField(max_length=10)
+    
     class Meta:
         model = PacienteCIE10
         fields = [
             'cie10', 'fecha_diagnostico', 'es_principal', 'observaciones'
         ]
     
+    def validate_cie10(self, value):
+        """Resuelve el código contra el catálogo en memoria, sin consultar la base de datos"""
+        cie10 = obtener_codigo(value, solo_activos=False)
+        if cie10 is None:
+            raise serializers.ValidationError(f'Código CIE-10 {value} no encontrado')
+        return cie10.instancia()
+    
     def validate(self, attrs):
         """Validar que solo haya un diagnóstico principal por paciente"""
         paciente = self.context.get('paciente')
@@ -306,6 +312,42 @@ class PacienteCIE10CreateSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class DiagnosticoAgregarSerializer(serializers.Serializer):
+    """Diagnóstico nuevo dentro de una edición por lote"""
+    
+    cie10 = serializers.CharField(max_length=10)
+    fecha_diagnostico = serializers.DateField(required=False)
+    es_principal = serializers.BooleanField(required=False, default=False)
+    observaciones = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class DiagnosticoActualizarSerializer(serializers.Serializer):
+    """Cambios a un diagnóstico existente dentro de una edición por lote"""
+    
+    id = serializers.IntegerField()
+    fecha_diagnostico = serializers.DateField(required=False)
+    es_principal = serializers.BooleanField(required=False)
+    observaciones = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class PacienteCIE10LoteSerializer(serializers.Serializer):
+    """Conjunto de cambios a los diagnósticos de un paciente aplicados en una transacción"""
+    
+    agregar = DiagnosticoAgregarSerializer(many=True, required=False)
+    actualizar = DiagnosticoActualizarSerializer(many=True, required=False)
+    eliminar = serializers.ListField(child=serializers.IntegerField(), required=False)
+    principal = serializers.CharField(
+        required=False,
+        max_length=10,
+        help_text='Código CIE-10 que queda como diagnóstico principal'
+    )
+    
+    def validate(self, attrs):
+        if not any(attrs.get(campo) for campo in ('agregar', 'actualizar', 'eliminar', 'principal')):
+            raise serializers.ValidationError('No se indicaron cambios')
+        return attrs
+
+
 class PacienteUpdateSerializer(serializers.ModelSerializer):
     """Serializador para actualizar pacientes"""
     
@@ -348,10 +390,7 @@ class PacienteUpdateSerializer(serializers.ModelSerializer):
     
     def update(self, instance, validated_data):
         """Actualizar paciente asignando el usuario que lo actualizó"""
-        print(f"🚨 DEBUG PacienteUpdateSerializer.update: validated_data recibido: {validated_data}")
-        
         cie10_codes = validated_data.pop('cie10_codes', None)
-        print(f"🚨 DEBUG PacienteUpdateSerializer.update: cie10_codes extraído: {cie10_codes}")
         
         request = self.context.get('request')
         if request and request.user:
@@ -359,37 +398,27 @@ class PacienteUpdateSerializer(serializers.ModelSerializer):
         
         # Actualizar el paciente
         paciente = super().update(instance, validated_data)
-        print(f"🚨 DEBUG PacienteUpdateSerializer.update: Paciente actualizado: {paciente.expediente}")
         
         # Actualizar códigos CIE-10 si se proporcionaron
         if cie10_codes is not None:
-            print(f"🚨 DEBUG PacienteUpdateSerializer.update: Procesando {len(cie10_codes)} códigos CIE-10")
-            
             # Eliminar códigos existentes
             PacienteCIE10.objects.filter(paciente=paciente).delete()
-            print(f"🚨 DEBUG PacienteUpdateSerializer.update: Códigos CIE-10 existentes eliminados")
             
             # Crear los nuevos códigos
             if cie10_codes:
-                for i, cie10_data in enumerate(cie10_codes):
-                    print(f"🚨 DEBUG PacienteUpdateSerializer.update: Procesando código {i+1}: {cie10_data}")
-                    
-                    try:
-                        cie10 = CIE10Mexico.objects.get(codigo=cie10_data['cie10'])
-                        print(f"🚨 DEBUG PacienteUpdateSerializer.update: CIE-10 encontrado: {cie10.codigo}")
-                    except CIE10Mexico.DoesNotExist:
-                        print(f"🚨 DEBUG PacienteUpdateSerializer.update: CIE-10 NO encontrado: {cie10_data['cie10']}")
+                for cie10_data in cie10_codes:
+                    cie10 = obtener_codigo(cie10_data['cie10'], solo_activos=False)
+                    if cie10 is None:
                         continue
                     
                     # Crear el PacienteCIE10
                     PacienteCIE10.objects.create(
                         paciente=paciente,
-                        cie10=cie10,
+                        cie10_id=cie10.codigo,
                         fecha_diagnostico=cie10_data.get('fecha_diagnostico', validated_data.get('fecha_diagnostico')),
                         es_principal=cie10_data.get('es_principal', False),
                         observaciones=cie10_data.get('observaciones', '')
                     )
-                    print(f"🚨 DEBUG PacienteUpdateSerializer.update: PacienteCIE10 creado para {cie10.codigo}")
         
         return paciente
 
@@ -407,6 +436,17 @@ class CIE10MexicoSerializer(serializers.ModelSerializer):
         ]
 
 
+class CIE10MexicoCompletoSerializer(CIE10MexicoSerializer):
+    """Código CIE-10 con sus atributos extendidos en el mismo nivel que los demás campos"""
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        extendido = CIE10MexicoExtendido.objects.filter(cie10_id=instance.codigo).first()
+        for campo in CAMPOS_EXTENDIDOS:
+            data[campo] = getattr(extendido, campo, None)
+        return data
+
+
 class PacienteDetailSerializer(serializers.ModelSerializer):
     """Serializador para mostrar pacientes con múltiples códigos CIE-10"""
     
@@ -435,11 +475,11 @@ class PacienteDetailSerializer(serializers.ModelSerializer):
         return obj.get_nombre_completo()
     
     def get_edad(self, obj):
-        return obj.get_edad()
+        return obj.get_edad(hoy=fecha_hoy(self))
     
     def get_cie10_codes(self, obj):
         """Obtener todos los códigos CIE-10 del paciente con información detallada"""
-        cie10_codes = PacienteCIE10.objects.filter(paciente=obj).order_by('-es_principal', '-fecha_diagnostico')
+        cie10_codes = obj.pacientecie10_set.all()
         
         return [{
             'id': code.id,
@@ -457,7 +497,9 @@ class PacienteDetailSerializer(serializers.ModelSerializer):
     
     def get_diagnostico_principal(self, obj):
         """Obtener información del diagnóstico principal"""
-        principal = PacienteCIE10.objects.filter(paciente=obj, es_principal=True).first()
+        principal = next(
+            (code for code in obj.pacientecie10_set.all() if code.es_principal), None
+        )
         if principal:
             return {
                 'codigo': principal.cie10.codigo,
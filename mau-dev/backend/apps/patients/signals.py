@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import CIE10Mexico, CIE10MexicoExtendido
+from .catalogo_cie10 import en_carga_masiva, incrementar_version, registrar_eliminacion
+
+
+@receiver(pre_save, sender=CIE10Mexico)
+def marcar_cambio_cie10(sender, instance, **kwargs):
+    """El código queda pendiente hasta el siguiente incremento de versión"""
+    instance.version_cambio = None
+
+
+@receiver(post_save, sender=CIE10Mexico)
+@receiver(post_delete, sender=CIE10Mexico)
+@receiver(post_save, sender=CIE10MexicoExtendido)
+@receiver(post_delete, sender=CIE10MexicoExtendido)
+def incrementar_version_cie10(sender, signal, **kwargs):
+    """Cualquier alta, edición o baja de un código invalida las cachés del catálogo"""
+    # Un código eliminado no aparece en los cambios por versión
+    eliminacion = sender is CIE10Mexico and signal is post_delete
+    if en_carga_masiva():
+        # cambios_en_lote() incrementa la versión una sola vez al terminar
+        if eliminacion:
+            registrar_eliminacion()
+        return
+    incrementar_version(eliminacion=eliminacion)
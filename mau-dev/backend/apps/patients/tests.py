@@ -0,0 +1,687 @@
+import io
+import os
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.authentication.models import User
+from mau_hospital import respuestas_catalogo
+from . import busqueda_cie10, catalogo_cie10
+from .cargador_cie10 import CargadorCIE10, leer_catalogo_oficial
+from .estado import recalcular_estados
+from .importacion import TAMANO_LOTE
+from .models import CIE10Mexico, CIE10MexicoExtendido, Paciente, PacienteCIE10, VersionCatalogo
+
+
+def limpiar_caches_catalogo():
+    """Cada prueba revierte la versión del catálogo: las cachés del proceso no sirven entre pruebas"""
+    catalogo_cie10.limpiar_cache()
+    respuestas_catalogo.limpiar_cache()
+
+
+class ConsultasListadoPacientesTests(TestCase):
+    """El listado y el detalle de pacientes usan un número fijo de consultas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_pruebas', password='x', role='ADMIN')
+        cls.codigos = [
+            CIE10Mexico.objects.create(
+                codigo=f'A0{i}', descripcion=f'Diagnóstico {i}',
+                descripcion_corta=f'Diagnóstico {i}', capitulo='I', categoria='A0',
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.total = 0
+
+    def crear_pacientes(self, cantidad, diagnosticos):
+        pacientes = []
+        for _ in range(cantidad):
+            self.total += 1
+            paciente = Paciente.objects.create(
+                expediente=f'EXP{self.total:04d}',
+                curp=f'PRUE800101HDFXX{self.total:03d}',
+                nombre='Paciente',
+                apellido_paterno=f'Prueba{self.total:04d}',
+                fecha_nacimiento=date(1980, 1, 1),
+                genero='M',
+                patologia='Prueba',
+                cie10='A00',
+                fecha_diagnostico=date(2020, 1, 1),
+            )
+            for numero, codigo in enumerate(self.codigos[:diagnosticos]):
+                PacienteCIE10.objects.create(
+                    paciente=paciente, cie10=codigo,
+                    fecha_diagnostico=date(2020, 1, 1), es_principal=numero == 0,
+                )
+            pacientes.append(paciente)
+        return pacientes
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta
+
+    def test_listado_no_crece_con_la_pagina(self):
+        self.crear_pacientes(2, diagnosticos=3)
+        consultas, respuesta = self.contar_consultas('/api/pacientes/')
+        self.assertEqual(len(respuesta.json()['results']), 2)
+
+        self.crear_pacientes(18, diagnosticos=3)
+        with self.assertNumQueries(consultas):
+            respuesta = self.client.get('/api/pacientes/')
+        self.assertEqual(len(respuesta.json()['results']), 20)
+        self.assertEqual(len(respuesta.json()['results'][0]['cie10_codes']), 3)
+
+    def test_detalle_no_crece_con_los_diagnosticos(self):
+        uno, = self.crear_pacientes(1, diagnosticos=1)
+        varios, = self.crear_pacientes(1, diagnosticos=5)
+        consultas, respuesta = self.contar_consultas(f'/api/pacientes/{uno.expediente}/')
+        self.assertEqual(len(respuesta.json()['cie10_codes']), 1)
+
+        with self.assertNumQueries(consultas):
+            respuesta = self.client.get(f'/api/pacientes/{varios.expediente}/')
+        self.assertEqual(len(respuesta.json()['cie10_codes']), 5)
+
+
+class ClavesNumericasTests(TestCase):
+    """Expedientes que llegan como números desde hojas de cálculo o JSON"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_claves', password='x', role='ADMIN')
+        Paciente.objects.create(
+            expediente='12345',
+            curp='PRUE800101HDFRRR01',
+            nombre='Paciente',
+            apellido_paterno='Existente',
+            fecha_nacimiento=date(1980, 1, 1),
+            genero='M',
+            patologia='Prueba',
+            cie10='A00',
+            fecha_diagnostico=date(2020, 1, 1),
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def test_verificar_duplicados_con_expediente_numerico(self):
+        respuesta = self.client.post('/api/pacientes/verificar-duplicados/lote/', {
+            'pacientes': [{'expediente': 12345}, {'expediente': 67890, 'curp': None}],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(list(respuesta.json()['duplicados']), ['0'])
+
+    def test_normalizar_datos_con_valores_numericos(self):
+        paciente = Paciente(expediente=67890, nombre='ana', apellido_paterno=123)
+        paciente.normalizar_datos()
+        self.assertEqual(paciente.expediente, '67890')
+        self.assertEqual(paciente.nombre, 'Ana')
+        self.assertEqual(paciente.apellido_paterno, '123')
+
+
+class DiagnosticosLoteActividadTests(TestCase):
+    """Editar diagnósticos por lote cuenta como actividad del paciente"""
+
+    def test_lote_marca_ultima_actividad(self):
+        usuario = User.objects.create_user('admin_diagnosticos', password='x', role='ADMIN')
+        CIE10Mexico.objects.create(
+            codigo='B01', descripcion='Diagnóstico', descripcion_corta='Diagnóstico',
+            capitulo='I', categoria='B0',
+        )
+        Paciente.objects.create(
+            expediente='EXP0001',
+            curp='PRUE800101HDFRRR01',
+            nombre='Paciente',
+            apellido_paterno='Prueba',
+            fecha_nacimiento=date(1980, 1, 1),
+            genero='M',
+            patologia='Prueba',
+            cie10='A00',
+            fecha_diagnostico=date(2020, 1, 1),
+        )
+        antes = timezone.now() - timedelta(days=5 * 365)
+        Paciente.objects.filter(expediente='EXP0001').update(ultima_actividad=antes)
+
+        client = APIClient()
+        client.force_authenticate(usuario)
+        respuesta = client.post(
+            '/api/pacientes/EXP0001/cie10/lote/', {'agregar': [{'cie10': 'B01'}]}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertGreater(Paciente.objects.get(expediente='EXP0001').ultima_actividad, antes)
+
+
+class BusquedaPacientesTests(TestCase):
+    """Búsqueda por prefijo sin acentos sobre el índice de términos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_busqueda', password='x', role='ADMIN')
+        for expediente, curp, nombre, paterno, materno, genero in (
+            ('EXP-001', 'PEMJ800101HDFRRN01', 'Juan', 'Pérez', 'Muñoz', 'M'),
+            ('EXP-002', 'GOMA800101MDFRRN02', 'Ana', 'Gómez', 'López', 'F'),
+            ('EXP-0021', 'GOMA800101MDFRRN03', 'Ana', 'Gomez', 'Lara', 'F'),
+        ):
+            Paciente.objects.create(
+                expediente=expediente,
+                curp=curp,
+                nombre=nombre,
+                apellido_paterno=paterno,
+                apellido_materno=materno,
+                fecha_nacimiento=date(1980, 1, 1),
+                genero=genero,
+                patologia='Prueba',
+                cie10='A00',
+                fecha_diagnostico=date(2020, 1, 1),
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def buscar(self, query):
+        respuesta = self.client.get('/api/pacientes/buscar/', {'q': query})
+        self.assertEqual(respuesta.status_code, 200)
+        return [paciente['expediente'] for paciente in respuesta.json()['results']]
+
+    def test_prefijos_sin_acentos(self):
+        self.assertEqual(self.buscar('perez'), ['EXP-001'])
+        self.assertEqual(self.buscar('MUÑ'), ['EXP-001'])
+        self.assertCountEqual(self.buscar('ana gom'), ['EXP-002', 'EXP-0021'])
+        self.assertEqual(self.buscar('ana perez'), [])
+
+    def test_coincidencia_exacta_de_identificador_primero(self):
+        self.assertEqual(self.buscar('exp-002'), ['EXP-002', 'EXP-0021'])
+        self.assertEqual(self.buscar('EXP0021'), ['EXP-0021'])
+        self.assertEqual(self.buscar('GOMA800101MDFRRN03')[0], 'EXP-0021')
+
+    def test_el_indice_sigue_al_guardar(self):
+        paciente = Paciente.objects.get(expediente='EXP-001')
+        paciente.apellido_paterno = 'Sánchez'
+        paciente.save()
+
+        self.assertEqual(self.buscar('perez'), [])
+        self.assertEqual(self.buscar('sanchez'), ['EXP-001'])
+
+
+class PaginacionCursorPacientesTests(TestCase):
+    """El modo cursor sigue el `?ordering=` pedido"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_cursor', password='x', role='ADMIN')
+        ahora = timezone.now()
+        for numero in range(7):
+            Paciente.objects.create(
+                expediente=f'EXP{numero:04d}',
+                curp=f'PRUE800101HDFXX{numero:03d}',
+                nombre='Paciente',
+                apellido_paterno='Prueba',
+                fecha_nacimiento=date(1980, 1, 1),
+                genero='M',
+                patologia='Prueba',
+                cie10='A00',
+                fecha_diagnostico=date(2020, 1, 1),
+            )
+        # Actividades repetidas y nulas para probar desempates
+        for numero, dias in enumerate((3, None, 1, 3, None, 2, 1)):
+            Paciente.objects.filter(expediente=f'EXP{numero:04d}').update(
+                ultima_actividad=None if dias is None else ahora - timedelta(days=dias)
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def test_cursor_con_campo_nulo(self):
+        url = '/api/pacientes/?paginacion=cursor&page_size=2&ordering=-ultima_actividad'
+        expedientes = []
+        while url:
+            respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            expedientes += [p['expediente'] for p in respuesta.json()['results']]
+            url = respuesta.json()['next']
+
+        esperado = list(Paciente.objects.order_by(
+            F('ultima_actividad').desc(nulls_last=True), 'expediente'
+        ).values_list('expediente', flat=True))
+        self.assertEqual(expedientes, esperado)
+
+
+class CIE10AplicablesTests(TestCase):
+    """Los conjuntos por género se reconstruyen cuando cambia la versión del catálogo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_aplicables', password='x', role='ADMIN')
+        for codigo, genero_aplicable in (('N40', 'MASCULINO'), ('O80', 'FEMENINO'), ('J00', 'AMBOS')):
+            CIE10Mexico.objects.create(
+                codigo=codigo, descripcion=f'Diagnóstico {codigo}', descripcion_corta=codigo,
+                capitulo='I', categoria=codigo, genero_aplicable=genero_aplicable,
+            )
+        Paciente.objects.create(
+            expediente='EXP0001',
+            curp='PRUE800101HDFRRR01',
+            nombre='Paciente',
+            apellido_paterno='Prueba',
+            fecha_nacimiento=date(1980, 1, 1),
+            genero='M',
+            patologia='Prueba',
+            cie10='A00',
+            fecha_diagnostico=date(2020, 1, 1),
+        )
+
+    def setUp(self):
+        limpiar_caches_catalogo()
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def aplicables(self):
+        respuesta = self.client.get('/api/pacientes/EXP0001/cie10-aplicables/')
+        self.assertEqual(respuesta.status_code, 200)
+        return sorted(codigo['codigo'] for codigo in respuesta.json()['codigos_aplicables'])
+
+    def test_cambio_de_version_invalida_los_conjuntos(self):
+        self.assertEqual(self.aplicables(), ['J00', 'N40'])
+
+        codigo = CIE10Mexico.objects.get(codigo='O80')
+        codigo.genero_aplicable = 'AMBOS'
+        codigo.save()
+        self.assertEqual(self.aplicables(), ['J00', 'N40', 'O80'])
+
+        codigo = CIE10Mexico.objects.get(codigo='N40')
+        codigo.activo = False
+        codigo.save()
+        self.assertEqual(self.aplicables(), ['J00', 'O80'])
+
+
+class RecalcularEstadosTests(TestCase):
+    """Estado activo/inactivo a partir de la última actividad"""
+
+    def crear_paciente(self, expediente, ultima_actividad, updated_at):
+        Paciente.objects.create(
+            expediente=expediente,
+            curp=f'PRUE800101HDF{expediente}',
+            nombre='Paciente',
+            apellido_paterno='Prueba',
+            fecha_nacimiento=date(1980, 1, 1),
+            genero='M',
+            patologia='Prueba',
+            cie10='A00',
+            fecha_diagnostico=date(2020, 1, 1),
+        )
+        Paciente.objects.filter(expediente=expediente).update(
+            ultima_actividad=ultima_actividad, updated_at=updated_at
+        )
+
+    def test_sin_ultima_actividad_cuenta_la_edicion_del_registro(self):
+        ahora = timezone.now()
+        hace_cinco_anios = ahora - timedelta(days=5 * 365)
+        self.crear_paciente('NULO1', None, ahora - timedelta(days=30))
+        self.crear_paciente('NULO2', None, hace_cinco_anios)
+        self.crear_paciente('VIEJO', hace_cinco_anios, ahora)
+
+        resultado = recalcular_estados()
+
+        self.assertEqual(resultado['inactivados'], 2)
+        self.assertEqual(
+            dict(Paciente.objects.values_list('expediente', 'is_active')),
+            {'NULO1': True, 'NULO2': False, 'VIEJO': False},
+        )
+
+
+class ImportacionPacientesTests(TestCase):
+    """Importación de pacientes por el endpoint de administradores"""
+
+    ENCABEZADO = (
+        'expediente,nombre,apellido_paterno,curp,fecha_nacimiento,genero,'
+        'patologia,fecha_diagnostico,cie10_codes\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_importacion', password='x', role='ADMIN')
+        for codigo in ('A00', 'B01'):
+            CIE10Mexico.objects.create(
+                codigo=codigo, descripcion=codigo, descripcion_corta=codigo,
+                capitulo='I', categoria=codigo,
+            )
+        Paciente.objects.create(
+            expediente='EXISTE',
+            curp='PRUE800101HDFRRR01',
+            nombre='Paciente',
+            apellido_paterno='Existente',
+            fecha_nacimiento=date(1980, 1, 1),
+            genero='M',
+            patologia='Prueba',
+            cie10='A00',
+            fecha_diagnostico=date(2020, 1, 1),
+        )
+
+    def setUp(self):
+        limpiar_caches_catalogo()
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def fila(self, expediente, curp, cie10_codes='A00;B01', genero='M'):
+        return (
+            f'{expediente},josé,pérez,{curp},1990-01-01,{genero},'
+            f'Prueba,2020-01-01,{cie10_codes}\n'
+        )
+
+    def importar(self, contenido, **datos):
+        if isinstance(contenido, str):
+            contenido = contenido.encode('utf-8')
+        archivo = SimpleUploadedFile('pacientes.csv', contenido)
+        return self.client.post(
+            '/api/pacientes/importar/', {'archivo': archivo, **datos}, format='multipart'
+        )
+
+    def test_filas_aceptadas_y_rechazadas(self):
+        respuesta = self.importar(
+            self.ENCABEZADO
+            + self.fila('N-1', 'PRUE900101HDFRRR01')
+            + self.fila('N-2', 'CURP-INVALIDA', genero='Q')
+            + self.fila('N-3', 'PRUE900101HDFRRR03', cie10_codes='ZZZ')
+        )
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        datos = respuesta.json()
+        self.assertEqual((datos['leidos'], datos['importados'], datos['rechazados']), (3, 1, 2))
+        self.assertEqual([rechazo['linea'] for rechazo in datos['rechazos']], [3, 4])
+        self.assertIn('genero', datos['rechazos'][0]['errores'])
+        self.assertIn('cie10_codes', datos['rechazos'][1]['errores'])
+
+        paciente = Paciente.objects.get(expediente='N-1')
+        self.assertEqual((paciente.nombre, paciente.cie10), ('José', 'A00'))
+        self.assertEqual(
+            list(paciente.pacientecie10_set.order_by('cie10').values_list('cie10', 'es_principal')),
+            [('A00', True), ('B01', False)],
+        )
+        self.assertEqual(paciente.created_by, self.usuario)
+
+    def test_dry_run_no_guarda(self):
+        respuesta = self.importar(
+            self.ENCABEZADO + self.fila('N-1', 'PRUE900101HDFRRR01'), dry_run='true'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['importados'], 1)
+        self.assertFalse(Paciente.objects.filter(expediente='N-1').exists())
+
+    def test_duplicados_contra_la_base_y_el_mismo_archivo(self):
+        respuesta = self.importar(
+            self.ENCABEZADO
+            + self.fila('existe', 'PRUE900101HDFRRR01')
+            + self.fila('N-1', 'PRUE800101HDFRRR01')
+            + self.fila('N-2', 'PRUE900101HDFRRR02')
+            + self.fila('n-2', 'PRUE900101HDFRRR03')
+        )
+        datos = respuesta.json()
+        self.assertEqual((datos['importados'], datos['rechazados']), (1, 3))
+        self.assertEqual(
+            [list(rechazo['errores']) for rechazo in datos['rechazos']],
+            [['expediente'], ['curp'], ['expediente']],
+        )
+        self.assertEqual(Paciente.objects.get(expediente='N-2').curp, 'PRUE900101HDFRRR02')
+
+    def test_archivo_que_no_es_utf8(self):
+        # El archivo se decodifica por bloques: con un lote y algo más, el primer
+        # lote ya se insertó cuando aparece la fila con otra codificación
+        contenido = self.ENCABEZADO + ''.join(
+            self.fila(f'N-{numero}', f'PRUE{numero:06d}HDFRRR01')
+            for numero in range(TAMANO_LOTE + 200)
+        )
+        respuesta = self.importar(
+            contenido.encode('utf-8') + self.fila('ULTIMO', 'PRUE900101HDFRRR02').encode('latin-1')
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('UTF-8', respuesta.json()['error'])
+        self.assertFalse(Paciente.objects.filter(expediente__startswith='N-').exists())
+
+    def test_archivos_grandes_van_al_comando(self):
+        contenido = self.ENCABEZADO + ''.join(
+            self.fila(f'N-{numero}', f'PRUE900101HDFRRR{numero:02d}') for numero in range(3)
+        )
+        with mock.patch('apps.patients.views.LIMITE_FILAS_ENDPOINT', 2):
+            respuesta = self.importar(contenido)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('import_patients', respuesta.json()['error'])
+        self.assertFalse(Paciente.objects.filter(expediente__startswith='N-').exists())
+
+        with mock.patch('apps.patients.views.TAMANO_MAXIMO_ENDPOINT', 100):
+            respuesta = self.importar(contenido)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('import_patients', respuesta.json()['error'])
+
+
+class BusquedaCIE10Tests(TestCase):
+    """Búsqueda por descripción ordenada por relevancia (BM25)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_cie10', password='x', role='ADMIN')
+        for codigo, descripcion, corta in (
+            ('E10', 'Diabetes mellitus tipo 1', 'Diabetes tipo 1'),
+            ('E11', 'Diabetes mellitus tipo 2', 'Diabetes tipo 2'),
+            ('E12', 'Diabetes mellitus asociada con desnutrición, tipo 2 y otras complicaciones', ''),
+            ('J18', 'Neumonía, organismo no especificado', 'Neumonía'),
+            ('C50', 'Tumor maligno de la mama', 'Tumor maligno de mama'),
+        ):
+            CIE10Mexico.objects.create(
+                codigo=codigo, descripcion=descripcion, descripcion_corta=corta,
+                capitulo='I', categoria=codigo,
+            )
+
+    def setUp(self):
+        limpiar_caches_catalogo()
+
+    def codigos(self, query):
+        return [registro.codigo for registro, _puntaje in busqueda_cie10.buscar_descripcion(query)]
+
+    def test_orden_por_relevancia(self):
+        self.assertEqual(self.codigos('diabetes tipo 2'), ['E11', 'E12', 'E10'])
+        self.assertEqual(self.codigos('DIABÉTES TIPO 2')[:1], ['E11'])
+        self.assertEqual(self.codigos('neumonias'), ['J18'])
+        self.assertEqual(self.codigos('tumores malignos de mama'), ['C50'])
+
+        client = APIClient()
+        client.force_authenticate(self.usuario)
+        respuesta = client.get('/api/pacientes/cie10/buscar/', {'q': 'diabetes tipo 2'})
+        self.assertEqual([c['codigo'] for c in respuesta.json()['results']], ['E11', 'E12', 'E10'])
+
+    def test_cambio_de_version_publica_otro_indice(self):
+        anterior = busqueda_cie10.indice_vigente()
+        codigo = CIE10Mexico.objects.get(codigo='E11')
+        codigo.activo = False
+        codigo.save()
+
+        self.assertEqual(self.codigos('diabetes tipo 2'), ['E12', 'E10'])
+        self.assertIsNot(busqueda_cie10.indice_vigente(), anterior)
+        # El índice anterior sigue intacto para las búsquedas que ya lo tenían
+        self.assertEqual([r.codigo for r, _ in anterior.buscar('diabetes tipo 2')], ['E11', 'E12', 'E10'])
+
+
+class PrefijoCIE10Tests(TestCase):
+    """Autocompletado de códigos CIE-10 por prefijo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_prefijo', password='x', role='ADMIN')
+        for codigo in ('E10', 'E11', 'E11.0', 'E11.9', 'E119X', 'E12', 'XE11'):
+            CIE10Mexico.objects.create(
+                codigo=codigo, descripcion=f'Diagnóstico {codigo}', descripcion_corta=codigo,
+                capitulo='IV', categoria=codigo[:3],
+            )
+
+    def setUp(self):
+        limpiar_caches_catalogo()
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def prefijo(self, query, limite=10):
+        respuesta = self.client.get(
+            '/api/pacientes/cie10/buscar/', {'q': query, 'modo': 'prefijo', 'limite': limite}
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        return [codigo['codigo'] for codigo in datos['results']], datos['total_coincidencias']
+
+    def test_prefijo_normalizado(self):
+        self.assertEqual(self.prefijo('e11.'), (['E11', 'E11.0', 'E11.9', 'E119X'], 4))
+        self.assertEqual(self.prefijo('E119'), (['E11.9', 'E119X'], 2))
+        self.assertEqual(self.prefijo('E1', limite=2), (['E10', 'E11'], 6))
+        self.assertEqual(self.prefijo('Z'), ([], 0))
+
+    def test_cambio_de_version_actualiza_el_indice(self):
+        self.assertEqual(self.prefijo('E12'), (['E12'], 1))
+        CIE10Mexico.objects.create(
+            codigo='E12.1', descripcion='Nuevo', descripcion_corta='Nuevo',
+            capitulo='IV', categoria='E12',
+        )
+        codigo = CIE10Mexico.objects.get(codigo='E12')
+        codigo.activo = False
+        codigo.save()
+        self.assertEqual(self.prefijo('E12'), (['E12.1'], 1))
+
+
+class EstadisticasCIE10Tests(TestCase):
+    """Estadísticas del catálogo calculadas una vez por versión"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_estadisticas', password='x', role='ADMIN')
+        for numero in range(6):
+            CIE10Mexico.objects.create(
+                codigo=f'N{numero:02d}', descripcion='Diagnóstico', descripcion_corta='Diagnóstico',
+                capitulo=('I', 'II')[numero % 2], categoria='N0',
+                tipo=('ENFERMEDAD', 'TRAUMATISMO')[numero % 3 == 0],
+                es_mortalidad=numero < 2, es_morbilidad=numero < 3, activo=numero != 5,
+            )
+
+    def setUp(self):
+        limpiar_caches_catalogo()
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def estadisticas(self):
+        respuesta = self.client.get('/api/pacientes/cie10/estadisticas/')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_conteos_y_cache_por_version(self):
+        datos = self.estadisticas()
+        self.assertEqual(datos['total_codigos'], 5)
+        self.assertEqual((datos['codigos_mortalidad'], datos['codigos_morbilidad']), (2, 3))
+        self.assertEqual(datos['estadisticas_capitulos'], [
+            {'capitulo': 'I', 'total_codigos': 3}, {'capitulo': 'II', 'total_codigos': 2},
+        ])
+        self.assertEqual(datos['estadisticas_tipos'], [
+            {'tipo': 'ENFERMEDAD', 'total_codigos': 3}, {'tipo': 'TRAUMATISMO', 'total_codigos': 2},
+        ])
+
+        # Sin cambios en el catálogo no se vuelve a agregar
+        with CaptureQueriesContext(connection) as consultas:
+            self.estadisticas()
+        self.assertFalse([c for c in consultas if 'cie10_mexico' in c['sql'].lower()])
+
+        codigo = CIE10Mexico.objects.get(codigo='N05')
+        codigo.activo = True
+        codigo.save()
+        datos = self.estadisticas()
+        self.assertEqual(datos['total_codigos'], 6)
+        self.assertEqual(datos['estadisticas_capitulos'][1], {'capitulo': 'II', 'total_codigos': 3})
+
+
+def linea_catalogo_oficial(consecutivo, codigo, nombre, lsex='NO'):
+    """Línea del archivo oficial con capítulo I y el resto de columnas vacías"""
+    partes = [str(consecutivo), codigo[0], codigo, str(len(codigo)), nombre, codigo, lsex]
+    partes += [''] * 18 + ['I', 'Ciertas enfermedades infecciosas']
+    return ','.join(f'"{parte}"' if ',' in parte else parte for parte in partes) + '\n'
+
+
+class CargaCatalogoCIE10Tests(TestCase):
+    """Carga del archivo oficial con import_cie10_real"""
+
+    @classmethod
+    def setUpTestData(cls):
+        CargadorCIE10().cargar(leer_catalogo_oficial(io.StringIO(''.join(
+            linea_catalogo_oficial(numero, codigo, f'Original {codigo}')
+            for numero, codigo in enumerate(('A00', 'A01', 'A02'), start=1)
+        ))))
+
+    def setUp(self):
+        limpiar_caches_catalogo()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, 'cie10.csv')
+
+    def cargar(self, lineas, **opciones):
+        with open(self.ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write('CONSECUTIVO,LETRA,CATALOG_KEY,NO. CARACTERES,NOMBRE\n')
+            archivo.writelines(lineas)
+        call_command('import_cie10_real', file=self.ruta, stdout=io.StringIO(), **opciones)
+
+    def contenido(self):
+        return list(CIE10Mexico.objects.order_by('codigo').values_list(
+            'codigo', 'descripcion', 'activo', 'version_cambio'
+        ))
+
+    def test_dry_run_no_cambia_nada(self):
+        antes = self.contenido()
+        version = VersionCatalogo.obtener('cie10')
+        self.cargar([
+            linea_catalogo_oficial(1, 'A00', 'Cólera, modificado'),
+            linea_catalogo_oficial(2, 'B00', 'Nuevo'),
+        ], dry_run=True, desactivar_faltantes=True)
+
+        self.assertEqual(self.contenido(), antes)
+        self.assertEqual(VersionCatalogo.obtener('cie10'), version)
+
+    def test_carga_marca_los_cambios_con_una_sola_version(self):
+        version = VersionCatalogo.obtener('cie10')
+        self.cargar([
+            linea_catalogo_oficial(1, 'A00', 'Cólera, modificado'),
+            linea_catalogo_oficial(2, 'A01', 'Original A01'),
+            linea_catalogo_oficial(3, 'B00', 'Nuevo'),
+        ], desactivar_faltantes=True)
+
+        nueva = VersionCatalogo.obtener('cie10')
+        self.assertEqual(nueva, version + 1)
+        contenido = {codigo: resto for codigo, *resto in self.contenido()}
+        self.assertEqual(contenido['A00'], ['Cólera, modificado', True, nueva])
+        self.assertEqual(contenido['A02'], ['Original A02', False, nueva])
+        self.assertEqual(contenido['B00'], ['Nuevo', True, nueva])
+        # Sin cambios conserva la versión en la que cambió por última vez
+        self.assertLess(contenido['A01'][2], nueva)
+
+    def test_atributos_extendidos_en_su_tabla(self):
+        lineas = [
+            linea_catalogo_oficial(1, 'A00', 'Original A00'),
+            linea_catalogo_oficial(2, 'A01', 'Original A01', lsex='MUJER'),
+        ]
+        self.cargar(lineas, dry_run=True)
+        self.assertEqual(CIE10MexicoExtendido.objects.get(cie10='A01').lsex, 'NO')
+
+        version = VersionCatalogo.obtener('cie10')
+        antes = self.contenido()
+        self.cargar(lineas)
+        self.assertEqual(CIE10MexicoExtendido.objects.get(cie10='A01').lsex, 'MUJER')
+        self.assertEqual(CIE10Mexico.objects.get(codigo='A01').lsex, 'MUJER')
+        self.assertEqual(VersionCatalogo.obtener('cie10'), version + 1)
+        # Los atributos extendidos no forman parte de los cambios del catálogo offline
+        self.assertEqual(self.contenido(), antes)
@@ -1,27 +1,52 @@
+import io
+
 from rest_framework import generics, status, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
 
+from mau_hospital.pagination import PacientePagination, RecetaPagination
+from mau_hospital.respuestas_catalogo import respuesta_catalogo
+from .busqueda_cie10 import buscar_descripcion
+from .catalogo_cie10 import (
+    CATALOGO_CIE10, buscar_prefijo, catalogo, codigos_aplicables, filtrar_registros,
+    obtener_codigo, estadisticas_catalogo, version_catalogo
+)
+from .diagnosticos import ErrorDiagnosticos, aplicar_cambios
+from .duplicados import LIMITE_FILAS, buscar_duplicados
+from .importacion import (
+    FORMATOS, LIMITE_FILAS_ENDPOINT, LIMITE_RECHAZOS_RESPUESTA, TAMANO_MAXIMO_ENDPOINT,
+    ImportadorPacientes, LimiteFilasExcedido, detectar_formato, leer_filas, limitar_filas
+)
 from .models import Paciente, CIE10Mexico, PacienteCIE10
+from .search import buscar_pacientes
 from .serializers import (
     PacienteSerializer, PacienteBusquedaSerializer,
     PacienteCreateSerializer, PacienteUpdateSerializer, PacienteDetailSerializer,
-    CIE10MexicoSerializer, CIE10MexicoBusquedaSerializer,
-    PacienteCIE10Serializer, PacienteCIE10CreateSerializer
+    CIE10MexicoSerializer, CIE10MexicoCompletoSerializer, CIE10MexicoBusquedaSerializer,
+    PacienteCIE10Serializer, PacienteCIE10CreateSerializer, PacienteCIE10LoteSerializer
 )
 
 class PacienteListCreateView(generics.ListCreateAPIView):
-    """Vista para listar y crear pacientes"""
+    """
+    Vista para listar y crear pacientes.
+
+    En modo cursor (`?paginacion=cursor`) se respeta `?ordering=`: el cursor
+    sigue ese orden, y los enlaces next/previous lo conservan.
+    """
     
     queryset = Paciente.objects.filter(is_active=True)
     permission_classes = [IsAuthenticated]
+    pagination_class = PacientePagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['genero', 'tipo_sangre', 'institucion_seguro']
     search_fields = ['expediente', 'nombre', 'apellido_paterno', 'apellido_materno', 'curp']
-    ordering_fields = ['expediente', 'apellido_paterno', 'fecha_nacimiento', 'created_at']
+    ordering_fields = ['expediente', 'apellido_paterno', 'fecha_nacimiento', 'created_at', 'ultima_actividad']
     ordering = ['apellido_paterno', 'apellido_materno', 'nombre']
     
     def get_serializer_class(self):
@@ -60,6 +85,10 @@ class PacienteListCreateView(generics.ListCreateAPIView):
                 fecha_min = today - timedelta(days=(int(edad_max) + 1) * 365)
                 queryset = queryset.filter(fecha_nacimiento__gte=fecha_min)
         
+        # Precargar diagnósticos para evitar consultas por paciente
+        if self.get_serializer_class() is PacienteSerializer:
+            queryset = PacienteSerializer.setup_eager_loading(queryset)
+        
         return queryset
     
     def perform_create(self, serializer):
@@ -81,6 +110,12 @@ class PacienteDetailView(generics.RetrieveUpdateDestroyAPIView):
             return PacienteUpdateSerializer
         return PacienteSerializer
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == 'GET':
+            queryset = PacienteSerializer.setup_eager_loading(queryset)
+        return queryset
+    
     def perform_update(self, serializer):
         """Solo usuarios con rol 'ATENCION_USUARIO' pueden editar pacientes"""
         if not self.request.user.can_edit_patients():
@@ -108,21 +143,15 @@ def buscar_paciente(request):
             'error': 'Parámetro de búsqueda requerido'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Buscar por expediente, CURP o nombre
-    pacientes = Paciente.objects.filter(
-        Q(expediente__icontains=query) |
-        Q(curp__icontains=query) |
-        Q(nombre__icontains=query) |
-        Q(apellido_paterno__icontains=query) |
-        Q(apellido_materno__icontains=query),
-        is_active=True
-    ).order_by('apellido_paterno', 'apellido_materno', 'nombre')[:10]
-    
+    # Buscar por expediente, CURP o nombre usando el índice normalizado
+    # (las coincidencias exactas de expediente/CURP aparecen primero)
+    pacientes = list(buscar_pacientes(query))
+
     serializer = PacienteBusquedaSerializer(pacientes, many=True)
-    
+
     return Response({
         'results': serializer.data,
-        'total': pacientes.count()
+        'total': len(pacientes)
     })
 
 @api_view(['GET'])
@@ -164,12 +193,143 @@ def verificar_duplicados(request):
         'duplicados': duplicados
     })
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def verificar_duplicados_lote(request):
+    """
+    Verifica duplicados para un lote de filas antes de importar pacientes.
+
+    Recibe {"pacientes": [{"expediente": ..., "curp": ...}, ...]} y responde
+    las colisiones indexadas por el número de fila (base 0) de la entrada.
+    """
+    filas = request.data.get('pacientes')
+    
+    if not isinstance(filas, list) or not filas:
+        return Response({
+            'error': 'Se requiere una lista de pacientes con expediente y/o CURP'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(filas) > LIMITE_FILAS:
+        return Response({
+            'error': f'El lote no puede exceder {LIMITE_FILAS} filas'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not all(isinstance(fila, dict) for fila in filas):
+        return Response({
+            'error': 'Cada fila debe ser un objeto con expediente y/o CURP'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    colisiones = buscar_duplicados(filas)
+    
+    # Serializar cada paciente encontrado una sola vez
+    contexto = {}
+    resumenes = {}
+    for encontrados in colisiones.values():
+        for colision in encontrados:
+            paciente = colision.get('paciente')
+            if paciente is None:
+                continue
+            if paciente.expediente not in resumenes:
+                resumenes[paciente.expediente] = PacienteBusquedaSerializer(
+                    paciente, context=contexto
+                ).data
+            colision['paciente'] = resumenes[paciente.expediente]
+    
+    return Response({
+        'duplicados_encontrados': len(colisiones) > 0,
+        'total_filas': len(filas),
+        'filas_con_duplicados': len(colisiones),
+        'duplicados': {str(indice): encontrados for indice, encontrados in colisiones.items()}
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def importar_pacientes(request):
+    """
+    Importación masiva de pacientes (solo administradores).
+
+    Recibe un archivo CSV o JSONL en `archivo`; `formato` y `dry_run` son
+    opcionales. Responde el resumen y las primeras filas rechazadas.
+
+    La importación corre dentro de la petición, así que el archivo está
+    limitado a TAMANO_MAXIMO_ENDPOINT bytes y LIMITE_FILAS_ENDPOINT filas; las
+    cargas mayores se hacen con el comando import_patients. Si el archivo no
+    es UTF-8 o excede las filas no se importa nada.
+    """
+    if request.user.role != 'ADMIN':
+        return Response({
+            'error': 'Solo administradores pueden importar pacientes'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    archivo = request.FILES.get('archivo')
+    if not archivo:
+        return Response({
+            'error': 'Se requiere el archivo a importar'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if archivo.size > TAMANO_MAXIMO_ENDPOINT:
+        return Response({
+            'error': (
+                f'El archivo excede {TAMANO_MAXIMO_ENDPOINT // (1024 * 1024)} MB; '
+                'para cargas mayores use el comando import_patients'
+            )
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    formato = request.data.get('formato') or detectar_formato(archivo.name)
+    if formato not in FORMATOS:
+        return Response({
+            'error': 'Formato no soportado; use csv o jsonl'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    rechazos = []
+    
+    def al_rechazar(linea, errores, fila):
+        if len(rechazos) < LIMITE_RECHAZOS_RESPUESTA:
+            rechazos.append({'linea': linea, 'errores': errores})
+    
+    importador = ImportadorPacientes(
+        usuario=request.user,
+        dry_run=str(request.data.get('dry_run', '')).lower() == 'true',
+        al_rechazar=al_rechazar
+    )
+    contenido = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+    filas = limitar_filas(leer_filas(contenido, formato), LIMITE_FILAS_ENDPOINT)
+    try:
+        # Un error a media lectura deshace los lotes que ya se habían insertado
+        with transaction.atomic():
+            resumen = importador.importar(filas)
+    except UnicodeDecodeError:
+        return Response({
+            'error': 'El archivo debe estar codificado en UTF-8'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except LimiteFilasExcedido:
+        return Response({
+            'error': (
+                f'El archivo excede {LIMITE_FILAS_ENDPOINT} filas; '
+                'para cargas mayores use el comando import_patients'
+            )
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        **resumen,
+        'rechazos': rechazos
+    }, status=status.HTTP_200_OK if importador.dry_run else status.HTTP_201_CREATED)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def paciente_historial(request, expediente):
-    """Endpoint para obtener el historial completo de un paciente"""
+    """
+    Endpoint para obtener el historial completo de un paciente.
+
+    Las recetas se paginan de la más reciente a la más antigua (`?page=` o
+    `?paginacion=cursor`); los totales por estado salen de un solo agregado.
+    """
+    from apps.prescriptions.serializers import RecetaListSerializer
+    
     try:
-        paciente = Paciente.objects.get(expediente=expediente)
+        paciente = PacienteSerializer.setup_eager_loading(
+            Paciente.objects.all()
+        ).get(expediente=expediente)
     except Paciente.DoesNotExist:
         return Response({
             'error': 'Paciente no encontrado'
@@ -178,38 +338,102 @@ def paciente_historial(request, expediente):
     # Información del paciente
     paciente_data = PacienteSerializer(paciente).data
     
-    # Historial de recetas
-    from apps.prescriptions.serializers import RecetaListSerializer
-    recetas = paciente.recetas.all().order_by('-fecha_creacion')
-    recetas_data = RecetaListSerializer(recetas, many=True).data
+    # Totales por estado en una sola consulta
+    totales = paciente.recetas.aggregate(
+        total=Count('folio_receta'),
+        pendientes=Count('folio_receta', filter=Q(estado='PENDIENTE')),
+        validadas=Count('folio_receta', filter=Q(estado='VALIDADA')),
+        surtidas=Count('folio_receta', filter=Q(estado='SURTIDA'))
+    )
+    
+    # Historial de recetas paginado, más recientes primero
+    recetas = RecetaListSerializer.setup_eager_loading(
+        paciente.recetas.order_by('-fecha_creacion', '-folio_receta')
+    )
+    paginador = RecetaPagination()
+    pagina = paginador.paginate_queryset(recetas, request)
+    recetas_data = RecetaListSerializer(pagina, many=True).data
     
     return Response({
         'paciente': paciente_data,
         'recetas': recetas_data,
-        'total_recetas': recetas.count(),
-        'recetas_pendientes': recetas.filter(estado='PENDIENTE').count(),
-        'recetas_validadas': recetas.filter(estado='VALIDADA').count(),
-        'recetas_surtidas': recetas.filter(estado='SURTIDA').count()
+        'siguiente': paginador.get_next_link(),
+        'anterior': paginador.get_previous_link(),
+        'total_recetas': totales['total'],
+        'recetas_pendientes': totales['pendientes'],
+        'recetas_validadas': totales['validadas'],
+        'recetas_surtidas': totales['surtidas']
     })
 
 
 class CIE10MexicoListView(generics.ListAPIView):
-    """Vista para listar códigos CIE-10 México"""
+    """
+    Vista para listar códigos CIE-10 México desde el catálogo en memoria.
+
+    Como los demás endpoints del catálogo, responde con ETag por versión y
+    304 si el cliente ya tiene la versión vigente.
+    """
     
     queryset = CIE10Mexico.objects.filter(activo=True)
     serializer_class = CIE10MexicoSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['capitulo', 'categoria', 'tipo', 'genero_aplicable']
     search_fields = ['codigo', 'descripcion', 'descripcion_corta']
     ordering_fields = ['codigo', 'capitulo', 'categoria']
     ordering = ['codigo']
 
+    def list(self, request, *args, **kwargs):
+        return respuesta_catalogo(
+            request, CATALOGO_CIE10, version_catalogo(), lambda: self.listar(request)
+        )
+
+    def listar(self, request):
+        # Mismos parámetros que DjangoFilterBackend, SearchFilter y OrderingFilter
+        registros = catalogo().activos
+        for campo in self.filterset_fields:
+            valor = request.query_params.get(campo)
+            if valor:
+                registros = [r for r in registros if getattr(r, campo) == valor]
+
+        busqueda = request.query_params.get('search', '')
+        for termino in busqueda.replace(',', ' ').split():
+            registros = filtrar_registros(registros, termino, self.search_fields)
+
+        orden = [
+            campo for campo in request.query_params.get('ordering', '').split(',')
+            if campo.strip().lstrip('-') in self.ordering_fields
+        ] or self.ordering
+        registros = list(registros)
+        for campo in reversed(orden):
+            campo = campo.strip()
+            registros.sort(
+                key=lambda r: getattr(r, campo.lstrip('-')) or '',
+                reverse=campo.startswith('-')
+            )
+
+        page = self.paginate_queryset(registros)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(registros, many=True)
+        return Response(serializer.data)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def buscar_cie10(request):
-    """Búsqueda simple de códigos CIE-10 por código o nombre"""
+    """
+    Búsqueda simple de códigos CIE-10 por código o nombre.
+
+    Con `?modo=prefijo` solo se autocompletan códigos (E11, e11.9, C50...);
+    `limite` controla cuántos se devuelven (máximo 50).
+    """
+    return respuesta_catalogo(
+        request, CATALOGO_CIE10, version_catalogo(), lambda: _buscar_cie10(request)
+    )
+
+
+def _buscar_cie10(request):
     try:
         query = request.GET.get('q', '').strip()
         
@@ -218,17 +442,34 @@ def buscar_cie10(request):
                 'error': 'Parámetro de búsqueda requerido'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Búsqueda por código primero (más específica)
-        codigos_por_codigo = CIE10Mexico.objects.filter(
-            codigo__icontains=query,
-            activo=True
-        ).order_by('codigo')[:10]
+        if request.GET.get('modo') == 'prefijo':
+            try:
+                limite = min(max(int(request.GET.get('limite', 10)), 1), 50)
+            except ValueError:
+                return Response({
+                    'error': 'El parámetro limite debe ser un número entero'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            codigos, total = buscar_prefijo(query, limite)
+            return Response({
+                'results': CIE10MexicoBusquedaSerializer(codigos, many=True).data,
+                'total': len(codigos),
+                'total_coincidencias': total,
+                'por_codigo': len(codigos),
+                'por_nombre': 0,
+                'query': query,
+                'mensaje': f'Encontrados {total} códigos CIE-10 que empiezan con "{query}"'
+            })
+        
+        # Búsqueda por prefijo de código primero (más específica)
+        codigos_por_codigo, _total = buscar_prefijo(query, 10)
         
-        # Búsqueda por nombre/descripción
-        codigos_por_nombre = CIE10Mexico.objects.filter(
-            descripcion__icontains=query,
-            activo=True
-        ).exclude(codigo__in=[c.codigo for c in codigos_por_codigo]).order_by('codigo')[:10]
+        # Búsqueda por nombre/descripción, ordenada por relevancia
+        codigos_por_nombre = [
+            registro for registro, _puntaje in buscar_descripcion(
+                query, limite=10, excluir={c.codigo for c in codigos_por_codigo}
+            )
+        ]
         
         # Combinar resultados
         todos_codigos = list(codigos_por_codigo) + list(codigos_por_nombre)
@@ -256,20 +497,28 @@ def buscar_cie10(request):
 @permission_classes([IsAuthenticated])
 def obtener_cie10_completo(request, codigo):
     """Endpoint para obtener información completa de un código CIE-10 específico"""
-    try:
-        cie10 = CIE10Mexico.objects.get(codigo=codigo, activo=True)
-        serializer = CIE10MexicoSerializer(cie10)
+    def construir():
+        cie10 = obtener_codigo(codigo)
+        if cie10 is None:
+            return Response({
+                'error': f'Código CIE-10 {codigo} no encontrado'
+            }, status=status.HTTP_404_NOT_FOUND)
+        # Los atributos extendidos no están en el catálogo en memoria; se leen aquí
+        serializer = CIE10MexicoCompletoSerializer(cie10)
         return Response(serializer.data)
-    except CIE10Mexico.DoesNotExist:
-        return Response({
-            'error': f'Código CIE-10 {codigo} no encontrado'
-        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return respuesta_catalogo(request, CATALOGO_CIE10, version_catalogo(), construir)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def cie10_para_paciente(request, expediente):
-    """Endpoint para obtener códigos CIE-10 aplicables a un paciente específico"""
+    """
+    Endpoint para obtener códigos CIE-10 aplicables a un paciente específico.
+
+    Parámetros: q (código o palabras de la descripción), page, page_size.
+    Los conjuntos por género se precalculan en memoria por versión del catálogo.
+    """
     try:
         paciente = Paciente.objects.get(expediente=expediente)
     except Paciente.DoesNotExist:
@@ -277,60 +526,44 @@ def cie10_para_paciente(request, expediente):
             'error': 'Paciente no encontrado'
         }, status=status.HTTP_404_NOT_FOUND)
     
-    # Filtrar códigos aplicables para el paciente
-    codigos_aplicables = []
-    todos_codigos = CIE10Mexico.objects.filter(activo=True)
+    codigos = codigos_aplicables(paciente.genero, request.query_params.get('q', ''))
     
-    for codigo in todos_codigos:
-        if codigo.is_aplicable_for_patient(paciente):
-            codigos_aplicables.append(codigo)
+    try:
+        page_size = min(int(request.query_params.get('page_size', 50)), 500)
+        pagina = int(request.query_params.get('page', 1))
+    except ValueError:
+        return Response({
+            'error': 'Parámetros de paginación inválidos'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    serializer = CIE10MexicoBusquedaSerializer(codigos_aplicables, many=True)
+    paginador = Paginator(codigos, max(page_size, 1))
+    pagina_actual = paginador.get_page(pagina)
     
     return Response({
         'paciente': PacienteBusquedaSerializer(paciente).data,
-        'codigos_aplicables': serializer.data,
-        'total': len(codigos_aplicables)
+        'codigos_aplicables': list(pagina_actual.object_list),
+        'total': paginador.count,
+        'pagina': pagina_actual.number,
+        'total_paginas': paginador.num_pages
     })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def estadisticas_cie10(request):
-    """Endpoint para obtener estadísticas del catálogo CIE-10"""
-    total_codigos = CIE10Mexico.objects.filter(activo=True).count()
-    
-    # Estadísticas por capítulo
-    capitulos = CIE10Mexico.objects.filter(activo=True).values('capitulo').distinct()
-    stats_capitulos = []
-    
-    for cap in capitulos:
-        capitulo = cap['capitulo']
-        count = CIE10Mexico.objects.filter(capitulo=capitulo, activo=True).count()
-        stats_capitulos.append({
-            'capitulo': capitulo,
-            'total_codigos': count
-        })
-    
-    # Estadísticas por tipo
-    tipos = CIE10Mexico.objects.filter(activo=True).values('tipo').distinct()
-    stats_tipos = []
-    
-    for tipo in tipos:
-        tipo_codigo = tipo['tipo']
-        count = CIE10Mexico.objects.filter(tipo=tipo_codigo, activo=True).count()
-        stats_tipos.append({
-            'tipo': tipo_codigo,
-            'total_codigos': count
-        })
-    
-    return Response({
-        'total_codigos': total_codigos,
-        'estadisticas_capitulos': sorted(stats_capitulos, key=lambda x: x['capitulo']),
-        'estadisticas_tipos': stats_tipos,
-        'codigos_mortalidad': CIE10Mexico.objects.filter(es_mortalidad=True, activo=True).count(),
-        'codigos_morbilidad': CIE10Mexico.objects.filter(es_morbilidad=True, activo=True).count()
-    })
+    """
+    Endpoint para obtener estadísticas del catálogo CIE-10.
+
+    Se calculan una vez por versión del catálogo; el encabezado `Age` indica
+    cuántos segundos tiene el resultado.
+    """
+    response = respuesta_catalogo(
+        request, CATALOGO_CIE10, version_catalogo(), lambda: Response(estadisticas_catalogo()[0])
+    )
+    if response.status_code == status.HTTP_200_OK:
+        _datos, calculado_en = estadisticas_catalogo()
+        response['Age'] = str(max(int((timezone.now() - calculado_en).total_seconds()), 0))
+    return response
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -633,6 +866,45 @@ def marcar_diagnostico_principal(request, expediente, cie10_id):
     })
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def editar_cie10_paciente_lote(request, expediente):
+    """
+    Endpoint para aplicar varios cambios a los diagnósticos CIE-10 de un paciente.
+
+    Recibe {"agregar": [...], "actualizar": [...], "eliminar": [ids], "principal": "codigo"}
+    y aplica todo en una sola transacción: si un cambio es inválido no se guarda ninguno.
+    """
+    if not request.user.can_edit_patients():
+        return Response({
+            'error': 'No tiene permisos para editar pacientes'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = PacienteCIE10LoteSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        paciente = aplicar_cambios(expediente, serializer.validated_data, usuario=request.user)
+    except Paciente.DoesNotExist:
+        return Response({
+            'error': 'Paciente no encontrado'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except ErrorDiagnosticos as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    cie10_codes = PacienteCIE10.objects.filter(paciente=paciente).select_related('cie10')
+    
+    return Response({
+        'mensaje': 'Diagnósticos actualizados exitosamente',
+        'cie10': paciente.cie10,
+        'fecha_diagnostico': paciente.fecha_diagnostico,
+        'cie10_codes': PacienteCIE10Serializer(cie10_codes, many=True).data
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def estadisticas_cie10_pacientes(request):
@@ -5,3 +5,7 @@ class PrescriptionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.prescriptions'
     verbose_name = 'Recetas'
+    
+    def ready(self):
+        """Registrar señales del catálogo de medicamentos y de las colas en vivo"""
+        from . import signals  # noqa: F401
@@ -0,0 +1,36 @@
+"""
+Versión del catálogo de medicamentos para las respuestas con ETag.
+
+Igual que el catálogo CIE-10, el catálogo de medicamentos lleva un contador
+en `VersionCatalogo` que se incrementa al guardar o eliminar medicamentos
+(ver signals). La versión se consulta a lo más cada `INTERVALO_VERIFICACION`
+segundos, así que un 304 no toca la base de datos.
+"""
+import time
+
+from apps.patients.models import VersionCatalogo
+
+CATALOGO_MEDICAMENTOS = 'medicamentos'
+
+# Segundos durante los que se confía en la versión leída sin volver a consultarla
+INTERVALO_VERIFICACION = 5
+
+_verificacion = (None, 0.0)
+
+
+def version_catalogo():
+    """Versión actual del catálogo de medicamentos"""
+    global _verificacion
+
+    version, verificada = _verificacion
+    ahora = time.monotonic()
+    if version is None or ahora - verificada >= INTERVALO_VERIFICACION:
+        version = VersionCatalogo.obtener(CATALOGO_MEDICAMENTOS)
+        _verificacion = (version, ahora)
+    return version
+
+
+def invalidar_cache_local():
+    """Obliga a releer la versión en la siguiente consulta de este proceso"""
+    global _verificacion
+    _verificacion = (None, 0.0)
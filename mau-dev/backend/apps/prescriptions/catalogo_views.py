@@ -3,6 +3,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db.models import Q
+from mau_hospital.respuestas_catalogo import respuesta_catalogo
+from .catalogo_medicamentos import CATALOGO_MEDICAMENTOS, version_catalogo
 from .models import CatalogoMedicamentos
 from .serializers import CatalogoMedicamentosSerializer
 
@@ -77,13 +79,15 @@ def obtener_medicamento(request, medicamento_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def obtener_categorias(request):
-    """Obtiene la lista de categorías disponibles"""
-    categorias = [
-        {'value': choice[0], 'label': choice[1]}
-        for choice in CatalogoMedicamentos.CATEGORIA_CHOICES
-    ]
-    
-    return Response(categorias)
+    """Obtiene la lista de categorías disponibles (con ETag por versión del catálogo)"""
+    def construir():
+        categorias = [
+            {'value': choice[0], 'label': choice[1]}
+            for choice in CatalogoMedicamentos.CATEGORIA_CHOICES
+        ]
+        return Response(categorias)
+    
+    return respuesta_catalogo(request, CATALOGO_MEDICAMENTOS, version_catalogo(), construir)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -199,19 +203,28 @@ def eliminar_medicamento(request, medicamento_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def listar_todos_medicamentos(request):
-    """Lista todos los medicamentos del catálogo con paginación"""
-    activos_solo = request.GET.get('activos_solo', 'true').lower() == 'true'
-    
-    medicamentos = CatalogoMedicamentos.objects.all()
-    
-    if activos_solo:
-        medicamentos = medicamentos.filter(activo=True)
-    
-    medicamentos = medicamentos.order_by('categoria', 'nombre')
-    
-    serializer = CatalogoMedicamentosSerializer(medicamentos, many=True)
+    """
+    Lista todos los medicamentos del catálogo.
+
+    La respuesta lleva un ETag por versión del catálogo: con If-None-Match
+    vigente se responde 304 sin consultar medicamentos, y el cuerpo se
+    serializa y comprime una sola vez por versión.
+    """
+    def construir():
+        activos_solo = request.GET.get('activos_solo', 'true').lower() == 'true'
+        
+        medicamentos = CatalogoMedicamentos.objects.all()
+        
+        if activos_solo:
+            medicamentos = medicamentos.filter(activo=True)
+        
+        medicamentos = medicamentos.order_by('categoria', 'nombre')
+        
+        serializer = CatalogoMedicamentosSerializer(medicamentos, many=True)
+        
+        return Response({
+            'results': serializer.data,
+            'count': len(serializer.data)
+        })
     
-    return Response({
-        'results': serializer.data,
-        'count': len(serializer.data)
-    })
\ No newline at end of file
+    return respuesta_catalogo(request, CATALOGO_MEDICAMENTOS, version_catalogo(), construir)
@@ -0,0 +1,80 @@
+"""
+Cola de dispensación de recetas validadas, común a farmacia y CMI.
+
+La página de la cola se obtiene con un número fijo de consultas sin importar
+cuántas recetas haya en espera: una para el total y otra para la página, que
+trae paciente y prescriptor con `select_related` y el número de medicamentos
+anotado. La paginación es por cursor (keyset) sobre el orden elegido, que
+siempre termina en folio_receta para desempatar.
+
+El orden por prioridad usa `Receta.prioridad_rank`, que se guarda con la
+receta; el índice parcial `recetas_cola_dispensar_idx` sirve la cola en ese
+orden sin ordenar en memoria. Para que la base de datos reconozca el índice
+parcial, el filtro por estado usa el lookup `estado__por_dispensar=True` del
+modelo, que escribe los estados como literales, y el total de medicamentos
+es una subconsulta en lugar de un GROUP BY.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from mau_hospital.pagination import KeysetPagination
+from .models import DetalleReceta, Receta
+
+# Orden de la cola para cada valor de `sort_by`
+ORDENES_COLA = {
+    'prioridad': ('prioridad_rank', 'fecha_validacion', 'folio_receta'),
+    'fecha_validacion': ('fecha_validacion', 'folio_receta'),
+    'fecha_vencimiento': ('fecha_vencimiento', 'prioridad_rank', 'folio_receta'),
+}
+
+# Permiso requerido y mensaje de error por tipo de receta
+PERMISOS_COLA = {
+    'FARMACIA': ('can_dispense_pharmacy', 'No tiene permisos para dispensar medicamentos de farmacia'),
+    'CMI': ('can_dispense_cmi', 'No tiene permisos para dispensar mezclas del CMI'),
+}
+
+
+class ColaDispensacionPagination(KeysetPagination):
+    """Páginas de la cola; el orden se asigna por petición según `sort_by`"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    modo_predeterminado = 'cursor'
+    ordering = ORDENES_COLA['prioridad']
+
+
+def puede_ver_cola(usuario, tipo_receta):
+    """Retorna None si el usuario puede ver la cola, o el mensaje de error"""
+    permiso, mensaje = PERMISOS_COLA[tipo_receta]
+    return None if getattr(usuario, permiso)() else mensaje
+
+
+def recetas_en_cola(tipo_receta, search=None, prioridad=None):
+    """Recetas de la cola de `tipo_receta` con los filtros opcionales, sin ordenar"""
+    recetas = Receta.objects.filter(tipo_receta=tipo_receta, estado__por_dispensar=True)
+
+    if search:
+        recetas = recetas.filter(
+            Q(folio_receta__icontains=search) |
+            Q(paciente__expediente__icontains=search) |
+            Q(paciente__nombre__icontains=search) |
+            Q(paciente__apellido_paterno__icontains=search) |
+            Q(paciente__apellido_materno__icontains=search) |
+            Q(servicio_solicitante__icontains=search)
+        )
+
+    if prioridad:
+        recetas = recetas.filter(prioridad=prioridad)
+
+    return recetas
+
+
+def pagina_cola(recetas, paginador, request):
+    """Página de la cola con paciente, prescriptor y total de medicamentos ya cargados"""
+    total_detalles = DetalleReceta.objects.filter(
+        receta=OuterRef('pk')
+    ).order_by().values('receta').annotate(total=Count('*')).values('total')
+    recetas = recetas.select_related('paciente', 'prescrito_por').annotate(
+        total_detalles=Coalesce(Subquery(total_detalles, output_field=IntegerField()), 0),
+    ).order_by(*paginador.ordering)
+    return paginador.paginate_queryset(recetas, request)
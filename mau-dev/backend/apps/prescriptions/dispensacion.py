@@ -0,0 +1,192 @@
+"""
+Dispensación de una receta completa en una sola transacción.
+
+Recibe todos los lotes de la receta y, con un número fijo de sentencias sin
+importar cuántos medicamentos tenga:
+
+1. bloquea la receta y valida las cantidades contra lo prescrito;
+2. descuenta el stock con `registrar_salidas` de
+   `apps.inventory.movimientos_stock`, que comprueba el disponible en el
+   mismo UPDATE y registra los movimientos de inventario;
+3. suma los contadores de los medicamentos con una sola actualización
+   `F()`, inserta los lotes con `bulk_create` y guarda el estado de la
+   receta una vez.
+
+Los medicamentos sin vínculo al catálogo no tienen registro de stock y se
+dispensan sin mover inventario.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework import status
+
+from apps.inventory.models import MedicamentoStock
+from apps.inventory.movimientos_stock import StockInsuficiente, registrar_salidas
+from .cola_dispensacion import puede_ver_cola
+from .models import DetalleReceta, LoteDetalleReceta, Receta
+
+
+class ErrorDispensacion(Exception):
+    """Error que cancela toda la dispensación; lleva el mensaje y el código HTTP"""
+
+    def __init__(self, mensaje, codigo=status.HTTP_400_BAD_REQUEST):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.codigo = codigo
+
+
+def _por_id(cantidades, campo='pk'):
+    """Expresión CASE con la cantidad que corresponde a cada id"""
+    return Case(
+        *[When(**{campo: id_}, then=Value(cantidad)) for id_, cantidad in cantidades.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def dispensar_receta(folio_receta, lotes, usuario):
+    """
+    Registra `lotes` (diccionarios validados por DispensacionRecetaSerializer)
+    en la receta y retorna los lotes creados. Lanza ErrorDispensacion sin
+    dejar cambios si cualquier lote no se puede dispensar.
+    """
+    with transaction.atomic():
+        try:
+            receta = Receta.objects.select_for_update().get(folio_receta=folio_receta)
+        except Receta.DoesNotExist:
+            raise ErrorDispensacion('Receta no encontrada', status.HTTP_404_NOT_FOUND)
+
+        error = puede_ver_cola(usuario, receta.tipo_receta)
+        if error:
+            raise ErrorDispensacion(error, status.HTTP_403_FORBIDDEN)
+        if not receta.can_be_dispensed():
+            raise ErrorDispensacion('La receta no puede ser dispensada en su estado actual')
+
+        detalles = {
+            detalle.id: detalle
+            for detalle in receta.detalles.select_related('medicamento_catalogo')
+        }
+
+        por_detalle = defaultdict(int)
+        for lote in lotes:
+            if lote['detalle_id'] not in detalles:
+                raise ErrorDispensacion(
+                    f'El medicamento {lote["detalle_id"]} no pertenece a la receta {folio_receta}',
+                    status.HTTP_404_NOT_FOUND
+                )
+            por_detalle[lote['detalle_id']] += lote['cantidad_dispensada']
+
+        for detalle_id, cantidad in por_detalle.items():
+            detalle = detalles[detalle_id]
+            if detalle.get_cantidad_dispensada() + cantidad > detalle.cantidad_prescrita:
+                raise ErrorDispensacion(
+                    f'La cantidad total dispensada de {detalle.clave_medicamento} '
+                    f'({detalle.get_cantidad_dispensada() + cantidad}) excede la cantidad '
+                    f'prescrita ({detalle.cantidad_prescrita})'
+                )
+
+        por_medicamento = defaultdict(int)
+        medicamentos = {}
+        for detalle_id, cantidad in por_detalle.items():
+            medicamento = detalles[detalle_id].medicamento_catalogo
+            if medicamento:
+                por_medicamento[medicamento.id] += cantidad
+                medicamentos[medicamento.id] = medicamento
+
+        por_stock = {}
+        medicamento_de_stock = {}
+        if por_medicamento:
+            stocks = MedicamentoStock.objects.filter(
+                medicamento_catalogo_id__in=por_medicamento
+            ).values_list('id', 'medicamento_catalogo_id')
+            stock_de = {}
+            for stock_id, medicamento_id in stocks:
+                if medicamento_id in stock_de:
+                    raise ErrorDispensacion(
+                        f'El medicamento {medicamentos[medicamento_id].clave} '
+                        f'tiene más de un registro de stock'
+                    )
+                stock_de[medicamento_id] = stock_id
+
+            for medicamento_id, cantidad in por_medicamento.items():
+                if medicamento_id not in stock_de:
+                    raise ErrorDispensacion(
+                        f"Medicamento '{medicamentos[medicamento_id].nombre}' no encontrado en inventario"
+                    )
+                por_stock[stock_de[medicamento_id]] = cantidad
+                medicamento_de_stock[stock_de[medicamento_id]] = medicamento_id
+
+        # Cada movimiento se vincula al medicamento de la receta cuando solo uno usa ese stock
+        detalles_de_stock = {}
+        for stock_id, medicamento_id in medicamento_de_stock.items():
+            del_medicamento = [
+                detalles[detalle_id] for detalle_id in por_detalle
+                if detalles[detalle_id].medicamento_catalogo_id == medicamento_id
+            ]
+            if len(del_medicamento) == 1:
+                detalles_de_stock[stock_id] = del_medicamento[0]
+
+        try:
+            registrar_salidas(por_stock, usuario=usuario, receta=receta, detalles=detalles_de_stock)
+        except StockInsuficiente as e:
+            if e.stock not in medicamento_de_stock:
+                raise ErrorDispensacion(str(e))
+            medicamento = medicamentos[medicamento_de_stock[e.stock]]
+            raise ErrorDispensacion(
+                f'Stock insuficiente de {medicamento.clave}. '
+                f'Disponible: {e.disponible}, solicitado: {e.solicitado}'
+            )
+
+        ahora = timezone.now()
+
+        # La condición repite la validación por si un lote individual entró
+        # después de leer los detalles
+        suma_detalles = _por_id(por_detalle)
+        actualizados = DetalleReceta.objects.filter(
+            id__in=por_detalle,
+            cantidad_dispensada_lotes__lte=F('cantidad_prescrita') - suma_detalles,
+        ).update(
+            cantidad_dispensada_lotes=F('cantidad_dispensada_lotes') + suma_detalles,
+            cantidad_surtida=F('cantidad_dispensada_lotes') + suma_detalles,
+            fecha_actualizacion=ahora,
+        )
+        if actualizados != len(por_detalle):
+            raise ErrorDispensacion(
+                'Otro usuario dispensó medicamentos de esta receta al mismo tiempo; '
+                'recargue la receta e intente de nuevo',
+                status.HTTP_409_CONFLICT
+            )
+
+        creados = LoteDetalleReceta.objects.bulk_create([
+            LoteDetalleReceta(
+                detalle_receta=detalles[lote['detalle_id']],
+                lote=lote.get('lote') or 'SIN_LOTE',
+                fecha_caducidad=lote['fecha_caducidad'],
+                cantidad_dispensada=lote['cantidad_dispensada'],
+                observaciones=lote.get('observaciones', ''),
+                dispensado_por=usuario,
+            )
+            for lote in lotes
+        ])
+
+        # Estado de la receta con los contadores tal como quedaron en la base de datos
+        contadores = receta.detalles.values_list('id', 'cantidad_dispensada_lotes', 'cantidad_surtida')
+        for detalle_id, dispensada_lotes, surtida in contadores:
+            detalles[detalle_id].cantidad_dispensada_lotes = dispensada_lotes
+            detalles[detalle_id].cantidad_surtida = surtida
+
+        if all(detalle.is_completely_dispensed() for detalle in detalles.values()):
+            receta.estado = 'SURTIDA'
+            receta.fecha_dispensacion = ahora
+            receta.dispensado_por = usuario
+        else:
+            if receta.estado != 'PARCIALMENTE_SURTIDA':
+                receta.fecha_dispensacion_parcial = ahora
+            receta.estado = 'PARCIALMENTE_SURTIDA'
+            if receta.dispensado_por_id is None:
+                receta.dispensado_por = usuario
+        receta.save()
+
+    return creados
@@ -0,0 +1,279 @@
+"""
+Eventos en vivo de las colas de validación y dispensación.
+
+Cada vez que una receta se guarda o se borra, las señales de `signals.py`
+publican en el difusor del proceso qué le pasó en cada cola:
+
+- `insertada`: la receta entró a la cola; `datos` es la receta serializada.
+- `estado_cambiado`: la receta sigue en la cola con otro estado (por ejemplo
+  de VALIDADA a PARCIALMENTE_SURTIDA); `datos` es la receta serializada.
+- `actualizada`: la receta sigue en la cola y cambió otro dato (prioridad,
+  observaciones...); `datos` es la receta serializada.
+- `eliminada`: la receta salió de la cola; `datos` solo trae el folio y el
+  estado nuevo.
+
+El cliente carga la cola una vez con el endpoint paginado y después aplica
+estos eventos: inserta o reemplaza por `folio_receta` y quita las eliminadas.
+Los eventos se publican al confirmar la transacción y no cubren los
+`QuerySet.update()` que no pasan por `save()`.
+
+Cada evento tiene un id `<época>-<número>`; la época cambia cuando arranca el
+proceso. Un cliente que se reconecta con `Last-Event-ID` recibe los eventos
+que se perdió mientras sigan en el historial; si no (otra época, historial
+rebasado o cliente demasiado lento) recibe un evento `reinicio` y debe volver
+a cargar la cola.
+
+EventSource no permite enviar encabezados y el JWT de la sesión no debe ir
+en la URL, donde queda en los logs. El cliente pide primero un token con
+POST `colas/<cola>/eventos/token/` y lo pasa en `?token=`: sirve solo para
+abrir el flujo de esa cola y vence a los VIGENCIA_TOKEN_FLUJO segundos. Como
+EventSource no puede renovarlo, cuando la conexión se cierra el cliente pide
+otro token y abre un EventSource nuevo con su último id en `?ultimo_id=`.
+
+El difusor vive en memoria del proceso, así que el servidor ASGI debe
+atender el flujo con un solo proceso (los hilos sí se comparten). Cada
+conexión dura como máximo DURACION_MAXIMA segundos: Django 4.2 no avisa
+cuando el cliente se desconecta, y así las suscripciones abandonadas se
+liberan solas. EventSource se reconecta y reanuda con su Last-Event-ID.
+"""
+import asyncio
+import json
+import threading
+import uuid
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework_simplejwt.tokens import Token
+
+COLA_VALIDACION = 'validacion'
+COLA_FARMACIA = 'farmacia'
+COLA_CMI = 'cmi'
+
+# Cola de dispensación de cada tipo de receta
+COLAS_DISPENSACION = {
+    'FARMACIA': COLA_FARMACIA,
+    'CMI': COLA_CMI,
+}
+
+COLAS = (COLA_VALIDACION, COLA_FARMACIA, COLA_CMI)
+
+# Eventos que se conservan por cola para reanudar conexiones
+MAX_HISTORIAL = 500
+
+# Eventos sin leer que se aceptan por suscripción antes de pedir un reinicio
+MAX_PENDIENTES = 1000
+
+# Segundos sin eventos tras los que se envía un comentario para mantener la conexión
+LATIDO_SEGUNDOS = 15
+
+# Segundos que dura cada conexión antes de pedir al cliente que se reconecte
+DURACION_MAXIMA = 300
+
+# Milisegundos que espera EventSource antes de reconectarse
+RECONEXION_MS = 3000
+
+# Segundos que vale un token para abrir el flujo de eventos
+VIGENCIA_TOKEN_FLUJO = 60
+
+
+def cola_de(tipo_receta, estado):
+    """Cola en la que aparece una receta con `tipo_receta` y `estado`, o None"""
+    from .models import Receta
+
+    if estado == 'PENDIENTE':
+        return COLA_VALIDACION
+    if estado in Receta.ESTADOS_POR_DISPENSAR:
+        return COLAS_DISPENSACION.get(tipo_receta)
+    return None
+
+
+class TokenFlujoEventos(Token):
+    """
+    JWT para abrir el flujo de eventos de una cola (claim `cola`). Su tipo
+    es distinto al del token de acceso, así que no sirve para el resto de la API.
+    """
+
+    token_type = 'flujo_eventos'
+    lifetime = timedelta(seconds=VIGENCIA_TOKEN_FLUJO)
+
+    @classmethod
+    def para_cola(cls, usuario, cola):
+        token = cls.for_user(usuario)
+        token['cola'] = cola
+        return token
+
+
+class Evento:
+    """Evento publicado en una cola"""
+
+    __slots__ = ('id', 'tipo', 'datos')
+
+    def __init__(self, id, tipo, datos):
+        self.id = id
+        self.tipo = tipo
+        self.datos = datos
+
+
+class Suscripcion:
+    """
+    Eventos de una cola para un cliente.
+
+    El difusor entrega los eventos desde cualquier hilo; el cliente los lee
+    con `siguiente()` en el event loop en el que se creó la suscripción.
+    """
+
+    def __init__(self, difusor, cola, loop=None):
+        self.cola = cola
+        self._difusor = difusor
+        # Último id de la cola al suscribirse
+        self.id_inicial = None
+        self.reinicio = False
+        # Id desde el que el cliente sigue después de volver a cargar la cola
+        self.id_reinicio = None
+        self._loop = loop
+        self._eventos = asyncio.Queue(maxsize=MAX_PENDIENTES) if loop else deque()
+
+    def entregar(self, evento):
+        if self._loop is None:
+            self._poner(evento)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._poner, evento)
+
+    def _poner(self, evento):
+        if self._loop is None:
+            self._eventos.append(evento)
+            return
+        try:
+            self._eventos.put_nowait(evento)
+        except asyncio.QueueFull:
+            # El cliente no alcanza a leer: se le pide volver a cargar la cola
+            self.reinicio = True
+            self.id_reinicio = evento.id
+
+    async def siguiente(self, timeout):
+        """Siguiente evento, o None si no llega ninguno en `timeout` segundos"""
+        try:
+            return await asyncio.wait_for(self._eventos.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def cancelar(self):
+        """Deja de recibir eventos"""
+        self._difusor.cancelar(self)
+
+    def pendientes(self):
+        """Eventos recibidos y aún sin leer (suscripciones sin event loop)"""
+        eventos = list(self._eventos)
+        self._eventos.clear()
+        return eventos
+
+
+class DifusorColas:
+    """
+    Difusor en memoria: reparte cada evento a todas las suscripciones de su
+    cola y guarda los últimos para reanudar conexiones.
+
+    Las suscripciones sin event loop acumulan los eventos en una lista y
+    sirven para leerlos en pruebas y comandos.
+    """
+
+    def __init__(self, max_historial=MAX_HISTORIAL):
+        self.epoca = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._numero = defaultdict(int)
+        self._historial = defaultdict(lambda: deque(maxlen=max_historial))
+        self._suscripciones = defaultdict(set)
+
+    def publicar(self, cola, tipo, datos):
+        with self._lock:
+            self._numero[cola] += 1
+            evento = Evento(f'{self.epoca}-{self._numero[cola]}', tipo, datos)
+            self._historial[cola].append(evento)
+            suscripciones = list(self._suscripciones[cola])
+
+        for suscripcion in suscripciones:
+            suscripcion.entregar(evento)
+        return evento
+
+    def suscribir(self, cola, ultimo_id=None, loop=None):
+        """
+        Suscripción a `cola`. Con `ultimo_id` (el Last-Event-ID del cliente)
+        trae primero los eventos posteriores del historial, o queda marcada
+        para reinicio si ya no es posible reanudar desde ahí.
+        """
+        suscripcion = Suscripcion(self, cola, loop=loop)
+        with self._lock:
+            suscripcion.id_inicial = f'{self.epoca}-{self._numero[cola]}'
+            if ultimo_id:
+                perdidos = self._eventos_desde(cola, ultimo_id)
+                if perdidos is None:
+                    suscripcion.reinicio = True
+                    suscripcion.id_reinicio = suscripcion.id_inicial
+                else:
+                    for evento in perdidos:
+                        suscripcion._poner(evento)
+            self._suscripciones[cola].add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones[suscripcion.cola].discard(suscripcion)
+
+    def total_suscripciones(self, cola):
+        with self._lock:
+            return len(self._suscripciones[cola])
+
+    def _eventos_desde(self, cola, ultimo_id):
+        epoca, _, numero = ultimo_id.partition('-')
+        if epoca != self.epoca or not numero.isdigit():
+            return None
+
+        numero = int(numero)
+        if numero > self._numero[cola]:
+            return None
+        historial = self._historial[cola]
+        if numero == self._numero[cola]:
+            return []
+        # El historial debe contener el evento siguiente al que tiene el cliente
+        if not historial or int(historial[0].id.rsplit('-', 1)[1]) > numero + 1:
+            return None
+        return [evento for evento in historial if int(evento.id.rsplit('-', 1)[1]) > numero]
+
+
+difusor = DifusorColas()
+
+
+def formato_sse(tipo, datos, id=None):
+    """Evento en el formato de text/event-stream"""
+    lineas = [f'id: {id}'] if id else []
+    lineas.append(f'event: {tipo}')
+    lineas.append('data: ' + json.dumps(
+        datos, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')
+    ))
+    return '\n'.join(lineas) + '\n\n'
+
+
+async def flujo_eventos(suscripcion, reanudado):
+    """Cuerpo text/event-stream de una suscripción; la cancela al terminar"""
+    loop = asyncio.get_running_loop()
+    fin = loop.time() + DURACION_MAXIMA
+    try:
+        yield f'retry: {RECONEXION_MS}\n\n'
+        # Sin reanudación, el id inicial marca desde dónde aplicar eventos tras cargar la cola
+        yield formato_sse(
+            'conectado',
+            {'cola': suscripcion.cola, 'reanudado': reanudado and not suscripcion.reinicio},
+            id=None if reanudado else suscripcion.id_inicial,
+        )
+        while loop.time() < fin:
+            if suscripcion.reinicio:
+                yield formato_sse('reinicio', {'cola': suscripcion.cola}, id=suscripcion.id_reinicio)
+                return
+            evento = await suscripcion.siguiente(min(LATIDO_SEGUNDOS, max(fin - loop.time(), 0)))
+            if evento is None:
+                yield ': latido\n\n'
+            else:
+                yield formato_sse(evento.tipo, evento.datos, id=evento.id)
+    finally:
+        suscripcion.cancelar()
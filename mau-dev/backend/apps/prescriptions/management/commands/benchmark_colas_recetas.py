@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.patients.models import Paciente
+from apps.prescriptions.cola_dispensacion import ORDENES_COLA, pagina_cola, recetas_en_cola
+from apps.prescriptions.models import Receta
+from datetime import date, timedelta
+import random
+import time
+
+# Recetas de prueba: se identifican por el servicio para poder borrarlas
+SERVICIO_BENCHMARK = 'BENCHMARK COLAS'
+EXPEDIENTE_BENCHMARK = 'BENCH-COLAS'
+
+# Proporción aproximada de cada estado en un hospital con historial
+PESOS_ESTADO = {
+    'SURTIDA': 80,
+    'CANCELADA': 6,
+    'PENDIENTE': 5,
+    'VALIDADA': 6,
+    'PARCIALMENTE_SURTIDA': 3,
+}
+
+
+class Command(BaseCommand):
+    help = 'Mide las colas de validación y dispensación con muchas recetas y muestra su plan de consulta'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            required=True,
+            help='Número de recetas de prueba a generar (por ejemplo 1000000)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Recetas insertadas por lote (default: 5000)',
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=20,
+            help='Veces que se mide cada consulta (default: 20)',
+        )
+        parser.add_argument(
+            '--conservar',
+            action='store_true',
+            help='No borrar las recetas de prueba al terminar',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            raise CommandError(
+                'El benchmark inserta y borra recetas de prueba; solo se ejecuta con DEBUG=True '
+                f'(base de datos: {connection.settings_dict["NAME"]})'
+            )
+        if options['count'] < 1:
+            raise CommandError('--count debe ser mayor que cero')
+
+        existentes = Receta.objects.filter(servicio_solicitante=SERVICIO_BENCHMARK).count()
+        faltantes = options['count'] - existentes
+        if faltantes > 0:
+            self.generar_recetas(faltantes, options['batch_size'])
+        else:
+            self.stdout.write(f'📦 Usando {existentes} recetas de prueba existentes')
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            elif connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE prescriptions_receta')
+
+        total = Receta.objects.count()
+        self.stdout.write(f'\n📊 Colas medidas con {total} recetas en la base de datos')
+
+        colas = [
+            (
+                'Validación (PENDIENTE por fecha de creación)',
+                Receta.objects.filter(estado='PENDIENTE').order_by('-fecha_creacion', '-folio_receta')[:50],
+            ),
+        ]
+        for tipo in ('FARMACIA', 'CMI'):
+            colas.append((
+                f'Dispensación {tipo} (por prioridad)',
+                recetas_en_cola(tipo).order_by(*ORDENES_COLA['prioridad'])[:50],
+            ))
+        for nombre, consulta in colas:
+            self.medir(nombre, consulta, options['repeticiones'])
+
+        self.medir_pagina_servicio(options['repeticiones'])
+
+        if not options['conservar']:
+            self.stdout.write('\n🧹 Borrando recetas de prueba...')
+            self.borrar_recetas(options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Benchmark de colas terminado'))
+
+    def generar_recetas(self, cantidad, batch_size):
+        self.stdout.write(f'🏗️ Generando {cantidad} recetas de prueba...')
+        inicio = time.monotonic()
+
+        paciente, _ = Paciente.objects.get_or_create(
+            expediente=EXPEDIENTE_BENCHMARK,
+            defaults={
+                'curp': 'BENC000101HDFXXX01',
+                'nombre': 'Paciente',
+                'apellido_paterno': 'Benchmark',
+                'fecha_nacimiento': date(1980, 1, 1),
+                'genero': 'M',
+                'patologia': 'Benchmark de colas',
+                'cie10': 'Z00',
+                'fecha_diagnostico': date(2020, 1, 1),
+            },
+        )
+
+        estados = list(PESOS_ESTADO)
+        pesos = list(PESOS_ESTADO.values())
+        prioridades = list(Receta.RANGOS_PRIORIDAD)
+        ahora = timezone.now()
+        generador = random.Random(2024)
+
+        creadas = 0
+        while creadas < cantidad:
+            lote = []
+            for _ in range(min(batch_size, cantidad - creadas)):
+                estado = generador.choices(estados, pesos)[0]
+                prioridad = generador.choice(prioridades)
+                validada = estado != 'PENDIENTE' and generador.random() > 0.05
+                lote.append(Receta(
+                    paciente=paciente,
+                    tipo_receta='FARMACIA' if generador.random() < 0.8 else 'CMI',
+                    estado=estado,
+                    prioridad=prioridad,
+                    # bulk_create no llama a save(), el rango se asigna aquí
+                    prioridad_rank=Receta.RANGOS_PRIORIDAD[prioridad],
+                    servicio_solicitante=SERVICIO_BENCHMARK,
+                    diagnostico='Benchmark',
+                    fecha_validacion=(
+                        ahora - timedelta(minutes=generador.randint(0, 525600)) if validada else None
+                    ),
+                ))
+            with transaction.atomic():
+                Receta.objects.bulk_create(lote, batch_size=batch_size)
+            creadas += len(lote)
+            if creadas % (batch_size * 20) == 0 or creadas == cantidad:
+                self.stdout.write(f'  - {creadas} recetas generadas...')
+
+        duracion = time.monotonic() - inicio
+        self.stdout.write(f'  Generación terminada en {duracion:.1f}s')
+
+    def borrar_recetas(self, batch_size):
+        recetas = Receta.objects.filter(servicio_solicitante=SERVICIO_BENCHMARK)
+        while True:
+            folios = list(recetas.values_list('folio_receta', flat=True)[:batch_size])
+            if not folios:
+                break
+            with transaction.atomic():
+                Receta.objects.filter(folio_receta__in=folios).delete()
+        Paciente.objects.filter(expediente=EXPEDIENTE_BENCHMARK).delete()
+
+    def medir(self, nombre, consulta, repeticiones):
+        """Tiempo de la primera página de la cola y su plan de consulta"""
+        plan = consulta.explain()
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            list(consulta.values_list('folio_receta', flat=True))
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+
+        self.stdout.write(f'\n⏱️ {nombre}')
+        self.stdout.write(
+            f'  mediana {tiempos[len(tiempos) // 2]:.2f} ms, '
+            f'máximo {tiempos[-1]:.2f} ms ({repeticiones} repeticiones)'
+        )
+        self.stdout.write('  Plan:')
+        for linea in plan.splitlines():
+            self.stdout.write(f'    {linea}')
+        self.reportar_plan(plan)
+
+    def medir_pagina_servicio(self, repeticiones):
+        """Página completa de la cola tal como la arma el endpoint (con total de medicamentos)"""
+        class Paginador:
+            ordering = ORDENES_COLA['prioridad']
+
+            def paginate_queryset(self, queryset, request):
+                return queryset[:50]
+
+        consulta = pagina_cola(recetas_en_cola('FARMACIA'), Paginador(), None)
+        self.medir('Página del endpoint de dispensación FARMACIA', consulta, repeticiones)
+
+    def reportar_plan(self, plan):
+        texto = plan.upper()
+        if 'TEMP B-TREE' in texto or 'SORT' in texto:
+            self.stdout.write(self.style.WARNING('  ⚠️ La consulta ordena en memoria'))
+        elif 'INDEX' in texto:
+            self.stdout.write(self.style.SUCCESS('  ✅ Servida en orden desde el índice'))
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from apps.prescriptions.models import DetalleReceta
+import time
+
+
+class Command(BaseCommand):
+    help = 'Verifica el contador de cantidad dispensada en lotes de cada medicamento contra la tabla de lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corregir',
+            action='store_true',
+            help='Corregir los contadores que no coinciden con la suma de sus lotes',
+        )
+        parser.add_argument(
+            '--mostrar',
+            type=int,
+            default=20,
+            help='Número máximo de diferencias a listar (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+
+        self.stdout.write('🔎 Comparando contadores de lotes con la tabla de lotes...')
+
+        with transaction.atomic():
+            diferencias = DetalleReceta.objects.annotate(
+                total_real=DetalleReceta.suma_lotes()
+            ).exclude(
+                cantidad_dispensada_lotes=F('total_real')
+            ).order_by('id')
+
+            if options['corregir']:
+                # Bloquear los detalles mientras se corrigen
+                diferencias = diferencias.select_for_update()
+
+            registros = list(diferencias.values_list(
+                'id', 'receta_id', 'clave_medicamento', 'cantidad_dispensada_lotes', 'total_real'
+            ))
+
+            for detalle_id, receta_id, clave, contador, total in registros[:options['mostrar']]:
+                self.stdout.write(
+                    f'  - Receta {receta_id}, {clave} (detalle {detalle_id}): '
+                    f'contador {contador}, lotes {total}'
+                )
+            if len(registros) > options['mostrar']:
+                self.stdout.write(f'  ... y {len(registros) - options["mostrar"]} más')
+
+            if registros and options['corregir']:
+                DetalleReceta.objects.filter(
+                    id__in=[registro[0] for registro in registros]
+                ).update(cantidad_dispensada_lotes=DetalleReceta.suma_lotes())
+
+        duracion = time.monotonic() - inicio
+        if not registros:
+            self.stdout.write(
+                self.style.SUCCESS(f'✅ Todos los contadores coinciden con sus lotes ({duracion:.2f}s)')
+            )
+        elif options['corregir']:
+            self.stdout.write(
+                self.style.SUCCESS(f'✅ {len(registros)} contadores corregidos en {duracion:.2f}s')
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'⚠️ {len(registros)} contadores no coinciden con sus lotes; '
+                    f'use --corregir para recalcularlos'
+                )
+            )
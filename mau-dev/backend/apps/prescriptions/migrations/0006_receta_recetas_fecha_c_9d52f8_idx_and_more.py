@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0005_catalogomedicamentos_alter_detallereceta_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='receta',
+            index=models.Index(fields=['-fecha_creacion', '-folio_receta'], name='recetas_fecha_c_9d52f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receta',
+            index=models.Index(fields=['estado', '-fecha_creacion', '-folio_receta'], name='recetas_estado_9b056d_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+def marcar_version_actual(apps, schema_editor):
+    """Los medicamentos existentes cuentan como parte de la versión actual del catálogo"""
+    CatalogoMedicamentos = apps.get_model('prescriptions', 'CatalogoMedicamentos')
+    VersionCatalogo = apps.get_model('patients', 'VersionCatalogo')
+
+    version = VersionCatalogo.objects.filter(nombre='medicamentos').values_list('version', flat=True).first() or 0
+    CatalogoMedicamentos.objects.update(version_cambio=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0006_receta_recetas_fecha_c_9d52f8_idx_and_more'),
+        ('patients', '0014_version_cambio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogomedicamentos',
+            name='version_cambio',
+            field=models.PositiveBigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Versión del último cambio'),
+        ),
+        migrations.RunPython(marcar_version_actual, migrations.RunPython.noop),
+    ]
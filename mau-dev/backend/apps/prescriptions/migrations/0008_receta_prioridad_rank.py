@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+RANGOS_PRIORIDAD = {
+    'URGENTE': 0,
+    'ALTA': 1,
+    'MEDIA': 2,
+    'BAJA': 3,
+}
+
+
+def calcular_rangos(apps, schema_editor):
+    """Rango de prioridad de las recetas existentes, una actualización por prioridad"""
+    Receta = apps.get_model('prescriptions', 'Receta')
+    Receta.objects.exclude(prioridad__in=RANGOS_PRIORIDAD).update(prioridad_rank=len(RANGOS_PRIORIDAD))
+    for prioridad, rango in RANGOS_PRIORIDAD.items():
+        Receta.objects.filter(prioridad=prioridad).update(prioridad_rank=rango)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0007_version_cambio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receta',
+            name='prioridad_rank',
+            field=models.PositiveSmallIntegerField(default=2, editable=False, verbose_name='Rango de prioridad'),
+        ),
+        migrations.RunPython(calcular_rangos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='receta',
+            index=models.Index(condition=models.Q(('estado__in', ['VALIDADA', 'PARCIALMENTE_SURTIDA'])), fields=['tipo_receta', 'prioridad_rank', 'fecha_validacion', 'folio_receta'], name='recetas_cola_dispensar_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:37
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calcular_contadores(apps, schema_editor):
+    """Suma los lotes existentes de cada detalle en una sola actualización"""
+    DetalleReceta = apps.get_model('prescriptions', 'DetalleReceta')
+    LoteDetalleReceta = apps.get_model('prescriptions', 'LoteDetalleReceta')
+
+    suma_lotes = LoteDetalleReceta.objects.filter(
+        detalle_receta=OuterRef('pk')
+    ).order_by().values('detalle_receta').annotate(total=Sum('cantidad_dispensada')).values('total')
+    DetalleReceta.objects.update(
+        cantidad_dispensada_lotes=Coalesce(Subquery(suma_lotes, output_field=models.PositiveIntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0008_receta_prioridad_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detallereceta',
+            name='cantidad_dispensada_lotes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Cantidad Dispensada en Lotes'),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
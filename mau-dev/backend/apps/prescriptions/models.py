@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from apps.patients.models import Paciente
@@ -125,6 +126,15 @@ class CatalogoMedicamentos(models.Model):
         verbose_name='Última Actualización'
     )
     
+    # Versión del catálogo en la que cambió el medicamento (nula mientras no se incrementa)
+    version_cambio = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        verbose_name='Versión del último cambio'
+    )
+    
     class Meta:
         verbose_name = 'Medicamento del Catálogo'
         verbose_name_plural = 'Catálogo de Medicamentos'
@@ -149,6 +159,10 @@ class CatalogoMedicamentos(models.Model):
         """Verifica si está disponible para el tipo de receta"""
         return self.tipo_receta_permitido in ['AMBOS', tipo_receta]
 
+# Estados de las recetas que esperan dispensación
+ESTADOS_POR_DISPENSAR = ['VALIDADA', 'PARCIALMENTE_SURTIDA']
+
+
 class Receta(models.Model):
     """Modelo para gestionar recetas médicas"""
     
@@ -172,6 +186,16 @@ class Receta(models.Model):
         ('URGENTE', 'Urgente'),
     ]
     
+    # Posición de cada prioridad en las colas: las urgentes primero
+    RANGOS_PRIORIDAD = {
+        'URGENTE': 0,
+        'ALTA': 1,
+        'MEDIA': 2,
+        'BAJA': 3,
+    }
+    
+    ESTADOS_POR_DISPENSAR = ESTADOS_POR_DISPENSAR
+    
     # Folio de receta como Primary Key
     folio_receta = models.AutoField(
         primary_key=True,
@@ -208,6 +232,13 @@ class Receta(models.Model):
         verbose_name='Prioridad'
     )
     
+    # Copia numérica de la prioridad para que las colas se ordenen por índice
+    prioridad_rank = models.PositiveSmallIntegerField(
+        default=2,
+        editable=False,
+        verbose_name='Rango de prioridad'
+    )
+    
     servicio_solicitante = models.CharField(
         max_length=100,
         verbose_name='Servicio Solicitante',
@@ -305,11 +336,46 @@ class Receta(models.Model):
             models.Index(fields=['fecha_creacion']),
             models.Index(fields=['servicio_solicitante']),
             models.Index(fields=['prioridad']),
+            # Orden del listado con desempate único (paginación por cursor)
+            models.Index(fields=['-fecha_creacion', '-folio_receta']),
+            models.Index(fields=['estado', '-fecha_creacion', '-folio_receta']),
+            # Colas de dispensación: el índice parcial ya contiene solo las
+            # recetas por dispensar y está en el orden de la cola
+            models.Index(
+                fields=['tipo_receta', 'prioridad_rank', 'fecha_validacion', 'folio_receta'],
+                name='recetas_cola_dispensar_idx',
+                condition=models.Q(estado__in=ESTADOS_POR_DISPENSAR),
+            ),
         ]
     
     def __str__(self):
         return f"Receta {self.folio_receta} - {self.paciente.expediente} ({self.get_estado_display()})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Recordar el estado leído para detectar cambios al guardar
+        instancia._estado_cargado = instancia.__dict__.get('estado')
+        return instancia
+    
+    def save(self, *args, **kwargs):
+        registrar_actividad = (
+            self._state.adding or self.estado != getattr(self, '_estado_cargado', None)
+        )
+        
+        self.prioridad_rank = self.RANGOS_PRIORIDAD.get(self.prioridad, len(self.RANGOS_PRIORIDAD))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'prioridad' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'prioridad_rank'}
+        
+        # Crear la receta o cambiar su estado cuenta como actividad del paciente;
+        # la receta y la actividad se guardan juntas o ninguna
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if registrar_actividad:
+                Paciente.registrar_actividad(self.paciente_id)
+        self._estado_cargado = self.estado
+    
     def can_be_validated(self):
         """Verifica si la receta puede ser validada"""
         return self.estado == 'PENDIENTE'
@@ -328,7 +394,7 @@ class Receta(models.Model):
         if not medicamentos:
             return False
         
-        any_dispensed = any(med.cantidad_surtida > 0 for med in medicamentos)
+        any_dispensed = any(med.get_cantidad_dispensada() > 0 for med in medicamentos)
         all_dispensed = all(med.is_completely_dispensed() for med in medicamentos)
         
         return any_dispensed and not all_dispensed
@@ -340,6 +406,28 @@ class Receta(models.Model):
             return False
         return all(med.is_completely_dispensed() for med in medicamentos)
 
+
+@Receta._meta.get_field('estado').register_lookup
+class PorDispensar(models.Lookup):
+    """
+    `estado__por_dispensar=True`: la receta espera dispensación.
+
+    Equivale a `estado__in=ESTADOS_POR_DISPENSAR`, pero con los estados
+    escritos en el SQL igual que en la condición del índice parcial
+    `recetas_cola_dispensar_idx`; con parámetros, SQLite no puede comprobar
+    que la consulta cumple la condición y no usa el índice.
+    """
+    lookup_name = 'por_dispensar'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        if self.rhs is not True:
+            raise ValueError('estado__por_dispensar solo acepta True')
+        lhs, params = self.process_lhs(compiler, connection)
+        estados = ', '.join(f"'{estado}'" for estado in ESTADOS_POR_DISPENSAR)
+        return f'{lhs} IN ({estados})', params
+
+
 class DetalleReceta(models.Model):
     """Modelo para gestionar los medicamentos dentro de una receta"""
     
@@ -385,6 +473,14 @@ class DetalleReceta(models.Model):
         verbose_name='Cantidad Surtida'
     )
     
+    # Suma de cantidad_dispensada de los lotes; la mantiene LoteDetalleReceta
+    # con incrementos F() y solo se corrige con reconciliar_lotes_dispensados
+    cantidad_dispensada_lotes = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Cantidad Dispensada en Lotes'
+    )
+    
     # Información de dispensación
     lote = models.CharField(
         max_length=50,
@@ -439,58 +535,72 @@ class DetalleReceta(models.Model):
                 'La cantidad surtida no puede ser mayor a la cantidad prescrita'
             )
         
+        # Una copia en memoria no debe pisar el contador que los lotes
+        # actualizan en la base de datos
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'cantidad_dispensada_lotes'
+            ]
+        
         super().save(*args, **kwargs)
     
+    def get_cantidad_dispensada(self):
+        """Cantidad dispensada: la suma de lotes si existen, si no la dispensación tradicional"""
+        if self.cantidad_dispensada_lotes > 0:
+            return self.cantidad_dispensada_lotes
+        return self.cantidad_surtida
+    
     def is_completely_dispensed(self):
         """Verifica si el medicamento está completamente dispensado"""
-        # Priorizar la suma de lotes si existen
-        total_lotes_dispensados = self.lotes.aggregate(
-            total=models.Sum('cantidad_dispensada')
-        )['total'] or 0
-        
-        if total_lotes_dispensados > 0:
-            return total_lotes_dispensados >= self.cantidad_prescrita
-        
-        # Si no hay lotes, usar dispensación tradicional
-        return self.cantidad_surtida >= self.cantidad_prescrita
+        return self.get_cantidad_dispensada() >= self.cantidad_prescrita
     
     def get_porcentaje_surtido(self):
         """Calcula el porcentaje surtido del medicamento"""
         if self.cantidad_prescrita == 0:
             return 0
         
-        # Priorizar la suma de lotes si existen
-        total_lotes_dispensados = self.lotes.aggregate(
-            total=models.Sum('cantidad_dispensada')
-        )['total'] or 0
-        
-        if total_lotes_dispensados > 0:
-            cantidad_actual = total_lotes_dispensados
-        else:
-            cantidad_actual = self.cantidad_surtida
-        
-        porcentaje = (cantidad_actual / self.cantidad_prescrita) * 100
+        porcentaje = (self.get_cantidad_dispensada() / self.cantidad_prescrita) * 100
         return min(porcentaje, 100)  # No exceder 100%
     
     def get_cantidad_pendiente(self):
         """Calcula la cantidad pendiente por dispensar"""
-        # Priorizar la suma de lotes si existen
-        total_lotes_dispensados = self.lotes.aggregate(
-            total=models.Sum('cantidad_dispensada')
-        )['total'] or 0
-        
-        if total_lotes_dispensados > 0:
-            cantidad_actual = total_lotes_dispensados
-        else:
-            cantidad_actual = self.cantidad_surtida
-        
-        return max(0, self.cantidad_prescrita - cantidad_actual)
+        return max(0, self.cantidad_prescrita - self.get_cantidad_dispensada())
     
     def get_total_lotes_dispensados(self):
         """Obtiene el total de cantidad dispensada por lotes"""
-        return self.lotes.aggregate(
+        return self.cantidad_dispensada_lotes
+    
+    @staticmethod
+    def suma_lotes():
+        """Expresión con la suma real de cantidad_dispensada de los lotes del detalle"""
+        suma = LoteDetalleReceta.objects.filter(
+            detalle_receta=models.OuterRef('pk')
+        ).order_by().values('detalle_receta').annotate(
             total=models.Sum('cantidad_dispensada')
-        )['total'] or 0
+        ).values('total')
+        return Coalesce(
+            models.Subquery(suma, output_field=models.PositiveIntegerField()), 0
+        )
+    
+    @classmethod
+    def ajustar_lotes_dispensados(cls, detalle_id, cantidad):
+        """
+        Suma `cantidad` (negativa al quitar lotes) al contador de lotes del
+        detalle con una sola actualización. Retorna False si el aumento
+        rebasaría la cantidad prescrita, en cuyo caso no cambia nada.
+        """
+        if not cantidad:
+            return True
+        
+        detalles = cls.objects.filter(pk=detalle_id)
+        if cantidad > 0:
+            detalles = detalles.filter(
+                cantidad_dispensada_lotes__lte=models.F('cantidad_prescrita') - cantidad
+            )
+        return detalles.update(
+            cantidad_dispensada_lotes=models.F('cantidad_dispensada_lotes') + cantidad
+        ) > 0
 
 class LoteDetalleReceta(models.Model):
     """Modelo para gestionar múltiples lotes de un mismo medicamento"""
@@ -544,30 +654,57 @@ class LoteDetalleReceta(models.Model):
     def __str__(self):
         return f"Lote {self.lote} - {self.cantidad_dispensada} unidades"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Recordar lo que el lote aporta al contador de su detalle
+        instancia._aporte_cargado = (
+            instancia.__dict__.get('detalle_receta_id'),
+            instancia.__dict__.get('cantidad_dispensada'),
+        )
+        return instancia
+    
     def save(self, *args, **kwargs):
-        # Validar que no se exceda la cantidad prescrita
-        total_otros_lotes = self.detalle_receta.lotes.exclude(id=self.id).aggregate(
-            total=models.Sum('cantidad_dispensada')
-        )['total'] or 0
-        
-        total_con_este_lote = total_otros_lotes + self.cantidad_dispensada
-        
-        if total_con_este_lote > self.detalle_receta.cantidad_prescrita:
-            raise ValidationError(
-                f'La cantidad total dispensada ({total_con_este_lote}) '
-                f'excede la cantidad prescrita ({self.detalle_receta.cantidad_prescrita})'
-            )
-        
-        super().save(*args, **kwargs)
+        detalle_anterior, cantidad_anterior = getattr(self, '_aporte_cargado', (None, 0))
+        if self._state.adding:
+            detalle_anterior, cantidad_anterior = None, 0
         
-        # Actualizar estado de la receta
-        self._update_recipe_status()
+        with transaction.atomic():
+            if detalle_anterior is not None and detalle_anterior != self.detalle_receta_id:
+                DetalleReceta.ajustar_lotes_dispensados(detalle_anterior, -cantidad_anterior)
+                cantidad_anterior = 0
+            
+            # Validar que no se exceda la cantidad prescrita en la misma
+            # actualización que mueve el contador
+            diferencia = self.cantidad_dispensada - cantidad_anterior
+            if not DetalleReceta.ajustar_lotes_dispensados(self.detalle_receta_id, diferencia):
+                total_con_este_lote = (
+                    DetalleReceta.objects.filter(pk=self.detalle_receta_id)
+                    .values_list('cantidad_dispensada_lotes', flat=True).get()
+                    + diferencia
+                )
+                raise ValidationError(
+                    f'La cantidad total dispensada ({total_con_este_lote}) '
+                    f'excede la cantidad prescrita ({self.detalle_receta.cantidad_prescrita})'
+                )
+            
+            super().save(*args, **kwargs)
+            self._aporte_cargado = (self.detalle_receta_id, self.cantidad_dispensada)
+            
+            # Actualizar estado de la receta
+            self._update_recipe_status()
     
     def _update_recipe_status(self):
         """Actualiza el estado de la receta basado en el progreso de dispensación"""
         from django.utils import timezone
         
         receta = self.detalle_receta.receta
+        # Una sola consulta trae los contadores de todos los medicamentos
+        getattr(receta, '_prefetched_objects_cache', {}).pop('detalles', None)
+        models.prefetch_related_objects([receta], 'detalles')
+        for detalle in receta.detalles.all():
+            if detalle.pk == self.detalle_receta_id:
+                self.detalle_receta.cantidad_dispensada_lotes = detalle.cantidad_dispensada_lotes
         
         if receta.is_completely_dispensed():
             receta.estado = 'SURTIDA'
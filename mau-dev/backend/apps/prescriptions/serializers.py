@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import Count, Prefetch
 from rest_framework import serializers
 from .models import Receta, DetalleReceta, LoteDetalleReceta, CatalogoMedicamentos
 from apps.patients.serializers import PacienteBusquedaSerializer
@@ -91,14 +93,16 @@ class LoteDetalleRecetaCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("La cantidad debe ser mayor a 0")
         
         # Verificar stock si el contexto incluye detalle_receta
+        # Aviso temprano; el descuento en apps.inventory.movimientos_stock vuelve a
+        # comprobar el stock al registrar el lote
         detalle_receta = self.context.get('detalle_receta')
-        if detalle_receta:
+        if detalle_receta and detalle_receta.medicamento_catalogo:
             # Importar aquí para evitar import circular
             from apps.inventory.models import MedicamentoStock
             
             try:
                 medicamento_stock = MedicamentoStock.objects.get(
-                    medicamento_catalogo=detalle_receta.medicamento
+                    medicamento_catalogo=detalle_receta.medicamento_catalogo
                 )
                 
                 if medicamento_stock.available_stock < value:
@@ -109,7 +113,7 @@ class LoteDetalleRecetaCreateSerializer(serializers.ModelSerializer):
                     
             except MedicamentoStock.DoesNotExist:
                 raise serializers.ValidationError(
-                    f"Medicamento '{detalle_receta.medicamento.nombre}' no encontrado en inventario"
+                    f"Medicamento '{detalle_receta.medicamento_catalogo.nombre}' no encontrado en inventario"
                 )
         
         return value
@@ -130,6 +134,31 @@ class LoteDetalleRecetaCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class DispensacionLoteSerializer(serializers.Serializer):
+    """Un lote dentro de la dispensación de una receta completa"""
+    
+    detalle_id = serializers.IntegerField()
+    lote = serializers.CharField(max_length=50, required=False, allow_blank=True, default='SIN_LOTE')
+    fecha_caducidad = serializers.DateField()
+    cantidad_dispensada = serializers.IntegerField(min_value=1)
+    observaciones = serializers.CharField(required=False, allow_blank=True, default='')
+    
+    def validate_fecha_caducidad(self, value):
+        """Validar que la fecha de caducidad no haya pasado"""
+        from django.utils import timezone
+        
+        if value < timezone.now().date():
+            raise serializers.ValidationError("La fecha de caducidad no puede ser anterior a hoy")
+        
+        return value
+
+
+class DispensacionRecetaSerializer(serializers.Serializer):
+    """Todos los lotes que se dispensan de una receta en una sola operación"""
+    
+    lotes = DispensacionLoteSerializer(many=True, allow_empty=False)
+
+
 class DetalleRecetaSerializer(serializers.ModelSerializer):
     """Serializador para DetalleReceta"""
     
@@ -223,7 +252,29 @@ class RecetaSerializer(serializers.ModelSerializer):
             'can_be_validated', 'can_be_dispensed', 'fecha_creacion'
         ]
     
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Trae paciente y usuarios en la consulta de la receta, y medicamentos
+        (con su catálogo) y lotes (con quien los dispensó) en una consulta
+        cada uno. Los campos calculados usan después solo esos objetos, así
+        que la receta completa cuesta 3 consultas sin importar sus medicamentos.
+        """
+        return queryset.select_related(
+            'paciente', 'prescrito_por', 'validado_por', 'dispensado_por'
+        ).prefetch_related(
+            Prefetch(
+                'detalles',
+                queryset=DetalleReceta.objects.select_related('medicamento_catalogo')
+            ),
+            Prefetch(
+                'detalles__lotes',
+                queryset=LoteDetalleReceta.objects.select_related('dispensado_por')
+            ),
+        )
+    
     def get_total_medicamentos(self, obj):
+        # Con la precarga, count() usa los medicamentos ya cargados
         return obj.get_total_medicamentos()
     
     def get_prescrito_por_name(self, obj):
@@ -262,12 +313,26 @@ class RecetaListSerializer(serializers.ModelSerializer):
             'fecha_vencimiento', 'prescrito_por_name', 'total_medicamentos'
         ]
     
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Trae paciente y prescriptor en la misma consulta y anota el total de medicamentos"""
+        return queryset.select_related('paciente', 'prescrito_por').annotate(
+            total_detalles=Count('detalles')
+        )
+    
     def get_total_medicamentos(self, obj):
-        return obj.get_total_medicamentos()
+        total = getattr(obj, 'total_detalles', None)
+        return total if total is not None else obj.get_total_medicamentos()
     
     def get_prescrito_por_name(self, obj):
         return obj.prescrito_por.get_full_name() if obj.prescrito_por else None
 
+class RecetaColaSerializer(RecetaListSerializer):
+    """Receta en la cola de dispensación (incluye la fecha de validación)"""
+    
+    class Meta(RecetaListSerializer.Meta):
+        fields = RecetaListSerializer.Meta.fields + ['fecha_validacion']
+
 class RecetaCreateSerializer(serializers.ModelSerializer):
     """Serializador para crear recetas"""
     
@@ -298,12 +363,13 @@ class RecetaCreateSerializer(serializers.ModelSerializer):
         if request and request.user:
             validated_data['prescrito_por'] = request.user
         
-        # Crear la receta
-        receta = Receta.objects.create(**validated_data)
-        
-        # Crear los detalles
-        for detalle_data in detalles_data:
-            DetalleReceta.objects.create(receta=receta, **detalle_data)
+        # La receta y sus detalles se confirman juntos: los eventos de las
+        # colas se publican al confirmar y ya ven todos los medicamentos
+        with transaction.atomic():
+            receta = Receta.objects.create(**validated_data)
+            
+            for detalle_data in detalles_data:
+                DetalleReceta.objects.create(receta=receta, **detalle_data)
         
         return receta
 
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.patients.models import VersionCatalogo
+from .catalogo_medicamentos import CATALOGO_MEDICAMENTOS, invalidar_cache_local
+from .eventos_cola import COLA_VALIDACION, cola_de, difusor
+from .models import CatalogoMedicamentos, DetalleReceta, LoteDetalleReceta, Receta
+
+
+@receiver(pre_save, sender=CatalogoMedicamentos)
+def marcar_cambio_medicamento(sender, instance, **kwargs):
+    """El medicamento queda pendiente hasta el siguiente incremento de versión"""
+    instance.version_cambio = None
+
+
+@receiver(post_save, sender=CatalogoMedicamentos)
+@receiver(post_delete, sender=CatalogoMedicamentos)
+def incrementar_version_medicamentos(sender, signal, **kwargs):
+    """Cualquier alta, edición o baja de un medicamento invalida los ETags del catálogo"""
+    VersionCatalogo.incrementar(
+        CATALOGO_MEDICAMENTOS,
+        pendientes=CatalogoMedicamentos.objects.all(),
+        eliminacion=signal is post_delete
+    )
+    invalidar_cache_local()
+
+
+def _publicar_receta(cola, tipo, receta):
+    from .serializers import RecetaColaSerializer, RecetaListSerializer
+
+    serializer = RecetaListSerializer if cola == COLA_VALIDACION else RecetaColaSerializer
+    difusor.publicar(cola, tipo, serializer(receta).data)
+
+
+@receiver(post_save, sender=Receta)
+def publicar_cambio_receta(sender, instance, created, **kwargs):
+    """Avisa a las colas en vivo que la receta entró, cambió o salió de ellas"""
+    # post_save corre antes de que save() actualice el estado recordado
+    estado_anterior = None if created else getattr(instance, '_estado_cargado', None)
+    cola_anterior = cola_de(instance.tipo_receta, estado_anterior)
+    cola_nueva = cola_de(instance.tipo_receta, instance.estado)
+    if cola_anterior is None and cola_nueva is None:
+        return
+
+    if cola_nueva is None:
+        tipo = None
+    elif cola_nueva != cola_anterior:
+        tipo = 'insertada'
+    elif instance.estado != estado_anterior:
+        tipo = 'estado_cambiado'
+    else:
+        tipo = 'actualizada'
+
+    def publicar():
+        if cola_anterior and cola_anterior != cola_nueva:
+            difusor.publicar(cola_anterior, 'eliminada', {
+                'folio_receta': instance.folio_receta,
+                'estado': instance.estado,
+            })
+        if tipo:
+            _publicar_receta(cola_nueva, tipo, instance)
+
+    # Un error al publicar no debe convertir en error una escritura ya confirmada
+    transaction.on_commit(publicar, robust=True)
+
+
+@receiver(post_delete, sender=Receta)
+def publicar_receta_eliminada(sender, instance, **kwargs):
+    """Una receta borrada sale de la cola en la que estaba"""
+    cola = cola_de(instance.tipo_receta, instance.estado)
+    if cola:
+        # delete() deja la instancia sin folio; se conserva para el evento
+        datos = {'folio_receta': instance.folio_receta, 'estado': None}
+        transaction.on_commit(
+            lambda: difusor.publicar(cola, 'eliminada', datos), robust=True
+        )
+
+
+@receiver(post_delete, sender=LoteDetalleReceta)
+def descontar_lote_eliminado(sender, instance, **kwargs):
+    """Al borrar un lote, su cantidad deja de contar como dispensada"""
+    detalle_id, cantidad = getattr(
+        instance, '_aporte_cargado', (instance.detalle_receta_id, instance.cantidad_dispensada)
+    )
+    DetalleReceta.ajustar_lotes_dispensados(detalle_id, -cantidad)
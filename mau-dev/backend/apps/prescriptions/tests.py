@@ -0,0 +1,616 @@
+import asyncio
+import base64
+import io
+import json
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import AsyncClient, Client, TestCase
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.models import User
+from apps.inventory.models import MedicamentoStock, MedicamentoStockMovement
+from apps.inventory.movimientos_stock import registrar_salidas
+from apps.patients.models import Paciente
+from .dispensacion import ErrorDispensacion, dispensar_receta
+from .eventos_cola import COLA_FARMACIA, COLA_VALIDACION, TokenFlujoEventos, difusor
+from .models import CatalogoMedicamentos, DetalleReceta, LoteDetalleReceta, Receta
+
+
+def crear_paciente(expediente='EXP0001'):
+    return Paciente.objects.create(
+        expediente=expediente,
+        curp='PRUE800101HDFRRR01',
+        nombre='Paciente',
+        apellido_paterno='Prueba',
+        fecha_nacimiento=date(1980, 1, 1),
+        genero='M',
+        patologia='Prueba',
+        cie10='A00',
+        fecha_diagnostico=date(2020, 1, 1),
+    )
+
+
+class EventosColaRecetaTests(TestCase):
+    """Eventos de las colas en vivo al crear y modificar recetas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_eventos', password='x', role='ADMIN')
+        cls.paciente = crear_paciente()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.suscripcion = difusor.suscribir(COLA_VALIDACION)
+        self.addCleanup(self.suscripcion.cancelar)
+
+    def crear_receta(self):
+        return self.client.post('/api/recetas/', {
+            'paciente': self.paciente.expediente,
+            'tipo_receta': 'FARMACIA',
+            'servicio_solicitante': 'URGENCIAS',
+            'diagnostico': 'Prueba',
+            'detalles': [
+                {
+                    'clave_medicamento': f'CLAVE{numero}',
+                    'descripcion_medicamento': 'Medicamento',
+                    'cantidad_prescrita': 10,
+                    'dosis': '1 tableta',
+                    'frecuencia': 'Cada 8 horas',
+                    'via_administracion': 'ORAL',
+                }
+                for numero in range(2)
+            ],
+        }, format='json')
+
+    def test_receta_nueva_se_publica_con_sus_medicamentos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.crear_receta()
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+
+        eventos = self.suscripcion.pendientes()
+        self.assertEqual([evento.tipo for evento in eventos], ['insertada'])
+        self.assertEqual(eventos[0].datos['total_medicamentos'], 2)
+
+    def test_receta_incompleta_no_se_guarda_ni_se_publica(self):
+        guardar = DetalleReceta.save
+        guardados = []
+
+        def fallar_en_el_segundo(detalle, *args, **kwargs):
+            guardados.append(detalle)
+            if len(guardados) == 2:
+                raise RuntimeError('Fallo al guardar el medicamento')
+            return guardar(detalle, *args, **kwargs)
+
+        self.client.raise_request_exception = False
+        with mock.patch.object(DetalleReceta, 'save', fallar_en_el_segundo):
+            with self.captureOnCommitCallbacks(execute=True):
+                respuesta = self.crear_receta()
+        self.assertEqual(respuesta.status_code, 500)
+        self.assertFalse(Receta.objects.exists())
+        self.assertEqual(self.suscripcion.pendientes(), [])
+
+    def test_error_al_publicar_no_afecta_la_escritura(self):
+        receta = Receta.objects.create(
+            paciente=self.paciente, tipo_receta='FARMACIA',
+            servicio_solicitante='URGENCIAS', diagnostico='Prueba',
+        )
+        receta.observaciones = 'Cambio'
+        with mock.patch('apps.prescriptions.signals._publicar_receta', side_effect=RuntimeError):
+            with self.captureOnCommitCallbacks(execute=True):
+                receta.save()
+        self.assertEqual(Receta.objects.get(pk=receta.pk).observaciones, 'Cambio')
+
+
+class ConsultasDetalleRecetaTests(TestCase):
+    """El detalle de una receta usa un número fijo de consultas sin importar sus medicamentos"""
+
+    # Receta con paciente y usuarios, medicamentos con catálogo y lotes con su usuario
+    CONSULTAS_DETALLE = 3
+    # Las mismas lecturas, el UPDATE de la receta dentro de su savepoint, la
+    # actividad del paciente y el registro de auditoría de la petición
+    CONSULTAS_CAMBIO_ESTADO = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_consultas', password='x', role='ADMIN')
+        cls.paciente = crear_paciente()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def crear_receta(self, medicamentos):
+        receta = Receta.objects.create(
+            paciente=self.paciente, tipo_receta='FARMACIA', estado='VALIDADA',
+            servicio_solicitante='URGENCIAS', diagnostico='Prueba',
+            prescrito_por=self.usuario,
+        )
+        for numero in range(medicamentos):
+            catalogo = CatalogoMedicamentos.objects.create(
+                clave=f'R{receta.pk}-{numero}', nombre='Medicamento', principio_activo='Prueba',
+                concentracion='1 mg', forma_farmaceutica='TABLETA', categoria='ANALGESICO',
+            )
+            detalle = DetalleReceta.objects.create(
+                receta=receta, medicamento_catalogo=catalogo, clave_medicamento=catalogo.clave,
+                descripcion_medicamento='Medicamento', cantidad_prescrita=10, dosis='1 tableta',
+            )
+            for lote in range(2):
+                LoteDetalleReceta.objects.create(
+                    detalle_receta=detalle, lote=f'L{lote}', fecha_caducidad=date(2030, 1, 1),
+                    cantidad_dispensada=1, dispensado_por=self.usuario,
+                )
+        return receta
+
+    def test_detalle_con_uno_y_diez_medicamentos(self):
+        for medicamentos in (1, 10):
+            receta = self.crear_receta(medicamentos)
+            with self.assertNumQueries(self.CONSULTAS_DETALLE):
+                respuesta = self.client.get(f'/api/recetas/{receta.pk}/')
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(len(respuesta.json()['detalles']), medicamentos)
+            self.assertEqual(len(respuesta.json()['detalles'][0]['lotes']), 2)
+
+    def test_actualizar_estado_con_uno_y_diez_medicamentos(self):
+        for medicamentos in (1, 10):
+            # Los lotes dejan la receta parcialmente surtida; cancelarla la responde con todo
+            receta = self.crear_receta(medicamentos)
+            with self.assertNumQueries(self.CONSULTAS_CAMBIO_ESTADO):
+                respuesta = self.client.post(
+                    f'/api/recetas/{receta.pk}/actualizar-estado/', {'estado': 'CANCELADA'}, format='json'
+                )
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            self.assertEqual(respuesta.json()['estado'], 'CANCELADA')
+            self.assertEqual(len(respuesta.json()['detalles']), medicamentos)
+
+
+class PaginacionCursorRecetasTests(TestCase):
+    """Listado de recetas en modo cursor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_paginacion', password='x', role='ADMIN')
+        paciente = crear_paciente()
+        for prioridad in ('BAJA', 'ALTA', 'MEDIA', 'URGENTE', 'MEDIA', 'ALTA', 'BAJA'):
+            Receta.objects.create(
+                paciente=paciente, tipo_receta='FARMACIA', prioridad=prioridad,
+                servicio_solicitante='URGENCIAS', diagnostico='Prueba',
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def recorrer(self, url):
+        folios = []
+        while url:
+            respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            folios += [receta['folio_receta'] for receta in respuesta.json()['results']]
+            url = respuesta.json()['next']
+        return folios
+
+    def test_cursor_con_valores_de_otro_tipo(self):
+        cursor = base64.urlsafe_b64encode(
+            json.dumps({'p': ['no-es-fecha', 1]}).encode('utf-8')
+        ).decode('ascii')
+        respuesta = self.client.get('/api/recetas/', {'cursor': cursor})
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_cursor_respeta_ordering(self):
+        folios = self.recorrer('/api/recetas/?paginacion=cursor&page_size=2&ordering=prioridad')
+        esperado = list(Receta.objects.order_by('prioridad', '-folio_receta').values_list(
+            'folio_receta', flat=True
+        ))
+        self.assertEqual(folios, esperado)
+
+        folios = self.recorrer('/api/recetas/?paginacion=cursor&page_size=3&ordering=folio_receta')
+        self.assertEqual(folios, sorted(esperado))
+
+
+class ColaDispensacionTests(TestCase):
+    """La cola completa se recorre siguiendo los enlaces next"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_cola', password='x', role='ADMIN')
+        paciente = crear_paciente()
+        validacion = timezone.now()
+        prioridades = ('BAJA', 'URGENTE', 'MEDIA', 'ALTA', 'URGENTE', 'BAJA', 'MEDIA', 'ALTA', 'URGENTE')
+        for numero, prioridad in enumerate(prioridades):
+            receta = Receta.objects.create(
+                paciente=paciente, tipo_receta='FARMACIA', prioridad=prioridad, estado='VALIDADA',
+                servicio_solicitante='URGENCIAS', diagnostico='Prueba',
+            )
+            # Fechas repetidas para que el folio tenga que desempatar
+            Receta.objects.filter(pk=receta.pk).update(
+                fecha_validacion=validacion + timedelta(minutes=numero // 3)
+            )
+        # Fuera de la cola de farmacia
+        Receta.objects.create(
+            paciente=paciente, tipo_receta='FARMACIA', prioridad='URGENTE', estado='PENDIENTE',
+            servicio_solicitante='URGENCIAS', diagnostico='Prueba',
+        )
+        Receta.objects.create(
+            paciente=paciente, tipo_receta='CMI', prioridad='URGENTE', estado='VALIDADA',
+            servicio_solicitante='URGENCIAS', diagnostico='Prueba',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def test_enlaces_next_recorren_toda_la_cola_en_orden(self):
+        folios = []
+        url = '/api/recetas/cola-dispensacion-farmacia/?page_size=2'
+        while url:
+            respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            self.assertEqual(respuesta.json()['total'], 9)
+            folios += [receta['folio_receta'] for receta in respuesta.json()['recetas']]
+            url = respuesta.json()['next']
+
+        esperado = list(Receta.objects.filter(
+            tipo_receta='FARMACIA', estado='VALIDADA'
+        ).order_by('prioridad_rank', 'fecha_validacion', 'folio_receta').values_list(
+            'folio_receta', flat=True
+        ))
+        self.assertEqual(len(esperado), 9)
+        self.assertEqual(folios, esperado)
+
+
+@mock.patch('apps.prescriptions.eventos_cola.LATIDO_SEGUNDOS', 0.05)
+@mock.patch('apps.prescriptions.eventos_cola.DURACION_MAXIMA', 0.3)
+class FlujoEventosColaTests(TestCase):
+    """Flujo de eventos de las colas: autenticación, permisos y reanudación"""
+
+    URL = '/api/recetas/colas/farmacia/eventos/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farmacia = User.objects.create_user('farmacia_eventos', password='x', role='FARMACIA')
+        cls.medico = User.objects.create_user('medico_eventos', password='x', role='MEDICO')
+        cls.token = str(TokenFlujoEventos.para_cola(cls.farmacia, COLA_FARMACIA))
+        cls.acceso = str(AccessToken.for_user(cls.farmacia))
+
+    async def leer(self, datos=None, headers=None):
+        """Eventos del flujo como (tipo, id, datos), leídos hasta que termina la conexión"""
+        respuesta = await AsyncClient().get(self.URL, datos, headers=headers)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        contenido = b''.join([parte async for parte in respuesta.streaming_content]).decode()
+
+        eventos = []
+        for bloque in contenido.split('\n\n'):
+            campos = dict(
+                linea.split(': ', 1) for linea in bloque.splitlines() if not linea.startswith(':')
+            )
+            if 'event' in campos:
+                eventos.append((campos['event'], campos.get('id'), json.loads(campos['data'])))
+        return eventos
+
+    def test_token_de_flujo(self):
+        client = APIClient()
+        client.force_authenticate(self.farmacia)
+        respuesta = client.post('/api/recetas/colas/farmacia/eventos/token/')
+        self.assertEqual(respuesta.status_code, 200)
+        token = TokenFlujoEventos(respuesta.json()['token'])
+        self.assertEqual((token['cola'], token['user_id']), (COLA_FARMACIA, self.farmacia.id))
+
+        self.assertEqual(client.post('/api/recetas/colas/cmi/eventos/token/').status_code, 403)
+        self.assertEqual(client.post('/api/recetas/colas/otra/eventos/token/').status_code, 404)
+
+    async def test_sin_token_valido(self):
+        otra_cola = str(TokenFlujoEventos.para_cola(self.farmacia, COLA_VALIDACION))
+        vencido = TokenFlujoEventos.para_cola(self.farmacia, COLA_FARMACIA)
+        vencido.set_exp(lifetime=-timedelta(seconds=1))
+
+        # El JWT de acceso no se acepta en la URL
+        for token in (None, self.acceso, otra_cola, str(vencido), 'no-es-token'):
+            respuesta = await AsyncClient().get(self.URL, {'token': token} if token else {})
+            self.assertEqual(respuesta.status_code, 401, token)
+            self.assertEqual(json.loads(respuesta.content), {'error': 'Autenticación requerida'})
+
+    async def test_sin_permiso_para_la_cola(self):
+        token = await sync_to_async(TokenFlujoEventos.para_cola)(self.medico, COLA_FARMACIA)
+        respuesta = await AsyncClient().get(self.URL, {'token': str(token)})
+        self.assertEqual(respuesta.status_code, 403)
+
+    async def test_cola_no_valida(self):
+        respuesta = await AsyncClient().get('/api/recetas/colas/otra/eventos/', {'token': self.token})
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_requiere_asgi(self):
+        respuesta = Client().get(self.URL, {'token': self.token})
+        self.assertEqual(respuesta.status_code, 501)
+
+    async def test_eventos_publicados_durante_la_conexion(self):
+        asyncio.get_running_loop().call_later(
+            0.1, difusor.publicar, COLA_FARMACIA, 'insertada', {'folio_receta': 1}
+        )
+        eventos = await self.leer(headers={'Authorization': f'Bearer {self.acceso}'})
+
+        self.assertEqual([tipo for tipo, _id, _datos in eventos], ['conectado', 'insertada'])
+        self.assertEqual(eventos[0][2], {'cola': COLA_FARMACIA, 'reanudado': False})
+        self.assertEqual(eventos[1][2], {'folio_receta': 1})
+        self.assertEqual(difusor.total_suscripciones(COLA_FARMACIA), 0)
+
+    async def test_reanuda_desde_last_event_id(self):
+        perdido = difusor.publicar(COLA_FARMACIA, 'insertada', {'folio_receta': 1})
+        siguientes = [
+            difusor.publicar(COLA_FARMACIA, 'actualizada', {'folio_receta': folio}) for folio in (2, 3)
+        ]
+        eventos = await self.leer({'token': self.token}, {'Last-Event-ID': perdido.id})
+
+        self.assertEqual(eventos[0], ('conectado', None, {'cola': COLA_FARMACIA, 'reanudado': True}))
+        self.assertEqual(
+            [(tipo, id) for tipo, id, _datos in eventos[1:]],
+            [('actualizada', evento.id) for evento in siguientes],
+        )
+
+    async def test_reinicio_si_no_puede_reanudar(self):
+        eventos = await self.leer({'token': self.token}, {'Last-Event-ID': 'otra-1'})
+
+        self.assertEqual([tipo for tipo, _id, _datos in eventos], ['conectado', 'reinicio'])
+        self.assertFalse(eventos[0][2]['reanudado'])
+        self.assertEqual(eventos[1][2], {'cola': COLA_FARMACIA})
+
+
+class ContadorLotesDispensadosTests(TestCase):
+    """El contador de lotes de cada medicamento sigue a sus lotes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('farmacia_lotes', password='x', role='FARMACIA')
+        receta = Receta.objects.create(
+            paciente=crear_paciente(), tipo_receta='FARMACIA', estado='VALIDADA',
+            servicio_solicitante='URGENCIAS', diagnostico='Prueba',
+        )
+        cls.detalle, cls.otro = [
+            DetalleReceta.objects.create(
+                receta=receta, clave_medicamento=clave, descripcion_medicamento='Medicamento',
+                cantidad_prescrita=10, dosis='1 tableta',
+            )
+            for clave in ('CLAVE1', 'CLAVE2')
+        ]
+
+    def crear_lote(self, detalle, cantidad, lote='L1'):
+        return LoteDetalleReceta.objects.create(
+            detalle_receta=detalle, lote=lote, fecha_caducidad=date(2030, 1, 1),
+            cantidad_dispensada=cantidad, dispensado_por=self.usuario,
+        )
+
+    def contadores(self):
+        return list(DetalleReceta.objects.filter(
+            pk__in=[self.detalle.pk, self.otro.pk]
+        ).order_by('pk').values_list('cantidad_dispensada_lotes', flat=True))
+
+    def test_ajustar_respeta_la_cantidad_prescrita(self):
+        self.assertTrue(DetalleReceta.ajustar_lotes_dispensados(self.detalle.pk, 10))
+        self.assertFalse(DetalleReceta.ajustar_lotes_dispensados(self.detalle.pk, 1))
+        self.assertTrue(DetalleReceta.ajustar_lotes_dispensados(self.detalle.pk, 0))
+        self.assertTrue(DetalleReceta.ajustar_lotes_dispensados(self.detalle.pk, -4))
+        self.assertEqual(self.contadores(), [6, 0])
+
+    def test_alta_edicion_y_borrado_de_lotes(self):
+        lote = self.crear_lote(self.detalle, 4)
+        self.crear_lote(self.detalle, 3, lote='L2')
+        self.assertEqual(self.contadores(), [7, 0])
+
+        lote.cantidad_dispensada = 6
+        lote.save()
+        self.assertEqual(self.contadores(), [9, 0])
+
+        # Una instancia leída de la base de datos recuerda su aporte
+        lote = LoteDetalleReceta.objects.get(pk=lote.pk)
+        lote.cantidad_dispensada = 2
+        lote.save()
+        self.assertEqual(self.contadores(), [5, 0])
+
+        lote.delete()
+        self.assertEqual(self.contadores(), [3, 0])
+        LoteDetalleReceta.objects.filter(detalle_receta=self.detalle).delete()
+        self.assertEqual(self.contadores(), [0, 0])
+
+    def test_mover_lote_a_otro_medicamento(self):
+        lote = LoteDetalleReceta.objects.get(pk=self.crear_lote(self.detalle, 4).pk)
+        lote.detalle_receta = self.otro
+        lote.cantidad_dispensada = 5
+        lote.save()
+        self.assertEqual(self.contadores(), [0, 5])
+
+        lote.delete()
+        self.assertEqual(self.contadores(), [0, 0])
+
+    def test_exceder_la_prescripcion_no_cambia_nada(self):
+        lote = self.crear_lote(self.detalle, 8)
+        self.crear_lote(self.otro, 7)
+
+        with self.assertRaises(ValidationError):
+            self.crear_lote(self.detalle, 3, lote='L2')
+        self.assertEqual(LoteDetalleReceta.objects.count(), 2)
+        self.assertEqual(self.contadores(), [8, 7])
+
+        lote.cantidad_dispensada = 11
+        with self.assertRaises(ValidationError):
+            lote.save()
+        self.assertEqual(self.contadores(), [8, 7])
+
+        # Moverlo a un medicamento sin espacio no le quita su aporte al original
+        lote = LoteDetalleReceta.objects.get(pk=lote.pk)
+        lote.detalle_receta = self.otro
+        with self.assertRaises(ValidationError):
+            lote.save()
+        self.assertEqual(self.contadores(), [8, 7])
+        self.assertEqual(LoteDetalleReceta.objects.get(pk=lote.pk).detalle_receta_id, self.detalle.pk)
+
+    def test_reconciliar_corrige_un_contador_alterado(self):
+        self.crear_lote(self.detalle, 4)
+        self.crear_lote(self.detalle, 2, lote='L2')
+        DetalleReceta.objects.filter(pk=self.detalle.pk).update(cantidad_dispensada_lotes=9)
+        DetalleReceta.objects.filter(pk=self.otro.pk).update(cantidad_dispensada_lotes=3)
+
+        salida = io.StringIO()
+        call_command('reconciliar_lotes_dispensados', stdout=salida)
+        self.assertIn('2 contadores no coinciden', salida.getvalue())
+        self.assertEqual(self.contadores(), [9, 3])
+
+        salida = io.StringIO()
+        call_command('reconciliar_lotes_dispensados', '--corregir', stdout=salida)
+        self.assertIn('2 contadores corregidos', salida.getvalue())
+        self.assertEqual(self.contadores(), [6, 0])
+
+        salida = io.StringIO()
+        call_command('reconciliar_lotes_dispensados', stdout=salida)
+        self.assertIn('Todos los contadores coinciden', salida.getvalue())
+
+
+class DispensacionRecetaTests(TestCase):
+    """Dispensación de varios lotes de una receta en una sola transacción"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('farmacia_dispensa', password='x', role='FARMACIA')
+        paciente = crear_paciente()
+        cls.receta, cls.otra_receta = [
+            Receta.objects.create(
+                paciente=paciente, tipo_receta='FARMACIA', estado='VALIDADA',
+                servicio_solicitante='URGENCIAS', diagnostico='Prueba',
+            )
+            for _ in range(2)
+        ]
+        cls.detalles = []
+        cls.stocks = []
+        for clave, prescrita, existencia in (('M1', 10, 20), ('M2', 4, 5)):
+            catalogo = CatalogoMedicamentos.objects.create(
+                clave=clave, nombre=f'Medicamento {clave}', principio_activo='Prueba',
+                concentracion='1 mg', forma_farmaceutica='TABLETA', categoria='ANALGESICO',
+            )
+            cls.stocks.append(MedicamentoStock.objects.create(
+                medicamento_catalogo=catalogo, current_stock=existencia
+            ))
+            cls.detalles.append(DetalleReceta.objects.create(
+                receta=cls.receta, medicamento_catalogo=catalogo, clave_medicamento=clave,
+                descripcion_medicamento='Medicamento', cantidad_prescrita=prescrita, dosis='1 tableta',
+            ))
+        cls.detalle_ajeno = DetalleReceta.objects.create(
+            receta=cls.otra_receta, clave_medicamento='M3', descripcion_medicamento='Medicamento',
+            cantidad_prescrita=10, dosis='1 tableta',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def lote(self, detalle, cantidad, lote='L1'):
+        return {
+            'detalle_id': detalle.id, 'lote': lote,
+            'fecha_caducidad': date(2030, 1, 1), 'cantidad_dispensada': cantidad,
+        }
+
+    def dispensar(self, *lotes):
+        return self.client.post(
+            f'/api/recetas/{self.receta.folio_receta}/dispensar/', {'lotes': list(lotes)}, format='json'
+        )
+
+    def estado_actual(self):
+        """Todo lo que una dispensación modifica"""
+        return {
+            'stock': list(MedicamentoStock.objects.order_by('pk').values_list('current_stock', flat=True)),
+            'detalles': list(DetalleReceta.objects.filter(receta=self.receta).order_by('pk').values_list(
+                'cantidad_dispensada_lotes', 'cantidad_surtida'
+            )),
+            'lotes': LoteDetalleReceta.objects.count(),
+            'movimientos': MedicamentoStockMovement.objects.count(),
+            'estado': Receta.objects.get(pk=self.receta.pk).estado,
+        }
+
+    def test_dispensacion_de_varios_medicamentos(self):
+        primero, segundo = self.detalles
+        respuesta = self.dispensar(
+            self.lote(primero, 4), self.lote(primero, 2, lote='L2'), self.lote(segundo, 4)
+        )
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        self.assertEqual(respuesta.json()['lotes_registrados'], 3)
+        self.assertEqual(respuesta.json()['receta']['estado'], 'PARCIALMENTE_SURTIDA')
+        self.assertEqual(self.estado_actual(), {
+            'stock': [14, 1],
+            'detalles': [(6, 6), (4, 4)],
+            'lotes': 3,
+            'movimientos': 2,
+            'estado': 'PARCIALMENTE_SURTIDA',
+        })
+        movimientos = MedicamentoStockMovement.objects.order_by('stock_id')
+        self.assertEqual(
+            [(m.quantity, m.stock_after, m.related_prescription_detail_id) for m in movimientos],
+            [(-6, 14, primero.id), (-4, 1, segundo.id)],
+        )
+
+        respuesta = self.dispensar(self.lote(primero, 4, lote='L3'))
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        estado = self.estado_actual()
+        self.assertEqual(estado['stock'], [10, 1])
+        self.assertEqual(estado['detalles'], [(10, 10), (4, 4)])
+        self.assertEqual(estado['estado'], 'SURTIDA')
+
+    def test_errores_no_dejan_cambios(self):
+        primero, segundo = self.detalles
+        self.dispensar(self.lote(primero, 2))
+        antes = self.estado_actual()
+
+        casos = [
+            # Más de lo prescrito, contando lo ya dispensado
+            ((self.lote(segundo, 1), self.lote(primero, 9)), 400, 'excede la cantidad prescrita'),
+            # Un medicamento de otra receta
+            ((self.lote(primero, 1), self.lote(self.detalle_ajeno, 1)), 404, 'no pertenece a la receta'),
+        ]
+        for lotes, codigo, mensaje in casos:
+            respuesta = self.dispensar(*lotes)
+            self.assertEqual(respuesta.status_code, codigo, respuesta.content)
+            self.assertIn(mensaje, respuesta.json()['error'])
+            self.assertEqual(self.estado_actual(), antes)
+
+        # Sin stock para el segundo medicamento no se descuenta el primero
+        MedicamentoStock.objects.filter(pk=self.stocks[1].pk).update(current_stock=3)
+        antes = self.estado_actual()
+        respuesta = self.dispensar(self.lote(primero, 1), self.lote(segundo, 4))
+        self.assertEqual(respuesta.status_code, 400, respuesta.content)
+        self.assertEqual(
+            respuesta.json()['error'], 'Stock insuficiente de M2. Disponible: 3, solicitado: 4'
+        )
+        self.assertEqual(self.estado_actual(), antes)
+
+    def test_conflicto_con_un_lote_individual(self):
+        primero, segundo = self.detalles
+
+        def lote_individual_y_salidas(*args, **kwargs):
+            # Un lote registrado por otra ventanilla después de leer los detalles; en la
+            # prueba comparte la transacción y también se deshace
+            LoteDetalleReceta.objects.create(
+                detalle_receta=primero, lote='OTRO', fecha_caducidad=date(2030, 1, 1),
+                cantidad_dispensada=8, dispensado_por=self.usuario,
+            )
+            return registrar_salidas(*args, **kwargs)
+
+        antes = self.estado_actual()
+        lotes = [self.lote(primero, 5), self.lote(segundo, 1)]
+        with mock.patch(
+            'apps.prescriptions.dispensacion.registrar_salidas', side_effect=lote_individual_y_salidas
+        ):
+            with self.assertRaises(ErrorDispensacion) as error:
+                dispensar_receta(self.receta.folio_receta, lotes, self.usuario)
+        self.assertEqual(error.exception.codigo, 409)
+        self.assertEqual(self.estado_actual(), antes)
+
+        with mock.patch(
+            'apps.prescriptions.dispensacion.registrar_salidas', side_effect=lote_individual_y_salidas
+        ):
+            respuesta = self.dispensar(*lotes)
+        self.assertEqual(respuesta.status_code, 409, respuesta.content)
+        self.assertEqual(self.estado_actual(), antes)
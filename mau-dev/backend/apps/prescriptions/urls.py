@@ -13,6 +13,8 @@ urlpatterns = [
     path('cola-validacion/', views.cola_validacion, name='cola_validacion'),
     path('cola-dispensacion-farmacia/', views.cola_dispensacion_farmacia, name='cola_dispensacion_farmacia'),
     path('cola-dispensacion-cmi/', views.cola_dispensacion_cmi, name='cola_dispensacion_cmi'),
+    path('colas/<str:cola>/eventos/', views.eventos_cola, name='eventos_cola'),
+    path('colas/<str:cola>/eventos/token/', views.token_eventos_cola, name='token_eventos_cola'),
     
     # Detalles de medicamentos
     path('detalles/<int:detalle_id>/', views.detalle_medicamento, name='detalle_medicamento'),
@@ -20,6 +22,7 @@ urlpatterns = [
     # Gestión de lotes
     path('<int:receta_id>/detalles/<int:detalle_id>/lotes/', views.agregar_lote_medicamento, name='agregar_lote'),
     path('<int:receta_id>/detalles/<int:detalle_id>/lotes/list/', views.obtener_lotes_medicamento, name='obtener_lotes'),
+    path('<int:receta_id>/dispensar/', views.dispensar_receta_completa, name='dispensar_receta'),
     
     # Verificación de stock
     path('stock/<str:codigo_medicamento>/', views.verificar_stock_medicamento, name='verificar_stock'),
@@ -1,23 +1,46 @@
 from rest_framework import generics, status, filters
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from asgiref.sync import sync_to_async
+import asyncio
 
+from mau_hospital.pagination import RecetaPagination
+from .cola_dispensacion import (
+    ORDENES_COLA, ColaDispensacionPagination, pagina_cola, puede_ver_cola, recetas_en_cola
+)
+from .dispensacion import ErrorDispensacion, dispensar_receta
+from .eventos_cola import (
+    COLA_VALIDACION, COLAS, COLAS_DISPENSACION, VIGENCIA_TOKEN_FLUJO, TokenFlujoEventos,
+    difusor, flujo_eventos
+)
 from .models import Receta, DetalleReceta, LoteDetalleReceta, CatalogoMedicamentos
 from .serializers import (
-    RecetaSerializer, RecetaListSerializer, RecetaCreateSerializer,
+    RecetaSerializer, RecetaListSerializer, RecetaColaSerializer, RecetaCreateSerializer,
     RecetaEstadoSerializer, DetalleRecetaSerializer, DetalleRecetaDispensacionSerializer,
-    LoteDetalleRecetaSerializer, LoteDetalleRecetaCreateSerializer
+    LoteDetalleRecetaSerializer, LoteDetalleRecetaCreateSerializer, DispensacionRecetaSerializer
 )
 from apps.inventory.models import MedicamentoStock
+from apps.inventory.movimientos_stock import StockInsuficiente, registrar_salida
 
 class RecetaListCreateView(generics.ListCreateAPIView):
-    """Vista para listar y crear recetas"""
+    """
+    Vista para listar y crear recetas.
+
+    En modo cursor (`?paginacion=cursor`) se respeta `?ordering=`: el cursor
+    sigue ese orden, y los enlaces next/previous lo conservan.
+    """
     
     queryset = Receta.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = RecetaPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['estado', 'tipo_receta', 'prioridad', 'servicio_solicitante']
     search_fields = ['folio_receta', 'paciente__expediente', 'paciente__nombre', 'diagnostico']
@@ -56,6 +79,9 @@ class RecetaListCreateView(generics.ListCreateAPIView):
             if not estado_param:
                 queryset = queryset.filter(estado='PENDIENTE')
         
+        if self.request.method == 'GET':
+            queryset = RecetaListSerializer.setup_eager_loading(queryset)
+        
         return queryset
     
     def perform_create(self, serializer):
@@ -73,6 +99,9 @@ class RecetaDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = RecetaSerializer
     
+    def get_queryset(self):
+        return RecetaSerializer.setup_eager_loading(super().get_queryset())
+    
     def perform_destroy(self, instance):
         """Solo admins pueden eliminar recetas"""
         # Obtener el usuario real para acceder al role
@@ -97,7 +126,8 @@ class RecetaDetailView(generics.RetrieveUpdateDestroyAPIView):
 def actualizar_estado_receta(request, folio_receta):
     """Endpoint para actualizar el estado de una receta"""
     try:
-        receta = Receta.objects.get(folio_receta=folio_receta)
+        # El cambio de estado no toca medicamentos ni lotes: la precarga sirve para la respuesta
+        receta = RecetaSerializer.setup_eager_loading(Receta.objects.all()).get(folio_receta=folio_receta)
     except Receta.DoesNotExist:
         return Response({
             'error': 'Receta no encontrada'
@@ -127,7 +157,7 @@ def cola_validacion(request):
             'error': 'No tiene permisos para validar recetas'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    recetas = Receta.objects.filter(estado='PENDIENTE').order_by('-fecha_creacion')
+    recetas = Receta.objects.filter(estado='PENDIENTE').order_by('-fecha_creacion', '-folio_receta')
     
     # Filtros opcionales
     servicio = request.GET.get('servicio')
@@ -145,121 +175,147 @@ def cola_validacion(request):
         'total': recetas.count()
     })
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def cola_dispensacion_farmacia(request):
-    """Endpoint para obtener recetas de farmacia listas para dispensar"""
-    if not request.user.can_dispense_pharmacy():
+def responder_cola_dispensacion(request, tipo_receta):
+    """
+    Página de la cola de dispensación de `tipo_receta`.
+
+    Parámetros: search, prioridad, sort_by (prioridad, fecha_validacion o
+    fecha_vencimiento), page_size y cursor (enlaces next/previous).
+    """
+    error = puede_ver_cola(request.user, tipo_receta)
+    if error:
         return Response({
-            'error': 'No tiene permisos para dispensar medicamentos de farmacia'
+            'error': error
         }, status=status.HTTP_403_FORBIDDEN)
     
-    # Filtro base
-    recetas = Receta.objects.filter(
-        tipo_receta='FARMACIA',
-        estado__in=['VALIDADA', 'PARCIALMENTE_SURTIDA']
+    recetas = recetas_en_cola(
+        tipo_receta,
+        search=request.query_params.get('search'),
+        prioridad=request.query_params.get('prioridad')
     )
     
-    # Filtros opcionales
-    search = request.query_params.get('search')
-    if search:
-        from django.db.models import Q
-        recetas = recetas.filter(
-            Q(folio_receta__icontains=search) |
-            Q(paciente__expediente__icontains=search) |
-            Q(paciente__nombre__icontains=search) |
-            Q(paciente__apellido_paterno__icontains=search) |
-            Q(paciente__apellido_materno__icontains=search) |
-            Q(servicio_solicitante__icontains=search)
-        )
-    
-    prioridad = request.query_params.get('prioridad')
-    if prioridad:
-        recetas = recetas.filter(prioridad=prioridad)
-    
-    # Ordenamiento
-    sort_by = request.query_params.get('sort_by', 'prioridad')
-    if sort_by == 'fecha_validacion':
-        recetas = recetas.order_by('fecha_validacion')
-    elif sort_by == 'fecha_vencimiento':
-        recetas = recetas.order_by('fecha_vencimiento', 'prioridad')
-    else:  # prioridad por defecto
-        # Orden personalizado por prioridad
-        from django.db.models import Case, When, IntegerField
-        prioridad_order = Case(
-            When(prioridad='URGENTE', then=0),
-            When(prioridad='ALTA', then=1),
-            When(prioridad='MEDIA', then=2),
-            When(prioridad='BAJA', then=3),
-            default=4,
-            output_field=IntegerField(),
-        )
-        recetas = recetas.annotate(prioridad_order=prioridad_order).order_by('prioridad_order', 'fecha_validacion')
-    
-    serializer = RecetaListSerializer(recetas, many=True)
+    paginador = ColaDispensacionPagination()
+    paginador.ordering = ORDENES_COLA.get(
+        request.query_params.get('sort_by'), ORDENES_COLA['prioridad']
+    )
+    total = recetas.count()
+    pagina = pagina_cola(recetas, paginador, request)
+    serializer = RecetaColaSerializer(pagina, many=True, context={'request': request})
     
     return Response({
         'recetas': serializer.data,
-        'total': recetas.count()
+        'total': total,
+        'next': paginador.get_next_link(),
+        'previous': paginador.get_previous_link()
     })
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cola_dispensacion_farmacia(request):
+    """Endpoint para obtener recetas de farmacia listas para dispensar"""
+    return responder_cola_dispensacion(request, 'FARMACIA')
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def cola_dispensacion_cmi(request):
     """Endpoint para obtener recetas de CMI listas para dispensar"""
-    if not request.user.can_dispense_cmi():
+    return responder_cola_dispensacion(request, 'CMI')
+
+def _usuario_del_flujo(request, cola):
+    """
+    Usuario del token de flujo en `?token=` (ver `token_eventos_cola`), o del
+    JWT de acceso en el encabezado Authorization para clientes que sí pueden
+    enviarlo. El JWT de acceso no se acepta en la URL.
+    """
+    autenticacion = JWTAuthentication()
+    token = request.GET.get('token')
+    try:
+        if token:
+            token = TokenFlujoEventos(token)
+            if token.get('cola') != cola:
+                return None
+            return autenticacion.get_user(token)
+        resultado = autenticacion.authenticate(request)
+    except (TokenError, InvalidToken, AuthenticationFailed):
+        return None
+    return resultado[0] if resultado else None
+
+
+def _error_permiso_flujo(usuario, cola):
+    """Mensaje de error si el usuario no puede ver la cola, o None"""
+    if cola == COLA_VALIDACION:
+        if not usuario.can_validate_prescriptions():
+            return 'No tiene permisos para validar recetas'
+        return None
+    tipo_receta = next(tipo for tipo, nombre in COLAS_DISPENSACION.items() if nombre == cola)
+    return puede_ver_cola(usuario, tipo_receta)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def token_eventos_cola(request, cola):
+    """Token de corta duración para abrir el flujo de eventos de `cola` con EventSource"""
+    if cola not in COLAS:
         return Response({
-            'error': 'No tiene permisos para dispensar mezclas del CMI'
+            'error': f'Cola no válida: {cola}'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    error = _error_permiso_flujo(request.user, cola)
+    if error:
+        return Response({
+            'error': error
         }, status=status.HTTP_403_FORBIDDEN)
     
-    # Filtro base
-    recetas = Receta.objects.filter(
-        tipo_receta='CMI',
-        estado__in=['VALIDADA', 'PARCIALMENTE_SURTIDA']
-    )
+    return Response({
+        'token': str(TokenFlujoEventos.para_cola(request.user, cola)),
+        'expira_en': VIGENCIA_TOKEN_FLUJO
+    })
+
+
+async def eventos_cola(request, cola):
+    """
+    Flujo de eventos (Server-Sent Events) de la cola `cola`: validacion,
+    farmacia o cmi. Ver `eventos_cola.py` para el formato de los eventos.
+    Requiere servir la aplicación con ASGI.
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            'error': 'Método no permitido'
+        }, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    if cola not in COLAS:
+        return JsonResponse({
+            'error': f'Cola no válida: {cola}'
+        }, status=status.HTTP_404_NOT_FOUND)
     
-    # Filtros opcionales
-    search = request.query_params.get('search')
-    if search:
-        from django.db.models import Q
-        recetas = recetas.filter(
-            Q(folio_receta__icontains=search) |
-            Q(paciente__expediente__icontains=search) |
-            Q(paciente__nombre__icontains=search) |
-            Q(paciente__apellido_paterno__icontains=search) |
-            Q(paciente__apellido_materno__icontains=search) |
-            Q(servicio_solicitante__icontains=search)
-        )
+    usuario = await sync_to_async(_usuario_del_flujo)(request, cola)
+    if usuario is None or not usuario.is_active:
+        return JsonResponse({
+            'error': 'Autenticación requerida'
+        }, status=status.HTTP_401_UNAUTHORIZED)
     
-    prioridad = request.query_params.get('prioridad')
-    if prioridad:
-        recetas = recetas.filter(prioridad=prioridad)
+    error = _error_permiso_flujo(usuario, cola)
+    if error:
+        return JsonResponse({
+            'error': error
+        }, status=status.HTTP_403_FORBIDDEN)
     
-    # Ordenamiento
-    sort_by = request.query_params.get('sort_by', 'prioridad')
-    if sort_by == 'fecha_validacion':
-        recetas = recetas.order_by('fecha_validacion')
-    elif sort_by == 'fecha_vencimiento':
-        recetas = recetas.order_by('fecha_vencimiento', 'prioridad')
-    else:  # prioridad por defecto
-        # Orden personalizado por prioridad
-        from django.db.models import Case, When, IntegerField
-        prioridad_order = Case(
-            When(prioridad='URGENTE', then=0),
-            When(prioridad='ALTA', then=1),
-            When(prioridad='MEDIA', then=2),
-            When(prioridad='BAJA', then=3),
-            default=4,
-            output_field=IntegerField(),
-        )
-        recetas = recetas.annotate(prioridad_order=prioridad_order).order_by('prioridad_order', 'fecha_validacion')
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'error': 'El flujo de eventos requiere servir la aplicación con ASGI'
+        }, status=status.HTTP_501_NOT_IMPLEMENTED)
     
-    serializer = RecetaListSerializer(recetas, many=True)
+    ultimo_id = request.headers.get('Last-Event-ID') or request.GET.get('ultimo_id')
+    suscripcion = difusor.suscribir(cola, ultimo_id=ultimo_id, loop=asyncio.get_running_loop())
     
-    return Response({
-        'recetas': serializer.data,
-        'total': recetas.count()
-    })
+    respuesta = StreamingHttpResponse(
+        flujo_eventos(suscripcion, reanudado=bool(ultimo_id)),
+        content_type='text/event-stream'
+    )
+    respuesta['Cache-Control'] = 'no-cache'
+    # Evita que un proxy como nginx retenga los eventos
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
 
 @api_view(['GET', 'PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
@@ -321,17 +377,15 @@ def detalle_medicamento(request, detalle_id):
                 ).first()
                 
                 if stock:
-                    # Verificar que hay suficiente stock
-                    available_stock = max(0, stock.current_stock - stock.reserved_stock)
-                    if cantidad_dispensada <= available_stock:
-                        # Descontar del inventario
-                        stock.current_stock = max(0, stock.current_stock - cantidad_dispensada)
-                        stock.last_movement_date = timezone.now()
-                        stock.save()
-                        
+                    # Descontar del inventario solo si alcanza el stock disponible
+                    try:
+                        registrar_salida(
+                            stock, cantidad_dispensada, usuario=user,
+                            receta=detalle.receta, detalle=detalle
+                        )
                         print(f"✅ Descontado del inventario: {cantidad_dispensada} unidades de {detalle.medicamento_catalogo.nombre}")
-                    else:
-                        print(f"⚠️  Stock insuficiente para {detalle.medicamento_catalogo.nombre}: disponible {available_stock}, solicitado {cantidad_dispensada}")
+                    except StockInsuficiente as e:
+                        print(f"⚠️  Stock insuficiente para {detalle.medicamento_catalogo.nombre}: disponible {e.disponible}, solicitado {cantidad_dispensada}")
                 else:
                     print(f"⚠️  No se encontró registro de stock para {detalle.medicamento_catalogo.nombre}")
                     
@@ -459,48 +513,44 @@ def agregar_lote_medicamento(request, receta_id, detalle_id):
         if serializer.is_valid():
             # Usar transacción para asegurar consistencia entre dispensación e inventario
             from django.db import transaction
-            from apps.inventory.models import MedicamentoStock
             
-            with transaction.atomic():
-                # Crear el lote
-                lote = serializer.save()
-                
-                # Actualizar inventario
-                try:
-                    medicamento_stock = MedicamentoStock.objects.get(
-                        medicamento_catalogo=detalle.medicamento
-                    )
+            try:
+                with transaction.atomic():
+                    # Crear el lote
+                    lote = serializer.save()
                     
-                    # Reducir stock
-                    medicamento_stock.current_stock -= lote.cantidad_dispensada
-                    medicamento_stock.last_movement_date = timezone.now()
-                    medicamento_stock.save()
+                    # Actualizar inventario y registrar el movimiento; si el stock
+                    # ya no alcanza se deshace también el lote
+                    medicamento_stock = MedicamentoStock.objects.filter(
+                        medicamento_catalogo=detalle.medicamento_catalogo
+                    ).first() if detalle.medicamento_catalogo_id else None
+                    if medicamento_stock:
+                        registrar_salida(
+                            medicamento_stock, lote.cantidad_dispensada, usuario=request.user,
+                            receta=receta, detalle=detalle,
+                            notas=f'Lote {lote.lote}'
+                        )
                     
-                    # Crear registro de movimiento (opcional - para auditoría)
-                    # Se podría agregar un modelo de MovimientoInventario específico para MedicamentoStock
+                    # Actualizar la cantidad surtida total del medicamento
+                    total_lotes = detalle.get_total_lotes_dispensados()
+                    detalle.cantidad_surtida = total_lotes
+                    detalle.save()
                     
-                except MedicamentoStock.DoesNotExist:
-                    # Si no existe stock, se podría crear uno con stock 0 o manejar el error
-                    pass
-                
-                # Actualizar la cantidad surtida total del medicamento
-                total_lotes = detalle.get_total_lotes_dispensados()
-                detalle.cantidad_surtida = total_lotes
-                detalle.save()
-                
-                # Actualizar estado de la receta si es necesario
-                if receta.is_completely_dispensed():
-                    receta.estado = 'SURTIDA'
-                    receta.fecha_dispensacion = timezone.now()
-                    receta.dispensado_por = request.user
-                    receta.save()
-                elif receta.is_partially_dispensed():
-                    if receta.estado != 'PARCIALMENTE_SURTIDA':
-                        receta.fecha_dispensacion_parcial = timezone.now()
-                    receta.estado = 'PARCIALMENTE_SURTIDA'
-                    if receta.dispensado_por is None:
+                    # Actualizar estado de la receta si es necesario
+                    if receta.is_completely_dispensed():
+                        receta.estado = 'SURTIDA'
+                        receta.fecha_dispensacion = timezone.now()
                         receta.dispensado_por = request.user
-                    receta.save()
+                        receta.save()
+                    elif receta.is_partially_dispensed():
+                        if receta.estado != 'PARCIALMENTE_SURTIDA':
+                            receta.fecha_dispensacion_parcial = timezone.now()
+                        receta.estado = 'PARCIALMENTE_SURTIDA'
+                        if receta.dispensado_por is None:
+                            receta.dispensado_por = request.user
+                        receta.save()
+            except StockInsuficiente as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
             return Response(LoteDetalleRecetaSerializer(lote).data, status=status.HTTP_201_CREATED)
         
@@ -512,6 +562,32 @@ def agregar_lote_medicamento(request, receta_id, detalle_id):
         return Response({'error': 'Medicamento no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def dispensar_receta_completa(request, receta_id):
+    """
+    Dispensar varios lotes de una receta en una sola transacción.
+    
+    Cuerpo: {"lotes": [{"detalle_id", "lote", "fecha_caducidad",
+    "cantidad_dispensada", "observaciones"}, ...]}. Si algún lote no se puede
+    dispensar no se registra ninguno.
+    """
+    serializer = DispensacionRecetaSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        lotes = dispensar_receta(receta_id, serializer.validated_data['lotes'], request.user)
+    except ErrorDispensacion as e:
+        return Response({'error': e.mensaje}, status=e.codigo)
+    
+    receta = RecetaSerializer.setup_eager_loading(Receta.objects.all()).get(folio_receta=receta_id)
+    return Response({
+        'lotes_registrados': len(lotes),
+        'receta': RecetaSerializer(receta).data
+    }, status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def obtener_lotes_medicamento(request, receta_id, detalle_id):
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Los flujos de eventos de las colas de recetas (/api/recetas/colas/<cola>/eventos/)
+solo funcionan con este punto de entrada y un único proceso, por ejemplo:
+
+    uvicorn mau_hospital.asgi:application --workers 1
 """
 
 import os
@@ -0,0 +1,258 @@
+"""
+Paginación por cursor (keyset) opcional para listados grandes.
+
+Por defecto los listados siguen usando paginación por número de página. Si la
+petición incluye `?paginacion=cursor` (o un `cursor` devuelto previamente), la
+página se obtiene filtrando a partir de la última fila vista en lugar de usar
+OFFSET, por lo que la página N cuesta lo mismo que la primera. En este modo el
+total (`count`) solo se calcula si se pide explícitamente con `?contar=true`.
+
+Si la vista usa OrderingFilter, el `?ordering=` pedido también define el orden
+del cursor, completado con el campo único de desempate del paginador; los
+enlaces conservan el parámetro, así que un cursor solo sirve con el mismo orden.
+"""
+import base64
+import json
+import operator
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Paginación por número de página con modo cursor opcional.
+
+    Las subclases definen `ordering`: campos del orden del listado terminando en
+    un campo único que sirve de desempate (p. ej. expediente o folio_receta).
+    Los valores nulos se consideran menores que cualquier otro valor. El orden
+    también puede usar anotaciones del queryset, que se asumen no nulas.
+
+    Con `modo_predeterminado = 'cursor'` el modo por cursor se usa salvo que
+    se pida `?paginacion=pagina`.
+    """
+
+    ordering = ()
+    modo_predeterminado = 'pagina'
+    cursor_query_param = 'cursor'
+    modo_query_param = 'paginacion'
+    contar_query_param = 'contar'
+    cursor_invalido = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.modo_cursor = (
+            request.query_params.get(self.modo_query_param, self.modo_predeterminado) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.modo_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        campos = self._campos(queryset.model, self._ordering(request, queryset, view))
+        posicion, reverso = self._decodificar_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+
+        self.count = None
+        if request.query_params.get(self.contar_query_param) == 'true':
+            self.count = queryset.order_by().count()
+
+        if reverso:
+            campos_consulta = [(nombre, not desc, nullable) for nombre, desc, nullable in campos]
+        else:
+            campos_consulta = campos
+
+        if posicion is not None and len(posicion) != len(campos):
+            raise NotFound(self.cursor_invalido)
+
+        try:
+            if posicion is not None:
+                queryset = queryset.filter(self._filtro_posterior(campos_consulta, posicion))
+            queryset = queryset.order_by(*self._orden(campos_consulta))
+            filas = list(queryset[:self.page_size + 1])
+        except (ValidationError, ValueError, TypeError):
+            # El cursor se decodificó pero sus valores no corresponden a los campos
+            if posicion is None:
+                raise
+            raise NotFound(self.cursor_invalido)
+        hay_mas = len(filas) > self.page_size
+        filas = filas[:self.page_size]
+        if reverso:
+            filas.reverse()
+
+        # Hay página siguiente si avanzamos y sobran filas, o si retrocedimos;
+        # hay anterior si retrocedimos y sobran filas, o si partimos de un cursor
+        self.valores_siguiente = None
+        self.valores_anterior = None
+        if filas:
+            if hay_mas or reverso:
+                self.valores_siguiente = self._valores(filas[-1], campos)
+            if (hay_mas and reverso) or (posicion is not None and not reverso):
+                self.valores_anterior = self._valores(filas[0], campos)
+
+        return filas
+
+    def get_next_link(self):
+        if not self.modo_cursor:
+            return super().get_next_link()
+        return self._enlace(self.valores_siguiente, reverso=False)
+
+    def get_previous_link(self):
+        if not self.modo_cursor:
+            return super().get_previous_link()
+        return self._enlace(self.valores_anterior, reverso=True)
+
+    def get_paginated_response(self, data):
+        if not self.modo_cursor:
+            return super().get_paginated_response(data)
+
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        respuesta = super().get_paginated_response_schema(schema)
+        respuesta['properties']['count']['nullable'] = True
+        return respuesta
+
+    # Utilidades internas
+
+    def _ordering(self, request, queryset, view):
+        """
+        Orden del cursor: el de la petición si la vista usa OrderingFilter y se
+        pidió `ordering`, terminado en el campo único de `ordering` del paginador.
+        """
+        filtros = getattr(view, 'filter_backends', ())
+        if not any(issubclass(filtro, OrderingFilter) for filtro in filtros):
+            return self.ordering
+        if not request.query_params.get(OrderingFilter.ordering_param):
+            return self.ordering
+
+        solicitado = OrderingFilter().get_ordering(request, queryset, view) or ()
+        desempate = self.ordering[-1]
+        ordering = []
+        nombres = set()
+        for campo in solicitado:
+            nombre = campo.lstrip('-')
+            if nombre in nombres:
+                continue
+            ordering.append(campo)
+            nombres.add(nombre)
+            if nombre == desempate.lstrip('-'):
+                return tuple(ordering)
+        return tuple(ordering) + (desempate,)
+
+    def _campos(self, modelo, ordering):
+        """Convierte `ordering` en tuplas (campo, descendente, admite_nulos)"""
+        campos = []
+        for campo in ordering:
+            desc = campo.startswith('-')
+            nombre = campo.lstrip('-')
+            try:
+                nullable = modelo._meta.get_field(nombre).null
+            except FieldDoesNotExist:
+                nullable = False
+            campos.append((nombre, desc, nullable))
+        return campos
+
+    def _orden(self, campos):
+        """Expresiones de ORDER BY donde los nulos siempre son el menor valor"""
+        orden = []
+        for nombre, desc, nullable in campos:
+            if not nullable:
+                orden.append(f'-{nombre}' if desc else nombre)
+            elif desc:
+                orden.append(F(nombre).desc(nulls_last=True))
+            else:
+                orden.append(F(nombre).asc(nulls_first=True))
+        return orden
+
+    def _filtro_posterior(self, campos, posicion):
+        """Filtro para las filas que van después de `posicion` en el orden dado"""
+        condiciones = []
+        iguales = Q()
+        for (nombre, desc, nullable), valor in zip(campos, posicion):
+            condicion = self._despues_de(nombre, desc, nullable, valor)
+            if condicion is not None:
+                condiciones.append(iguales & condicion)
+            if valor is None:
+                iguales &= Q(**{f'{nombre}__isnull': True})
+            else:
+                iguales &= Q(**{nombre: valor})
+
+        if not condiciones:
+            return Q(pk__in=[])
+        return reduce(operator.or_, condiciones)
+
+    def _despues_de(self, nombre, desc, nullable, valor):
+        if desc:
+            if valor is None:
+                return None
+            condicion = Q(**{f'{nombre}__lt': valor})
+            if nullable:
+                condicion |= Q(**{f'{nombre}__isnull': True})
+            return condicion
+
+        if valor is None:
+            return Q(**{f'{nombre}__isnull': False})
+        return Q(**{f'{nombre}__gt': valor})
+
+    def _valores(self, obj, campos):
+        valores = []
+        for nombre, _desc, _nullable in campos:
+            valor = getattr(obj, nombre)
+            if isinstance(valor, (datetime, date, time)):
+                valor = valor.isoformat()
+            elif isinstance(valor, Decimal):
+                valor = str(valor)
+            valores.append(valor)
+        return valores
+
+    def _enlace(self, valores, reverso):
+        if valores is None:
+            return None
+
+        contenido = json.dumps({'p': valores, 'r': int(reverso)}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(contenido.encode('utf-8')).decode('ascii')
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.modo_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def _decodificar_cursor(self, cursor):
+        """Retorna (posicion, reverso) a partir del parámetro cursor"""
+        if not cursor:
+            return None, False
+
+        try:
+            contenido = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            posicion = contenido['p']
+            reverso = bool(contenido.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.cursor_invalido)
+
+        if not isinstance(posicion, list):
+            raise NotFound(self.cursor_invalido)
+        return posicion, reverso
+
+
+class PacientePagination(KeysetPagination):
+    """Paginación de pacientes; `?paginacion=cursor` activa el modo por cursor"""
+    ordering = ('apellido_paterno', 'apellido_materno', 'nombre', 'expediente')
+
+
+class RecetaPagination(KeysetPagination):
+    """Paginación de recetas; `?paginacion=cursor` activa el modo por cursor"""
+    ordering = ('-fecha_creacion', '-folio_receta')
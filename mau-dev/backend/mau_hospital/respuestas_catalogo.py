@@ -0,0 +1,148 @@
+"""
+Respuestas condicionales (ETag / If-None-Match) para endpoints de catálogos.
+
+Cada catálogo tiene un contador de versión que se incrementa cuando cambia.
+El ETag de una respuesta se forma con esa versión y la URL completa de la
+petición, así que un cliente que ya tiene la versión vigente recibe un 304
+sin que la vista se ejecute. Para el resto, el cuerpo JSON se genera una sola
+vez por versión y URL y se guarda también comprimido con gzip, listo para
+enviarse a los clientes que lo acepten.
+"""
+import gzip
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+# Cuerpos precalculados que se conservan por proceso (los menos usados salen primero)
+MAX_RESPUESTAS = 256
+
+# Por debajo de este tamaño comprimir no compensa
+TAMANO_MINIMO_GZIP = 200
+
+SUFIJO_GZIP = '-gzip'
+
+_acepta_gzip = re.compile(r'\bgzip\b')
+
+
+class CuerpoPrecalculado:
+    """Cuerpo de una respuesta, en claro y comprimido"""
+
+    __slots__ = ('contenido', 'gzip', 'tipo_contenido')
+
+    def __init__(self, contenido, tipo_contenido='application/json'):
+        self.contenido = contenido
+        self.tipo_contenido = tipo_contenido
+        self.gzip = None
+        if len(contenido) >= TAMANO_MINIMO_GZIP:
+            self.gzip = gzip.compress(contenido, compresslevel=6, mtime=0)
+
+
+_lock = threading.Lock()
+_cuerpos = OrderedDict()
+
+
+def _cuerpo_en_cache(etag):
+    with _lock:
+        cuerpo = _cuerpos.get(etag)
+        if cuerpo is not None:
+            _cuerpos.move_to_end(etag)
+        return cuerpo
+
+
+def _guardar_cuerpo(etag, cuerpo):
+    with _lock:
+        _cuerpos[etag] = cuerpo
+        _cuerpos.move_to_end(etag)
+        while len(_cuerpos) > MAX_RESPUESTAS:
+            _cuerpos.popitem(last=False)
+
+
+def limpiar_cache():
+    """Descarta los cuerpos precalculados de este proceso"""
+    with _lock:
+        _cuerpos.clear()
+
+
+def etag_catalogo(request, catalogo, version):
+    """ETag fuerte para la versión `version` del catálogo y la URL de la petición"""
+    resumen = hashlib.sha1(request.build_absolute_uri().encode('utf-8')).hexdigest()[:16]
+    return f'"{catalogo}-{version}-{resumen}"'
+
+
+def _etag_vigente_del_cliente(request, etag):
+    """ETag de If-None-Match que corresponde a `etag` (en cualquier codificación) o None"""
+    for enviado in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        if enviado == '*':
+            return etag
+        base = enviado.removeprefix('W/')
+        if base.endswith(SUFIJO_GZIP + '"'):
+            base = base[:-len(SUFIJO_GZIP) - 1] + '"'
+        if base == etag:
+            return enviado.removeprefix('W/')
+    return None
+
+
+def respuesta_catalogo(request, catalogo, version, vista):
+    """
+    Respuesta de un endpoint de catálogo con ETag.
+
+    `vista()` construye la Response de DRF; solo se llama si el cliente no
+    tiene ya la versión vigente y no hay un cuerpo precalculado para ella.
+    Las respuestas de error se devuelven tal cual, sin ETag ni caché.
+    """
+    def construir():
+        respuesta = vista()
+        if respuesta.status_code != status.HTTP_200_OK:
+            return respuesta
+        return CuerpoPrecalculado(JSONRenderer().render(respuesta.data))
+
+    return respuesta_condicional(request, etag_catalogo(request, catalogo, version), construir)
+
+
+def respuesta_condicional(request, etag, construir):
+    """
+    Responde 304 si el cliente ya tiene `etag`; si no, sirve el cuerpo
+    precalculado para `etag`, construyéndolo con `construir()` la primera vez.
+
+    `construir()` retorna un CuerpoPrecalculado, o una respuesta de error que
+    se devuelve tal cual.
+    """
+    vigente = _etag_vigente_del_cliente(request, etag)
+    if vigente is not None:
+        # El 304 repite el ETag de la representación que el cliente ya tiene
+        respuesta = HttpResponseNotModified()
+        respuesta['ETag'] = vigente
+    else:
+        cuerpo = _cuerpo_en_cache(etag)
+        if cuerpo is None:
+            cuerpo = construir()
+            if not isinstance(cuerpo, CuerpoPrecalculado):
+                return cuerpo
+            _guardar_cuerpo(etag, cuerpo)
+
+        usar_gzip = (
+            cuerpo.gzip is not None
+            and bool(_acepta_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        )
+        respuesta = HttpResponse(
+            cuerpo.gzip if usar_gzip else cuerpo.contenido,
+            content_type=cuerpo.tipo_contenido
+        )
+        respuesta['Content-Length'] = str(len(respuesta.content))
+        if usar_gzip:
+            # Cada codificación es una representación distinta y lleva su propio ETag
+            respuesta['Content-Encoding'] = 'gzip'
+            respuesta['ETag'] = etag[:-1] + SUFIJO_GZIP + '"'
+        else:
+            respuesta['ETag'] = etag
+
+    respuesta['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(respuesta, ('Accept-Encoding', 'Authorization'))
+    return respuesta
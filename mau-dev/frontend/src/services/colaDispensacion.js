@@ -0,0 +1,28 @@
+import api from './api'
+
+// Tamaño máximo de página que acepta la cola en el backend
+const TAMANO_PAGINA = 200
+
+export const colaDispensacionService = {
+    // Obtener la cola completa siguiendo los enlaces `next` del cursor
+    async getColaCompleta(url, params = {}) {
+        const recetas = []
+        let cursor = null
+
+        do {
+            const response = await api.get(url, {
+                params: { ...params, page_size: TAMANO_PAGINA, ...(cursor ? { cursor } : {}) }
+            })
+            recetas.push(...response.data.recetas)
+
+            // Solo se toma el cursor del enlace: la URL absoluta la arma el backend
+            cursor = response.data.next
+                ? new URL(response.data.next, window.location.origin).searchParams.get('cursor')
+                : null
+        } while (cursor)
+
+        return recetas
+    }
+}
+
+export default colaDispensacionService